@@ -0,0 +1,200 @@
+"""Offline OpenAI-compatible stand-in for benchmarking and local development.
+
+Serves chat completions (streaming and non-streaming), audio transcriptions and
+embeddings with configurable latency and deterministic output, so load tests measure
+this app rather than the network or the provider.
+
+    python benchmarks/fake_openai.py --port 9100 --chat-latency lognormal:400,0.5
+    OPENAI_BASE_URL=http://127.0.0.1:9100/v1 OPENAI_API_KEY=sk-fake uvicorn src.main:app
+
+Latency specs: "fixed:MS", "uniform:LO,HI" or "lognormal:MEDIAN,SIGMA" (milliseconds).
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import random
+import time
+import uuid
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, File, Form, Request, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBEDDING_DIMENSIONS = {"text-embedding-3-small": 1536, "text-embedding-3-large": 3072, "text-embedding-ada-002": 1536}
+
+class Latency:
+    """Sampler for a latency spec, in seconds"""
+
+    def __init__(self, spec: str):
+        kind, _, args = spec.partition(":")
+        values = [float(v) for v in args.split(",") if v]
+        if kind == "fixed" and len(values) == 1:
+            self._sample = lambda: values[0]
+        elif kind == "uniform" and len(values) == 2:
+            self._sample = lambda: random.uniform(values[0], values[1])
+        elif kind == "lognormal" and len(values) == 2:
+            self._sample = lambda: random.lognormvariate(np.log(values[0]), values[1])
+        else:
+            raise ValueError(f"Bad latency spec {spec!r}")
+        self.spec = spec
+
+    def sample(self) -> float:
+        return max(0.0, self._sample()) / 1000
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+
+def fake_embedding(text: str, dimensions: int) -> np.ndarray:
+    """Deterministic unit vector per text, so identical inputs always embed identically"""
+    vector = np.random.default_rng(_seed(text)).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+def _last_user_text(messages) -> str:
+    for message in reversed(messages or []):
+        if message.get("role") != "user":
+            continue
+        content = message.get("content")
+        if isinstance(content, list):
+            return " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+        return content or ""
+    return ""
+
+def fake_reply(messages, tokens: int, json_mode: bool) -> list:
+    """Deterministic reply for the prompt, as a list of ~tokens word pieces"""
+    prompt = _last_user_text(messages)
+    rng = random.Random(_seed(prompt))
+    words = ["signal", "context", "summary", "analysis", "result", "detail", "insight", "report", "data", "model"]
+    pieces = [f"{rng.choice(words)} " for _ in range(max(1, tokens))]
+    if json_mode:
+        return ['{"result": "', *[p.strip() + " " for p in pieces], '"}']
+    return pieces
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    return {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+
+def create_app(args) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    chat_latency = Latency(args.chat_latency)
+    embedding_latency = Latency(args.embedding_latency)
+    transcription_latency = Latency(args.transcription_latency)
+    stats = {"chat": 0, "chat_stream": 0, "embeddings": 0, "embedding_inputs": 0, "transcriptions": 0, "rate_limited": 0}
+
+    def rate_limited():
+        if args.rate_limit_rate and random.random() < args.rate_limit_rate:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after-ms": str(args.retry_after_ms)}
+            )
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        if (error := rate_limited()) is not None:
+            return error
+        body = await request.json()
+        messages = body.get("messages", [])
+        prompt_tokens = sum(len(json.dumps(m.get("content", ""))) // 4 for m in messages)
+        json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+        completion_tokens = min(body.get("max_tokens") or args.completion_tokens, args.completion_tokens)
+        pieces = fake_reply(messages, completion_tokens, json_mode)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        created = int(time.time())
+        model = body.get("model", "gpt-4o")
+
+        if not body.get("stream"):
+            stats["chat"] += 1
+            await asyncio.sleep(chat_latency.sample() + args.token_delay_ms / 1000 * len(pieces))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(pieces)}, "finish_reason": "stop"}],
+                "usage": _usage(prompt_tokens, len(pieces))
+            }
+
+        stats["chat_stream"] += 1
+
+        def chunk(delta: dict, finish_reason=None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events():
+            await asyncio.sleep(chat_latency.sample())  # time to first token
+            yield chunk({"role": "assistant", "content": ""})
+            for piece in pieces:
+                yield chunk({"content": piece})
+                await asyncio.sleep(args.token_delay_ms / 1000)
+            yield chunk({}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        if (error := rate_limited()) is not None:
+            return error
+        body = await request.json()
+        inputs = body.get("input", [])
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        model = body.get("model", "text-embedding-3-small")
+        dimensions = body.get("dimensions") or EMBEDDING_DIMENSIONS.get(model, 1536)
+        stats["embeddings"] += 1
+        stats["embedding_inputs"] += len(inputs)
+        await asyncio.sleep(embedding_latency.sample())
+        data = []
+        for index, text in enumerate(inputs):
+            vector = fake_embedding(str(text), dimensions)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+        tokens = sum(len(str(text)) // 4 for text in inputs)
+        return {"object": "list", "data": data, "model": model, "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    @app.post("/v1/audio/transcriptions")
+    async def transcriptions(file: UploadFile = File(...), model: str = Form("whisper-1")):
+        if (error := rate_limited()) is not None:
+            return error
+        content = await file.read()
+        stats["transcriptions"] += 1
+        await asyncio.sleep(transcription_latency.sample())
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        return {"text": f"Fake transcript of {file.filename} ({len(content)} bytes, {digest})."}
+
+    @app.get("/stats")
+    def get_stats():
+        return stats
+
+    return app
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--chat-latency", default="lognormal:300,0.4", help="time to first token / full response")
+    parser.add_argument("--token-delay-ms", type=float, default=5.0, help="delay per streamed token")
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--embedding-latency", default="lognormal:60,0.3")
+    parser.add_argument("--transcription-latency", default="lognormal:800,0.3")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--retry-after-ms", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=None, help="seed the latency sampler")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,293 @@
+"""End-to-end load test: drive the API at fixed concurrency and report throughput and
+p50/p95/p99 latency per scenario.
+
+Against a running server:
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --concurrency 16 --requests 200
+
+Fully offline (starts benchmarks/fake_openai.py and the app against temp storage):
+    python benchmarks/load_test.py --spawn --json results.json
+    python benchmarks/load_test.py --spawn --baseline results.json   # exit 1 on regression
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import shlex
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+import zlib
+import httpx
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ["chat", "chat_stream", "analyze_text", "analyze_image", "analyze_audio", "report"]
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+def _png(width: int = 64, height: int = 64) -> bytes:
+    """Small valid RGB PNG without needing an imaging library"""
+    chunk = _png_chunk
+    rows = b"".join(
+        b"\x00" + bytes(v for x in range(width) for v in (x * 4 % 256, y * 4 % 256, 128))
+        for y in range(height)
+    )
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows)) + chunk(b"IEND", b"")
+
+def _wav(seconds: float = 1.0, rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        t = np.arange(int(seconds * rate)) / rate
+        out.writeframes((np.sin(2 * np.pi * 440 * t) * 8000).astype("<i2").tobytes())
+    return buffer.getvalue()
+
+# Uploads are deduplicated by content hash (UPLOAD_DEDUP_MODE=reuse), so every timed
+# upload must differ or all but the first would be answered from the stored analysis
+def _unique_png(png: bytes, i: int) -> bytes:
+    """png with a text chunk naming request i inserted before IEND"""
+    return png[:-12] + _png_chunk(b"tEXt", b"Comment\x00bench %d" % i) + png[-12:]
+
+def _unique_wav(wav: bytes, i: int) -> bytes:
+    """wav with its last sample pair replaced by request i"""
+    return wav[:-4] + struct.pack("<i", i)
+
+class Scenario:
+    """Builds the i-th request for one endpoint; setup() runs once before timing starts"""
+
+    def __init__(self, name: str, client: httpx.AsyncClient, headers: dict):
+        self.name = name
+        self.client = client
+        self.headers = headers
+        self.sessions = []
+        self.image = _png()
+        self.audio = _wav()
+
+    async def setup(self, concurrency: int):
+        if self.name in ("chat", "chat_stream"):
+            for worker in range(concurrency):
+                response = await self.client.post("/chat/sessions", json={"title": f"bench-{self.name}-{worker}"})
+                response.raise_for_status()
+                self.sessions.append(response.json()["session_id"])
+
+    async def run(self, i: int, worker: int) -> dict:
+        """Issue one request; returns {"status", "ttfb_ms"?}"""
+        if self.name == "chat":
+            response = await self.client.post("/chat/message", headers=self.headers, json={
+                "session_id": self.sessions[worker], "message": f"Question {i}: what did the uploaded report say about revenue?"
+            })
+            return {"status": response.status_code}
+        if self.name == "chat_stream":
+            start = time.perf_counter()
+            ttfb = None
+            payload = {"session_id": self.sessions[worker], "message": f"Question {i}: summarize the audio notes."}
+            async with self.client.stream("POST", "/chat/message/stream", headers=self.headers, json=payload) as response:
+                async for line in response.aiter_lines():
+                    if ttfb is None and line.startswith("data:") and '"token"' in line:
+                        ttfb = (time.perf_counter() - start) * 1000
+                    if line.startswith("event: error"):
+                        return {"status": 599}
+                return {"status": response.status_code, "ttfb_ms": ttfb}
+        if self.name == "analyze_text":
+            response = await self.client.post("/analyze/text", headers=self.headers, json={
+                "text": f"Quarterly update {i}. Revenue grew while costs stayed flat. " * 20,
+                "instruction": "Summarize this text."
+            })
+            return {"status": response.status_code}
+        if self.name == "analyze_image":
+            response = await self.client.post("/analyze/image", headers=self.headers,
+                                              files={"file": (f"bench_{i}.png", _unique_png(self.image, i), "image/png")},
+                                              data={"prompt": "Describe this image."})
+            return {"status": response.status_code}
+        if self.name == "analyze_audio":
+            response = await self.client.post("/analyze/audio", headers=self.headers,
+                                              files={"file": (f"bench_{i}.wav", _unique_wav(self.audio, i), "audio/wav")})
+            return {"status": response.status_code}
+        if self.name == "report":
+            response = await self.client.post("/report", headers=self.headers, json={
+                "filename": f"bench_{worker}.pdf",
+                "display_title": f"Benchmark report {i}",
+                "sections": [{"title": "Summary", "body": "Lorem ipsum dolor sit amet. " * 40}] * 3
+            })
+            return {"status": response.status_code}
+        raise ValueError(f"Unknown scenario {self.name}")
+
+def _summarize(name: str, latencies, ttfbs, errors: int, elapsed: float, concurrency: int) -> dict:
+    result = {"scenario": name, "concurrency": concurrency, "requests": len(latencies) + errors, "errors": errors,
+              "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0}
+    if latencies:
+        values = np.asarray(latencies)
+        result.update({
+            "mean_ms": round(float(values.mean()), 1),
+            "p50_ms": round(float(np.percentile(values, 50)), 1),
+            "p95_ms": round(float(np.percentile(values, 95)), 1),
+            "p99_ms": round(float(np.percentile(values, 99)), 1),
+            "max_ms": round(float(values.max()), 1)
+        })
+    if ttfbs:
+        result["ttfb_p50_ms"] = round(float(np.percentile(ttfbs, 50)), 1)
+        result["ttfb_p95_ms"] = round(float(np.percentile(ttfbs, 95)), 1)
+    return result
+
+async def run_scenario(name: str, args) -> dict:
+    headers = {"Cache-Control": "no-cache"} if args.no_cache else {}
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        scenario = Scenario(name, client, headers)
+        await scenario.setup(args.concurrency)
+        for i in range(args.warmup):
+            await scenario.run(-1 - i, i % args.concurrency)
+
+        latencies, ttfbs = [], []
+        errors = 0
+        counter = iter(range(args.requests if args.duration is None else sys.maxsize))
+        start = time.perf_counter()
+        deadline = start + args.duration if args.duration is not None else None
+
+        async def worker(index: int):
+            nonlocal errors
+            for i in counter:
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                began = time.perf_counter()
+                try:
+                    outcome = await scenario.run(i, index)
+                except httpx.HTTPError as e:
+                    outcome = {"status": 0, "error": str(e)}
+                elapsed_ms = (time.perf_counter() - began) * 1000
+                if outcome["status"] == 200:
+                    latencies.append(elapsed_ms)
+                    if outcome.get("ttfb_ms") is not None:
+                        ttfbs.append(outcome["ttfb_ms"])
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(worker(index) for index in range(args.concurrency)))
+        return _summarize(name, latencies, ttfbs, errors, time.perf_counter() - start, args.concurrency)
+
+def _wait_for(url: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+
+def spawn_stack(args, workdir: str):
+    """Start the fake OpenAI server and the app (with temp storage) as subprocesses"""
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    fake = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "fake_openai.py"), "--port", str(args.fake_port),
+         *shlex.split(args.fake_args)],
+        cwd=ROOT
+    )
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-fake",
+        "OPENAI_BASE_URL": f"{fake_url}/v1",
+        "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'app.db')}",
+        "VECTOR_DB_PATH": os.path.join(workdir, "vector_db"),
+        "UPLOAD_DIR": os.path.join(workdir, "uploads")
+    }
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(args.app_port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=ROOT, env=env
+    )
+    try:
+        _wait_for(f"{fake_url}/stats")
+        _wait_for(f"http://127.0.0.1:{args.app_port}/health")
+    except Exception:
+        for process in (app, fake):
+            process.terminate()
+        raise
+    args.url = f"http://127.0.0.1:{args.app_port}"
+    return [app, fake]
+
+def compare(results, baseline_path: str, tolerance: float) -> list:
+    """Regressions versus a saved run: p95 slower or throughput lower by more than tolerance"""
+    with open(baseline_path) as f:
+        baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+    problems = []
+    for result in results:
+        before = baseline.get(result["scenario"])
+        if not before or "p95_ms" not in result or "p95_ms" not in before:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            problems.append(f"{result['scenario']}: p95 {before['p95_ms']}ms -> {result['p95_ms']}ms")
+        if result["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            problems.append(f"{result['scenario']}: throughput {before['throughput_rps']} -> {result['throughput_rps']} rps")
+        if result["errors"] > before["errors"]:
+            problems.append(f"{result['scenario']}: errors {before['errors']} -> {result['errors']}")
+    return problems
+
+def print_table(results):
+    columns = ["scenario", "requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms", "ttfb_p50_ms"]
+    print("  ".join(f"{c:>14}" for c in columns))
+    for result in results:
+        print("  ".join(f"{str(result.get(c, '-')):>14}" for c in columns))
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {SCENARIOS}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--duration", type=float, default=None, help="seconds per scenario (overrides --requests)")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--no-cache", action="store_true", help="send Cache-Control: no-cache to bypass the response cache")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="compare against a previous --json file; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--spawn", action="store_true", help="start fake_openai.py and the app locally")
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--fake-port", type=int, default=9100)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--fake-args", default="--seed 1", help="extra arguments for fake_openai.py")
+    return parser.parse_args(argv)
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    names = [n.strip() for n in args.scenarios.split(",") if n.strip()]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        print(f"Unknown scenarios: {sorted(unknown)}")
+        return 2
+
+    processes = []
+    workdir = tempfile.TemporaryDirectory(prefix="mmic-bench-")
+    try:
+        if args.spawn:
+            processes = spawn_stack(args, workdir.name)
+        results = [asyncio.run(run_scenario(name, args)) for name in names]
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+        workdir.cleanup()
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"created_at": time.time(), "args": vars(args), "results": results}, f, indent=2)
+    if args.baseline:
+        problems = compare(results, args.baseline, args.tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        return 1 if problems else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -112,8 +112,34 @@ with tab_files:
     upload_type = st.radio("Select Input Type", ["Image", "Audio"], horizontal=True)
     
     if upload_type == "Image":
-        img_file = st.file_uploader("Upload Image", type=["jpg", "png", "jpeg"])
-        if img_file:
+        img_files = st.file_uploader("Upload Image", type=["jpg", "png", "jpeg", "zip"], accept_multiple_files=True)
+        if len(img_files) > 1 or (img_files and img_files[0].name.lower().endswith(".zip")):
+            prompt = st.text_input("Analysis Prompt", "Describe this image in detail and list key insights.")
+            if st.button(f"Analyze {len(img_files)} Uploads", type="primary"):
+                progress = st.progress(0.0, text="Uploading...")
+                finished = 0
+                try:
+                    for res in utils.upload_images_batch(img_files, prompt):
+                        if res.get("done"):
+                            progress.progress(1.0, text=f"Done: {res['analyzed']} analyzed, {res['deduplicated']} already known, {res['failed']} failed")
+                            continue
+                        finished += 1
+                        progress.progress(min(finished / max(len(img_files), finished), 1.0), text=f"Finished {res['filename']}")
+                        if "error" in res:
+                            st.error(f"{res['filename']}: {res['error']}")
+                            continue
+                        with st.expander(res['filename']):
+                            st.markdown(res['analysis'])
+                        st.session_state['insights'].append({
+                            "title": f"Image Analysis: {res['filename']}",
+                            "body": res['analysis'],
+                            "type": "image"
+                        })
+                    st.success("Saved to Insights")
+                except Exception as e:
+                    st.error(f"Error: {e}")
+        elif img_files:
+            img_file = img_files[0]
             col_a, col_b = st.columns([1, 1])
             with col_a:
                 st.image(img_file, use_column_width=True, caption="Preview")
@@ -195,7 +221,7 @@ with tab_chat:
     # Session Management
     sessions = []
     try:
-        sessions = utils.get_sessions()
+        sessions = utils.get_sessions()['items']
     except:
         st.error("Could not fetch sessions. Is backend running?")
     
@@ -221,7 +247,9 @@ with tab_chat:
             
             # Load History
             history = utils.get_history(st.session_state['current_session_id'])
-            for msg in history:
+            if history['next_before_id'] is not None:
+                st.caption("Showing the most recent messages.")
+            for msg in history['items']:
                 with st.chat_message(msg['role']):
                     st.write(msg['content'])
             
@@ -230,11 +258,8 @@ with tab_chat:
                 with st.chat_message("user"):
                     st.write(prompt)
                 
-                with st.spinner("Thinking..."):
-                    res = utils.send_message(st.session_state['current_session_id'], prompt)
-                    
                 with st.chat_message("assistant"):
-                     st.write(res['response'])
+                    st.write_stream(utils.stream_message(st.session_state['current_session_id'], prompt))
                 
                 st.rerun() # Refresh to show in history correctly
         else:
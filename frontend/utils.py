@@ -1,4 +1,5 @@
 import requests
+import json
 import os
 
 # Use Environment Variable for production API URL, default to localhost for dev
@@ -27,6 +28,16 @@ def upload_image(image_file, prompt):
     response = requests.post(f"{BASE_URL}/analyze/image", files=files, data=data)
     return _handle_response(response)
 
+def upload_images_batch(image_files, prompt):
+    """Yield one result per image (and a final {"done": ...} summary) from the NDJSON endpoint"""
+    files = [("files", (f.name, f, f.type)) for f in image_files]
+    with requests.post(f"{BASE_URL}/analyze/image/batch", files=files, data={"prompt": prompt}, stream=True) as response:
+        if response.status_code != 200:
+            raise Exception(f"API Error: {response.status_code} - {response.text}")
+        for line in response.iter_lines(decode_unicode=True):
+            if line:
+                yield json.loads(line)
+
 def upload_audio(audio_file):
     files = {"file": (audio_file.name, audio_file, audio_file.type)}
     response = requests.post(f"{BASE_URL}/analyze/audio", files=files)
@@ -36,20 +47,52 @@ def analyze_text(text, instruction):
     response = requests.post(f"{BASE_URL}/analyze/text", json={"text": text, "instruction": instruction})
     return _handle_response(response)
 
-def get_sessions():
-    response = requests.get(f"{BASE_URL}/chat/sessions")
+def get_sessions(before_id=None, limit=50):
+    """One page of sessions, newest first: {"items": [...], "next_before_id": ...}"""
+    params = {"limit": limit}
+    if before_id is not None:
+        params["before_id"] = before_id
+    response = requests.get(f"{BASE_URL}/chat/sessions", params=params)
     return _handle_response(response)
 
 def create_session(title):
     response = requests.post(f"{BASE_URL}/chat/sessions", json={"title": title})
     return _handle_response(response)
 
-def send_message(session_id, message):
-    response = requests.post(f"{BASE_URL}/chat/message", json={"session_id": session_id, "message": message})
+def send_message(session_id, message, where=None):
+    payload = {"session_id": session_id, "message": message}
+    if where:
+        payload["where"] = where
+    response = requests.post(f"{BASE_URL}/chat/message", json=payload)
     return _handle_response(response)
 
-def get_history(session_id):
-    response = requests.get(f"{BASE_URL}/chat/history/{session_id}")
+def stream_message(session_id, message, where=None):
+    """Yield response tokens from the SSE endpoint as they arrive"""
+    payload = {"session_id": session_id, "message": message}
+    if where:
+        payload["where"] = where
+    with requests.post(f"{BASE_URL}/chat/message/stream", json=payload, stream=True) as response:
+        if response.status_code != 200:
+            raise Exception(f"API Error: {response.status_code} - {response.text}")
+        event = "message"
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                event = "message"
+            elif line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data = json.loads(line[len("data:"):])
+                if event == "error":
+                    raise Exception(f"API Error: {data.get('detail')}")
+                if "token" in data:
+                    yield data["token"]
+
+def get_history(session_id, before_id=None, limit=50):
+    """One page of messages, oldest first: {"items": [...], "next_before_id": ...}"""
+    params = {"limit": limit}
+    if before_id is not None:
+        params["before_id"] = before_id
+    response = requests.get(f"{BASE_URL}/chat/history/{session_id}", params=params)
     return _handle_response(response)
 
 def generate_report(filename, title, sections):
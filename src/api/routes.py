@@ -1,87 +1,167 @@
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Header, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from src.db.database import get_db
-from src.services.image_service import ImageService
-from src.services.audio_service import AudioService
+from src.db.database import get_db, get_async_db, AsyncSessionLocal
 from src.services.text_service import TextService
 from src.services.chat_service import ChatService
 from src.services.report_service import ReportService
-from src.db.vector_store import vector_store
-from src.models.schemas import TextAnalysisRequest, ChatRequest, CreateSessionRequest, ReportRequest
-from src.models.models import UploadedFile
+from src.services.ingest_service import IngestService
+from src.services.job_service import JobService, TERMINAL_STATUSES
+from src.db.metadata_index import MetadataFilterError
+from src.models.schemas import (
+    TextAnalysisRequest, ChatRequest, CreateSessionRequest, ReportRequest, ChatSessionPage, ChatHistoryPage,
+    AnalysisJobStatus
+)
+from src.utils.uploads import save_batch, save_upload, StoredUpload, UploadRejected
+from src.utils.response_cache import cache_allowed
+from src.utils.upstream import upstream_priority, UPSTREAM_BUSY_DETAIL
 from src.config import config
-import shutil
+from typing import List, Optional
+from openai import RateLimitError
+import asyncio
 import os
-import uuid
+import anyio
+import json
 
 router = APIRouter()
 
+def _upstream_busy() -> HTTPException:
+    """Rate limited upstream even after retries: tell the client to come back, not a 500"""
+    return HTTPException(
+        status_code=503,
+        detail=UPSTREAM_BUSY_DETAIL,
+        headers={"Retry-After": str(int(config.UPSTREAM_BACKOFF_MAX))}
+    )
+
+async def _store_upload(file: UploadFile, kind: str):
+    try:
+        return await save_upload(file, kind)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
 @router.post("/analyze/image")
 async def analyze_image(
     file: UploadFile = File(...), 
-    prompt: str = Form("Describe this image."),
-    db: Session = Depends(get_db)
+    prompt: str = Form("Describe this image.")
 ):
-    # Save file
-    file_id = str(uuid.uuid4())
-    ext = file.filename.split('.')[-1]
-    file_path = os.path.join(config.UPLOAD_DIR, f"{file_id}.{ext}")
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    # Analyze
-    analysis = await ImageService.analyze_image(file_path, prompt)
-    
-    # Store metadata & vector
-    db_file = UploadedFile(filename=file.filename, file_path=file_path, file_type="image", description=analysis)
-    db.add(db_file)
-    db.commit()
-    
-    # Add to Vector DB for retrieval
-    vector_store.add_document(
-        doc_id=file_id, 
-        text=analysis, 
-        metadata={"filename": file.filename, "type": "image"}
-    )
-    
-    return {"analysis": analysis, "file_path": file_path}
+    # Save file (content-addressed), then analyze, store and index it unless already known
+    stored = await _store_upload(file, "image")
+    try:
+        return await IngestService.ingest_image(stored, file.filename, prompt)
+    except RateLimitError:
+        raise _upstream_busy()
 
 @router.post("/analyze/audio")
 async def analyze_audio(
+    file: UploadFile = File(...)
+):
+    stored = await _store_upload(file, "audio")
+    try:
+        return await IngestService.ingest_audio(stored, file.filename)
+    except RateLimitError:
+        raise _upstream_busy()
+
+async def _batch_response(files: List[UploadFile], kind: str, prompt: Optional[str] = None) -> StreamingResponse:
+    try:
+        saved = await save_batch(files, kind)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    if not saved:
+        raise HTTPException(status_code=400, detail="No files in batch")
+    accepted = [index for index, (_, stored) in enumerate(saved) if isinstance(stored, StoredUpload)]
+    rejected = len(saved) - len(accepted)
+
+    async def lines():
+        for index, (filename, error) in enumerate(saved):
+            if isinstance(error, UploadRejected):
+                yield json.dumps({"index": index, "filename": filename, "error": str(error)}) + "\n"
+        with upstream_priority("bulk"):
+            async for entry in IngestService.ingest_batch(kind, [saved[index] for index in accepted], prompt):
+                if "done" in entry:
+                    entry = {**entry, "files": len(saved), "failed": entry["failed"] + rejected}
+                else:
+                    entry["index"] = accepted[entry["index"]]
+                yield json.dumps(entry) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+@router.post("/analyze/image/batch")
+async def analyze_image_batch(
+    files: List[UploadFile] = File(...),
+    prompt: str = Form("Describe this image.")
+):
+    """Analyze many images (or zips of images); one NDJSON line per file as it finishes, then a summary"""
+    return await _batch_response(files, "image", prompt)
+
+@router.post("/analyze/audio/batch")
+async def analyze_audio_batch(files: List[UploadFile] = File(...)):
+    return await _batch_response(files, "audio")
+
+async def _submit_job(file: UploadFile, kind: str, prompt: Optional[str] = None) -> dict:
+    if config.JOB_WORKERS <= 0:
+        raise HTTPException(status_code=503, detail="Background jobs are disabled (JOB_WORKERS=0)")
+    stored = await _store_upload(file, kind)
+    return await JobService.submit(kind, stored, file.filename, prompt)
+
+@router.post("/analyze/image/jobs", status_code=202, response_model=AnalysisJobStatus)
+async def submit_image_job(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    prompt: str = Form("Describe this image.")
 ):
-    file_id = str(uuid.uuid4())
-    ext = file.filename.split('.')[-1]
-    file_path = os.path.join(config.UPLOAD_DIR, f"{file_id}.{ext}")
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    transcript = await AudioService.transcribe_audio(file_path)
-    analysis = await AudioService.analyze_audio_content(transcript)
-    
-    full_text = f"Transcript: {transcript}\n\nAnalysis: {analysis}"
-    
-    # Store
-    db_file = UploadedFile(filename=file.filename, file_path=file_path, file_type="audio", description=full_text)
-    db.add(db_file)
-    db.commit()
-    
-    vector_store.add_document(
-        doc_id=file_id,
-        text=full_text,
-        metadata={"filename": file.filename, "type": "audio"}
+    """Store the image and queue its analysis; poll /jobs/{job_id} or stream /jobs/{job_id}/events"""
+    return await _submit_job(file, "image", prompt)
+
+@router.post("/analyze/audio/jobs", status_code=202, response_model=AnalysisJobStatus)
+async def submit_audio_job(file: UploadFile = File(...)):
+    return await _submit_job(file, "audio")
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJobStatus)
+async def get_job(job_id: str):
+    job = await JobService.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-Sent Events: a "status" event whenever status or stage changes, ending on completion"""
+    if await JobService.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last = None
+        while True:
+            job = await JobService.get(job_id)
+            if job is None:
+                return
+            state = (job["status"], job["stage"])
+            if state != last:
+                last = state
+                yield _sse(AnalysisJobStatus(**job).model_dump(mode="json"), event="status")
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
-    
-    return {"transcript": transcript, "analysis": analysis}
 
 @router.post("/analyze/text")
-async def analyze_text(request: TextAnalysisRequest):
+async def analyze_text(
+    request: TextAnalysisRequest,
+    cache_control: Optional[str] = Header(None),
+    x_cache_bypass: Optional[str] = Header(None)
+):
     try:
-        result = await TextService.analyze_text(request.text, request.instruction)
+        use_cache = cache_allowed(cache_control, x_cache_bypass)
+        with upstream_priority("interactive"):
+            result = await TextService.analyze_text(request.text, request.instruction, use_cache=use_cache)
         return {"result": result}
+    except RateLimitError:
+        raise _upstream_busy()
     except Exception as e:
         import traceback
         print(f"Error in analyze_text: {e}")
@@ -93,15 +173,31 @@ def create_session(request: CreateSessionRequest, db: Session = Depends(get_db))
     session = ChatService.create_session(request.title, db)
     return {"session_id": session.id, "title": session.title}
 
-@router.get("/chat/sessions")
-def get_sessions(db: Session = Depends(get_db)):
-    return ChatService.get_sessions(db)
+@router.get("/chat/sessions", response_model=ChatSessionPage)
+def get_sessions(
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    return ChatService.get_sessions(db, before_id=before_id, limit=limit)
 
 @router.post("/chat/message")
-async def chat_message(request: ChatRequest, db: Session = Depends(get_db)):
+async def chat_message(
+    request: ChatRequest,
+    db: AsyncSession = Depends(get_async_db),
+    cache_control: Optional[str] = Header(None),
+    x_cache_bypass: Optional[str] = Header(None)
+):
     try:
-        response = await ChatService.get_response(request.session_id, request.message, db)
-        return {"response": response}
+        timings = {}
+        use_cache = cache_allowed(cache_control, x_cache_bypass)
+        response = await ChatService.get_response(request.session_id, request.message, db, where=request.where,
+                                                  timings=timings, use_cache=use_cache)
+        return {"response": response, "timings": timings}
+    except MetadataFilterError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {e}")
+    except RateLimitError:
+        raise _upstream_busy()
     except Exception as e:
         import traceback
         error_detail = str(e)
@@ -109,9 +205,46 @@ async def chat_message(request: ChatRequest, db: Session = Depends(get_db)):
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Chat error: {error_detail}")
 
-@router.get("/chat/history/{session_id}")
-def get_history(session_id: int, db: Session = Depends(get_db)):
-    return ChatService.get_chat_history(session_id, db)
+def _sse(data: dict, event: str = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+@router.post("/chat/message/stream")
+async def chat_message_stream(request: ChatRequest):
+    """Server-Sent Events: one {"token"} event per delta, then a "done" (or "error") event"""
+    async def events():
+        # The request-scoped session is closed before a streaming body runs, so own one here
+        db = AsyncSessionLocal()
+        try:
+            async for token in ChatService.stream_response(request.session_id, request.message, db, where=request.where):
+                yield _sse({"token": token})
+            yield _sse({"done": True}, event="done")
+        except MetadataFilterError as e:
+            yield _sse({"detail": f"Invalid filter: {e}"}, event="error")
+        except Exception as e:
+            import traceback
+            print(f"Chat stream error: {e}")
+            print(traceback.format_exc())
+            yield _sse({"detail": f"Chat error: {e}"}, event="error")
+        finally:
+            # On disconnect starlette cancels this scope; shield the close or the pooled connection leaks
+            with anyio.CancelScope(shield=True):
+                await db.close()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/chat/history/{session_id}", response_model=ChatHistoryPage)
+def get_history(
+    session_id: int,
+    before_id: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    return ChatService.get_chat_history(session_id, db, before_id=before_id, limit=limit)
 
 @router.post("/report")
 def generate_report(request: ReportRequest):
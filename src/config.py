@@ -6,6 +6,8 @@ load_dotenv()
 
 class Config:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    # Point at an OpenAI-compatible server, e.g. the offline stand-in in benchmarks/fake_openai.py
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
     
     # Use /tmp for Vercel serverless (writable directory)
     # Check if running on Vercel
@@ -22,6 +24,144 @@ class Config:
         VECTOR_DB_PATH = os.getenv("VECTOR_DB_PATH", "./data/vector_db")
         UPLOAD_DIR = os.getenv("UPLOAD_DIR", "./data/uploads")
 
+    # Database: async routes use ASYNC_DATABASE_URL (derived from DATABASE_URL, e.g.
+    # sqlite+aiosqlite:///...). SQLite runs in WAL mode with the given synchronous level and
+    # busy timeout so concurrent writers wait for the lock instead of failing.
+    ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL")
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() == "true"
+    SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+    # OpenAI clients: one pooled keep-alive client per process. LLM_HTTP2 needs the h2
+    # package (httpx[http2]).
+    LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+    LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").lower() == "true"
+
+    # Upstream governor for every model call. Per-model concurrency adapts between
+    # UPSTREAM_MIN_CONCURRENCY and UPSTREAM_MAX_CONCURRENCY (halved on a 429); requests/min
+    # and tokens/min buckets apply when set (0 = unlimited). Per-model overrides as JSON, e.g.
+    # UPSTREAM_LIMITS='{"gpt-4o": {"rpm": 500, "tpm": 30000, "concurrency": 16}}'.
+    UPSTREAM_MAX_CONCURRENCY = int(os.getenv("UPSTREAM_MAX_CONCURRENCY", "16"))
+    UPSTREAM_MIN_CONCURRENCY = int(os.getenv("UPSTREAM_MIN_CONCURRENCY", "1"))
+    UPSTREAM_RPM = float(os.getenv("UPSTREAM_RPM", "0"))
+    UPSTREAM_TPM = float(os.getenv("UPSTREAM_TPM", "0"))
+    UPSTREAM_LIMITS = os.getenv("UPSTREAM_LIMITS", "")
+    UPSTREAM_COMPLETION_TOKENS = int(os.getenv("UPSTREAM_COMPLETION_TOKENS", "512"))
+    UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "5"))
+    UPSTREAM_BACKOFF_BASE = float(os.getenv("UPSTREAM_BACKOFF_BASE", "0.5"))
+    UPSTREAM_BACKOFF_MAX = float(os.getenv("UPSTREAM_BACKOFF_MAX", "20"))
+
+    # Uploads are streamed to disk in UPLOAD_CHUNK_SIZE pieces and rejected past these limits
+    MAX_IMAGE_UPLOAD_MB = float(os.getenv("MAX_IMAGE_UPLOAD_MB", "20"))
+    MAX_AUDIO_UPLOAD_MB = float(os.getenv("MAX_AUDIO_UPLOAD_MB", "25"))
+    UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+    # "reuse": an upload whose content hash and prompt were analyzed before returns the stored
+    # description without calling a model; "off": always analyze. Stored files are keyed by
+    # content hash and identical concurrent uploads share one analysis either way.
+    UPLOAD_DEDUP_MODE = os.getenv("UPLOAD_DEDUP_MODE", "reuse").lower()
+
+    # Background analysis jobs: JOB_WORKERS concurrent pipelines per process (0 disables the
+    # pool, the default on Vercel where nothing runs after the response). Queued jobs live in
+    # the database; running jobs idle longer than JOB_STALE_SECONDS are picked up again.
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "0" if IS_VERCEL else "4"))
+    JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+    JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "900"))
+    JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+    # Vision inputs are downscaled to what the model uses at the chosen detail ("low", "high"
+    # or "auto": low for images within 512px), re-encoded without metadata as IMAGE_FORMAT
+    # (jpeg, webp or png) and kept in an IMAGE_CACHE_MB LRU keyed by content hash.
+    IMAGE_DETAIL = os.getenv("IMAGE_DETAIL", "auto").lower()
+    IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "2048"))
+    IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "jpeg").lower()
+    IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "85"))
+    IMAGE_CACHE_MB = float(os.getenv("IMAGE_CACHE_MB", "64"))
+
+    # Batch analysis: files (or zip members) and total megabytes per request, and how many
+    # files are analyzed at once
+    BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "200"))
+    BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    MAX_BATCH_UPLOAD_MB = float(os.getenv("MAX_BATCH_UPLOAD_MB", "500"))
+
+    # Vector store: persist the embedding index under VECTOR_DB_PATH across restarts. The
+    # persisted index is also shared by every uvicorn/gunicorn worker on the host (point
+    # VECTOR_DB_PATH at /dev/shm to keep it purely in RAM).
+    VECTOR_DB_PERSIST = os.getenv("VECTOR_DB_PERSIST", "true").lower() == "true"
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+
+    # Vector storage precision used for scoring: "float32", "float16" or "int8" (per-row
+    # scale). With a persistent index the float32 rows stay on disk and the top
+    # n * VECTOR_RESCORE_FACTOR candidates are rescored against them when VECTOR_RESCORE is on.
+    # That compact scoring copy is private to each worker process (2 or 1 bytes per
+    # dimension per document, per worker), so leave float32 when memory must stay flat
+    # across workers; only the float32 rows, records and metadata columns are shared.
+    VECTOR_STORAGE_DTYPE = os.getenv("VECTOR_STORAGE_DTYPE", "float32").lower()
+    VECTOR_RESCORE = os.getenv("VECTOR_RESCORE", "true").lower() == "true"
+    VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+
+    # Vector search mode: "exact" brute force, or "ivf" approximate search once the
+    # corpus reaches ANN_MIN_ROWS. ANN_NPROBE is the recall/latency knob (lists scanned
+    # per query); ANN_LISTS=0 picks sqrt(N); the clustering is rebuilt when the corpus
+    # grows by ANN_REBUILD_GROWTH.
+    VECTOR_INDEX_MODE = os.getenv("VECTOR_INDEX_MODE", "exact").lower()
+    ANN_MIN_ROWS = int(os.getenv("ANN_MIN_ROWS", "20000"))
+    ANN_LISTS = int(os.getenv("ANN_LISTS", "0"))
+    ANN_NPROBE = int(os.getenv("ANN_NPROBE", "8"))
+    ANN_REBUILD_GROWTH = float(os.getenv("ANN_REBUILD_GROWTH", "2.0"))
+
+    # Embedding cache: in-process LRU size, plus an optional SQLite tier under VECTOR_DB_PATH
+    EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+    EMBEDDING_CACHE_PERSIST = os.getenv("EMBEDDING_CACHE_PERSIST", "true").lower() == "true"
+
+    # Retrieval: "vector", "lexical" (BM25) or "hybrid" (reciprocal-rank fusion of both).
+    # Hybrid skips the embedding call when the best BM25 hit covers the whole query
+    # (LEXICAL_FAST_PATH_COVERAGE of its idf mass) with at least LEXICAL_FAST_PATH_MIN_SCORE.
+    # The BM25 index is built in the background on first use; until then hybrid ranks by vectors.
+    # It is held in each worker process, so "vector" keeps memory flat across workers.
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    LEXICAL_FAST_PATH_COVERAGE = float(os.getenv("LEXICAL_FAST_PATH_COVERAGE", "1.0"))
+    LEXICAL_FAST_PATH_MIN_SCORE = float(os.getenv("LEXICAL_FAST_PATH_MIN_SCORE", "8.0"))
+
+    # Ingestion chunking (approximate tokens) and number of chunks retrieved per chat turn
+    CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+    CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+    RAG_TOP_K = int(os.getenv("RAG_TOP_K", "5"))
+
+    # Chat prompt budget (approximate tokens). The latest CHAT_RECENT_TURNS messages stay
+    # verbatim; older ones are folded into a per-session rolling summary by
+    # CHAT_SUMMARY_MODEL once CHAT_SUMMARY_BATCH of them are waiting.
+    CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "6000"))
+    CHAT_HISTORY_LIMIT = int(os.getenv("CHAT_HISTORY_LIMIT", "20"))
+    CHAT_RECENT_TURNS = int(os.getenv("CHAT_RECENT_TURNS", "10"))
+    CHAT_SUMMARY_BATCH = int(os.getenv("CHAT_SUMMARY_BATCH", "6"))
+    CHAT_SUMMARY_MODEL = os.getenv("CHAT_SUMMARY_MODEL", "gpt-4o-mini")
+
+    # Chat: skip retrieval (and its embedding call) when the store is empty or the turn is small talk
+    CHAT_SPECULATIVE_RETRIEVAL = os.getenv("CHAT_SPECULATIVE_RETRIEVAL", "true").lower() == "true"
+
+    # LLM response cache. Only endpoints listed in RESPONSE_CACHE_ENDPOINTS are cached
+    # (analyze_text, generate_json, chat = first turn of a session); those also listed in
+    # RESPONSE_CACHE_SEMANTIC_ENDPOINTS reuse answers whose request embedding is at least
+    # RESPONSE_CACHE_SEMANTIC_THRESHOLD cosine-similar. Clients bypass the cache with
+    # "Cache-Control: no-cache" or "X-Cache-Bypass: 1".
+    RESPONSE_CACHE_ENDPOINTS = {e.strip() for e in os.getenv("RESPONSE_CACHE_ENDPOINTS", "analyze_text,generate_json").split(",") if e.strip()}
+    RESPONSE_CACHE_SEMANTIC_ENDPOINTS = {e.strip() for e in os.getenv("RESPONSE_CACHE_SEMANTIC_ENDPOINTS", "").split(",") if e.strip()}
+    RESPONSE_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SEMANTIC_THRESHOLD", "0.97"))
+    RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+    RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600"))
+
+    # Embedding batching: requests arriving within the window share one API call
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+    EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5"))
+
     @staticmethod
     def ensure_dirs():
         try:
@@ -0,0 +1,106 @@
+import numpy as np
+
+class IVFIndex:
+    """Inverted-file ANN index over L2-normalized rows.
+
+    Rows are clustered with spherical k-means; a query scores the centroids,
+    then only the rows in the nprobe closest lists. Raising nprobe trades
+    latency for recall. New rows are assigned to their nearest existing
+    centroid, and the clustering is rebuilt once the corpus has grown by
+    rebuild_growth since the last build.
+    """
+
+    _ASSIGN_CHUNK = 8192
+
+    def __init__(self, n_lists: int = 0, nprobe: int = 8, iterations: int = 10,
+                 rebuild_growth: float = 2.0, sample_per_list: int = 64, seed: int = 0):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.rebuild_growth = rebuild_growth
+        self.sample_per_list = sample_per_list
+        self._rng = np.random.default_rng(seed)
+        self.centroids = None
+        self._lists = []  # per-centroid list of row-id arrays, concatenated lazily
+        self.built_rows = 0
+        self.indexed_rows = 0
+
+    @property
+    def is_built(self) -> bool:
+        return self.centroids is not None
+
+    def needs_rebuild(self, total_rows: int) -> bool:
+        return not self.is_built or total_rows >= self.built_rows * self.rebuild_growth
+
+    def _assign(self, vectors):
+        """Nearest-centroid id for each row, computed in chunks to bound memory"""
+        labels = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], self._ASSIGN_CHUNK):
+            block = np.asarray(vectors[start:start + self._ASSIGN_CHUNK], dtype=np.float32)
+            labels[start:start + block.shape[0]] = np.argmax(block @ self.centroids.T, axis=1)
+        return labels
+
+    def build(self, rows):
+        """Cluster all rows from scratch"""
+        total = rows.shape[0]
+        n_lists = self.n_lists or max(1, int(np.sqrt(total)))
+        n_lists = min(n_lists, total)
+        sample_size = min(total, n_lists * self.sample_per_list)
+        sample_ids = np.sort(self._rng.choice(total, size=sample_size, replace=False))
+        sample = np.asarray(rows[sample_ids], dtype=np.float32)
+
+        centroids = sample[self._rng.choice(sample_size, size=n_lists, replace=False)].copy()
+        for _ in range(self.iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[self._rng.choice(sample_size, size=int(empty.sum()))]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            centroids = sums / norms
+
+        self.centroids = centroids.astype(np.float32)
+        labels = self._assign(rows)
+        order = np.argsort(labels, kind="stable")
+        bounds = np.searchsorted(labels[order], np.arange(n_lists + 1))
+        self._lists = [[order[bounds[i]:bounds[i + 1]]] for i in range(n_lists)]
+        self.built_rows = total
+        self.indexed_rows = total
+
+    def add(self, start_row: int, vectors):
+        """Index rows start_row..start_row+len(vectors) against the current centroids"""
+        if not self.is_built:
+            return
+        labels = self._assign(vectors)
+        row_ids = np.arange(start_row, start_row + vectors.shape[0])
+        for label in np.unique(labels):
+            self._lists[label].append(row_ids[labels == label])
+        self.indexed_rows = start_row + vectors.shape[0]
+
+    def _list(self, label: int):
+        parts = self._lists[label]
+        if len(parts) > 1:
+            parts[:] = [np.concatenate(parts)]
+        return parts[0]
+
+    def candidates(self, query_vector, nprobe: int = None):
+        """Row ids from the nprobe lists whose centroids are closest to the query"""
+        nprobe = min(nprobe or self.nprobe, self.centroids.shape[0])
+        centroid_scores = self.centroids @ query_vector
+        if nprobe < centroid_scores.shape[0]:
+            probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            probe = np.arange(centroid_scores.shape[0])
+        return np.concatenate([self._list(label) for label in probe])
+
+    def stats(self) -> dict:
+        return {
+            "built": self.is_built,
+            "lists": 0 if self.centroids is None else int(self.centroids.shape[0]),
+            "nprobe": self.nprobe,
+            "built_rows": self.built_rows,
+            "indexed_rows": self.indexed_rows
+        }
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+
+def grow(array, count: int, needed: int):
+    """Return array, or a copy of its first count rows with doubled capacity, holding needed rows"""
+    if needed <= array.shape[0]:
+        return array
+    capacity = max(array.shape[0], 1)
+    while capacity < needed:
+        capacity *= 2
+    grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+    grown[:count] = array[:count]
+    return grown
+
+class InMemoryColumn:
+    """Growable 1-D array; same interface as MappedColumn"""
+    _INITIAL_CAPACITY = 64
+
+    def __init__(self, dtype):
+        self._data = np.empty(self._INITIAL_CAPACITY, dtype=dtype)
+        self.count = 0
+
+    def stored_rows(self) -> int:
+        return self.count
+
+    def refresh(self, count: int):
+        pass
+
+    def values(self):
+        return self._data[:self.count]
+
+    def write_rows(self, start: int, values, fill=None):
+        """Store values from row start on; rows between the current end and start get fill"""
+        values = np.asarray(values, dtype=self._data.dtype)
+        needed = start + values.shape[0]
+        self._data = grow(self._data, self.count, needed)
+        if start > self.count:
+            self._data[self.count:start] = fill
+        self._data[start:needed] = values
+        self.count = needed
+
+    def truncate(self, count: int):
+        self.count = min(self.count, count)
+
+class MappedColumn:
+    """Append-only 1-D array stored in a raw file and read through a memory map.
+
+    count is how many rows this process has mapped; other processes may have stored
+    more (stored_rows) that become visible after refresh(count).
+    """
+
+    def __init__(self, path: str, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self._map = None
+        self.count = 0
+        self.refresh(self.stored_rows())
+
+    def stored_rows(self) -> int:
+        return os.path.getsize(self.path) // self.dtype.itemsize if os.path.exists(self.path) else 0
+
+    def refresh(self, count: int):
+        if count != self.count:
+            self.count = count
+            self._map = np.memmap(self.path, dtype=self.dtype, mode="r", shape=(count,)) if count else None
+
+    def values(self):
+        if self._map is None:
+            return np.empty(0, dtype=self.dtype)
+        return self._map
+
+    def write_rows(self, start: int, values, fill=None):
+        """Write values from row start on, dropping anything stored beyond them; rows between
+        the stored end and start get fill"""
+        values = np.asarray(values, dtype=self.dtype)
+        stored = self.stored_rows()
+        offset = min(start, stored)
+        if offset < start:
+            values = np.concatenate([np.full(start - offset, fill, dtype=self.dtype), values])
+        with open(self.path, "r+b" if os.path.exists(self.path) else "w+b") as f:
+            f.seek(offset * self.dtype.itemsize)
+            f.write(values.tobytes())
+            f.truncate()
+        self.refresh(offset + values.shape[0])
+
+    def truncate(self, count: int):
+        """Drop rows beyond count (used to repair a torn write)"""
+        if self.stored_rows() > count:
+            with open(self.path, "r+b") as f:
+                f.truncate(count * self.dtype.itemsize)
+        self.refresh(min(self.count, count))
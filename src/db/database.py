@@ -1,13 +1,63 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from src.config import config
 
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def _async_url(url: str) -> str:
+    """Async driver URL: sqlite:///... becomes sqlite+aiosqlite:///..."""
+    if config.ASYNC_DATABASE_URL:
+        return config.ASYNC_DATABASE_URL
+    if url.startswith("sqlite:"):
+        return "sqlite+aiosqlite:" + url[len("sqlite:"):]
+    return url
+
+def _engine_options(url: str) -> dict:
+    if _is_sqlite(url) and (url.endswith(":memory:") or url.rstrip("/") in ("sqlite:", "sqlite+aiosqlite:")):
+        return {}  # in-memory databases live in a single connection
+    return {
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_pre_ping": True
+    }
+
+_SYNCHRONOUS_LEVELS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the single writer; busy_timeout makes writers wait
+    for the lock instead of failing with "database is locked"."""
+    cursor = dbapi_connection.cursor()
+    if config.SQLITE_WAL:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    synchronous = config.SQLITE_SYNCHRONOUS if config.SQLITE_SYNCHRONOUS in _SYNCHRONOUS_LEVELS else "NORMAL"
+    cursor.execute(f"PRAGMA synchronous={synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
 engine = create_engine(
-    config.DATABASE_URL, connect_args={"check_same_thread": False}
+    config.DATABASE_URL,
+    connect_args={"check_same_thread": False} if _is_sqlite(config.DATABASE_URL) else {},
+    **_engine_options(config.DATABASE_URL)
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine for the async routes, so commits do not block the event loop. aiosqlite
+# defaults to NullPool (a new connection per checkout), so ask for a real pool.
+_async_options = _engine_options(_async_url(config.DATABASE_URL))
+if _async_options:
+    _async_options["poolclass"] = AsyncAdaptedQueuePool
+async_engine = create_async_engine(_async_url(config.DATABASE_URL), **_async_options)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+if _is_sqlite(config.DATABASE_URL):
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
 Base = declarative_base()
 
 def get_db():
@@ -16,3 +66,30 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_engines():
+    await async_engine.dispose()
+    engine.dispose()
+
+def upgrade_schema(bind=None):
+    """Additive migration for existing databases: create_all only creates missing tables,
+    so add any model columns (as nullable) and indexes that an older table lacks"""
+    bind = bind or engine
+    inspector = inspect(bind)
+    existing_tables = set(inspector.get_table_names())
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing_columns:
+                    column_type = column.type.compile(dialect=bind.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
@@ -0,0 +1,110 @@
+import math
+import re
+from collections import Counter
+from typing import List
+import numpy as np
+
+_TOKEN = re.compile(r"\w+(?:[.\-]\w+)*")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be but by did do does for from had has have he her his how i if in "
+    "into is it its me my no not of on or our she so than that the their them then there "
+    "these they this to was we were what when where which who why will with you your".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; compound identifiers such as 'q3_report.pdf' or 'gpt-4o'
+    are kept whole and also split into their parts"""
+    tokens = []
+    for match in _TOKEN.finditer(text.lower()):
+        token = match.group()
+        if token in _STOPWORDS:
+            continue
+        tokens.append(token)
+        if "." in token or "-" in token or "_" in token:
+            tokens.extend(part for part in re.split(r"[._\-]", token) if part and part not in _STOPWORDS)
+    return tokens
+
+class BM25Index:
+    """Incrementally maintained Okapi BM25 inverted index over row-aligned documents"""
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}  # term -> ([rows], [term frequencies])
+        self._arrays = {}  # term -> (rows ndarray, tf ndarray), invalidated on append
+        self._lengths = []
+        self._lengths_array = None
+        self._total_length = 0
+
+    @property
+    def count(self) -> int:
+        return len(self._lengths)
+
+    def add(self, text: str):
+        row = len(self._lengths)
+        terms = Counter(tokenize(text))
+        for term, tf in terms.items():
+            rows, tfs = self._postings.setdefault(term, ([], []))
+            rows.append(row)
+            tfs.append(tf)
+            self._arrays.pop(term, None)
+        length = sum(terms.values())
+        self._lengths.append(length)
+        self._lengths_array = None
+        self._total_length += length
+
+    def add_many(self, texts):
+        for text in texts:
+            self.add(text)
+
+    def _idf(self, term: str) -> float:
+        df = len(self._postings[term][0]) if term in self._postings else 0
+        return math.log(1 + (self.count - df + 0.5) / (df + 0.5))
+
+    def _posting_arrays(self, term: str):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            rows, tfs = self._postings[term]
+            arrays = (np.asarray(rows, dtype=np.int64), np.asarray(tfs, dtype=np.float32))
+            self._arrays[term] = arrays
+        return arrays
+
+    def search(self, query: str, n_results: int, allowed=None):
+        """Return (rows, scores, coverage) for the best n_results rows.
+
+        coverage[i] is the share of the query's idf mass whose terms occur in row i,
+        counting query terms absent from the corpus; 1.0 means every term matched.
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32), np.empty(0))
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not self.count:
+            return empty
+        if self._lengths_array is None:
+            self._lengths_array = np.asarray(self._lengths, dtype=np.float32)
+        avg_length = self._total_length / self.count or 1.0
+        scores = np.zeros(self.count, dtype=np.float32)
+        matched_idf = np.zeros(self.count, dtype=np.float64)
+        total_idf = 0.0
+        for term in terms:
+            idf = self._idf(term)
+            total_idf += idf
+            if term not in self._postings:
+                continue
+            rows, tfs = self._posting_arrays(term)
+            norm = self.k1 * (1 - self.b + self.b * self._lengths_array[rows] / avg_length)
+            scores[rows] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+            matched_idf[rows] += idf
+        if allowed is not None:
+            mask = np.zeros(self.count, dtype=bool)
+            mask[allowed] = True
+            scores[~mask] = 0
+        hits = np.flatnonzero(scores > 0)
+        if hits.shape[0] == 0:
+            return empty
+        k = min(n_results, hits.shape[0])
+        if k < hits.shape[0]:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        order = hits[np.argsort(-scores[hits], kind="stable")]
+        coverage = matched_idf[order] / total_idf if total_idf else np.zeros(order.shape[0])
+        return order, scores[order], coverage
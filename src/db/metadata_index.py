@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Dict, Optional
+import numpy as np
+from src.db.columns import InMemoryColumn, MappedColumn
+
+class MetadataFilterError(ValueError):
+    """Raised for a malformed where= filter"""
+
+_RANGE_OPERATORS = {"$gt", "$gte", "$lt", "$lte"}
+
+def _as_number(value):
+    """Range bounds may be numbers (epoch seconds for uploaded_at) or ISO-8601 strings"""
+    if isinstance(value, bool):
+        raise MetadataFilterError(f"Range bound must be a number or ISO date, got {value!r}")
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            pass
+    raise MetadataFilterError(f"Range bound must be a number or ISO date, got {value!r}")
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+def _check_operand(field: str, value):
+    try:
+        hash(value)
+    except TypeError:
+        raise MetadataFilterError(f"Value for '{field}' must be a string, number or boolean, got {value!r}")
+
+def _check_condition(field: str, condition):
+    if not isinstance(condition, dict):
+        _check_operand(field, condition)
+        return
+    operators = set(condition)
+    if operators <= _RANGE_OPERATORS:
+        for bound in condition.values():
+            _as_number(bound)
+    elif operators == {"$in"}:
+        if not isinstance(condition["$in"], list):
+            raise MetadataFilterError(f"$in for '{field}' must be a list")
+        for value in condition["$in"]:
+            _check_operand(field, value)
+    elif operators == {"$eq"}:
+        _check_operand(field, condition["$eq"])
+    else:
+        raise MetadataFilterError(f"Unsupported operators for '{field}': {sorted(operators)}")
+
+def validate_where(where: Optional[Dict]):
+    """Raise MetadataFilterError for a malformed filter without touching any index"""
+    if not where:
+        return
+    if not isinstance(where, dict):
+        raise MetadataFilterError("where must be an object")
+    for field, condition in where.items():
+        _check_condition(field, condition)
+
+def value_key(value) -> int:
+    """64-bit key of a string or boolean metadata value (0 marks a row without one)"""
+    digest = hashlib.blake2b(json.dumps(value, default=str).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+# Column kinds: dtype and the value stored for rows that lack the field
+_KINDS = {"key": (np.uint64, 0), "number": (np.float64, np.nan)}
+
+class MetadataIndex:
+    """Row-aligned metadata columns evaluated with vectorized masks.
+
+    Filters use a Chroma-style where= dict; top-level fields are ANDed:
+        {"type": "audio", "filename": {"$in": ["a.mp3", "b.mp3"]},
+         "uploaded_at": {"$gte": "2024-05-01T00:00:00"}}
+
+    Each field has a "key" column (value_key of string and boolean values, for equality)
+    and/or a "number" column (for equality and ranges), so near-unique values such as
+    uploaded_at timestamps cost 8 bytes per row rather than a posting each. With a
+    directory the columns are raw files read through memory maps and shared by every
+    process; a column may be shorter than count, the missing rows having no value.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self._columns = {}  # (field, kind) -> InMemoryColumn or MappedColumn
+        self.count = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, field: str, kind: str) -> str:
+        name = hashlib.blake2b(field.encode("utf-8"), digest_size=8).hexdigest()
+        return os.path.join(self.directory, f"{name}.{kind}")
+
+    def _column(self, field: str, kind: str, create: bool = False):
+        column = self._columns.get((field, kind))
+        if column is None:
+            dtype = _KINDS[kind][0]
+            if self.directory is None:
+                if not create:
+                    return None
+                column = InMemoryColumn(dtype)
+            else:
+                path = self._path(field, kind)
+                if not create and not os.path.exists(path):
+                    return None  # not cached: another process may create it later
+                column = MappedColumn(path, dtype)
+            self._columns[(field, kind)] = column
+        return column
+
+    def add_many(self, start_row: int, metadatas):
+        """Store rows start_row.. (the caller serializes writers and sets nothing beyond them)"""
+        values = {}  # (field, kind) -> {row offset: value}
+        n = 0
+        for n, metadata in enumerate(metadatas, 1):
+            for field, value in (metadata or {}).items():
+                if isinstance(value, (list, dict)) or value is None:
+                    continue
+                if _is_number(value):
+                    values.setdefault((field, "number"), {})[n - 1] = float(value)
+                else:
+                    values.setdefault((field, "key"), {})[n - 1] = value_key(value)
+        for (field, kind), column_values in values.items():
+            dtype, missing = _KINDS[kind]
+            block = np.full(n, missing, dtype=dtype)
+            block[list(column_values)] = list(column_values.values())
+            self._column(field, kind, create=True).write_rows(start_row, block, fill=missing)
+        self.count = max(self.count, start_row + n)
+
+    def add(self, row: int, metadata: dict):
+        self.add_many(row, [metadata])
+
+    def truncate(self, count: int):
+        """Drop stored values for rows from count on (including columns other processes made)"""
+        if self.directory is not None:
+            for name in os.listdir(self.directory):
+                kind = os.path.splitext(name)[1].lstrip(".")
+                if kind in _KINDS:
+                    MappedColumn(os.path.join(self.directory, name), _KINDS[kind][0]).truncate(count)
+        for column in self._columns.values():
+            column.truncate(count)
+        self.count = min(self.count, count)
+
+    def _values(self, field: str, kind: str):
+        """The field's column values for rows below count (possibly fewer), or None"""
+        column = self._column(field, kind)
+        if column is None:
+            return None
+        column.refresh(min(column.stored_rows(), self.count))
+        return column.values()
+
+    def _match_values(self, mask, field: str, values):
+        keys = [value_key(v) for v in values if not _is_number(v)]
+        numbers = [float(v) for v in values if _is_number(v)]
+        for kind, wanted in (("key", keys), ("number", numbers)):
+            column = self._values(field, kind) if wanted else None
+            if column is not None:
+                mask[:column.shape[0]] |= np.isin(column, wanted)
+
+    def _match_range(self, mask, field: str, condition: dict):
+        column = self._values(field, "number")
+        if column is None:
+            return
+        matched = np.ones(column.shape[0], dtype=bool)
+        for operator, bound in condition.items():
+            bound = _as_number(bound)
+            if operator == "$gt":
+                matched &= column > bound
+            elif operator == "$gte":
+                matched &= column >= bound
+            elif operator == "$lt":
+                matched &= column < bound
+            elif operator == "$lte":
+                matched &= column <= bound
+        mask[:column.shape[0]] = matched
+
+    def _condition_mask(self, field: str, condition):
+        mask = np.zeros(self.count, dtype=bool)
+        if not isinstance(condition, dict):
+            self._match_values(mask, field, [condition])
+        elif set(condition) <= _RANGE_OPERATORS:
+            self._match_range(mask, field, condition)
+        elif set(condition) == {"$eq"}:
+            self._match_values(mask, field, [condition["$eq"]])
+        else:
+            self._match_values(mask, field, condition["$in"])
+        return mask
+
+    def filter_rows(self, where: Optional[Dict]) -> Optional[np.ndarray]:
+        """Sorted row ids matching every condition, or None when there is no filter"""
+        validate_where(where)
+        if not where:
+            return None
+        mask = None
+        for field, condition in where.items():
+            condition_mask = self._condition_mask(field, condition)
+            mask = condition_mask if mask is None else mask & condition_mask
+            if not mask.any():
+                break
+        return np.flatnonzero(mask)
@@ -0,0 +1,69 @@
+"""Compare vector storage modes on the persisted index (or synthetic data if it is empty).
+
+Usage: python -m src.db.quantization_report [--queries 200] [--k 10]
+
+For each mode it prints bytes per stored vector and recall@k against exact float32
+search, with and without full-precision rescoring of the top k * VECTOR_RESCORE_FACTOR.
+"""
+import argparse
+import os
+import numpy as np
+from src.config import config
+from src.db.vector_index import InMemoryMatrix, PersistentVectorIndex, QuantizedMatrix
+
+def _top(scores, k):
+    best = np.argpartition(-scores, k - 1)[:k]
+    return best[np.argsort(-scores[best])]
+
+def evaluate(rows, n_queries: int = 200, k: int = 10, rescore_factor: int = 4, seed: int = 0):
+    """Recall@k of each storage mode for queries made by perturbing random stored rows"""
+    rng = np.random.default_rng(seed)
+    rows = np.asarray(rows, dtype=np.float32)
+    k = min(k, rows.shape[0])
+    queries = rows[rng.choice(rows.shape[0], size=n_queries)] + 0.05 * rng.standard_normal((n_queries, rows.shape[1])).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    exact = InMemoryMatrix()
+    exact.append_many(rows)
+    truth = [set(_top(exact.scores(q), k).tolist()) for q in queries]
+    report = [{"mode": "float32", "bytes_per_document": exact.bytes_per_row, "recall": 1.0, "recall_rescored": 1.0}]
+    for dtype in QuantizedMatrix.DTYPES:
+        matrix = QuantizedMatrix(dtype)
+        matrix.append_many(rows)
+        hits = rescored_hits = 0
+        for query, expected in zip(queries, truth):
+            approx = matrix.scores(query)
+            hits += len(expected & set(_top(approx, k).tolist()))
+            pool = _top(approx, min(k * rescore_factor, rows.shape[0]))
+            rescored = pool[_top(exact.scores(query, pool), k)]
+            rescored_hits += len(expected & set(rescored.tolist()))
+        report.append({
+            "mode": dtype,
+            "bytes_per_document": matrix.bytes_per_row,
+            "recall": hits / (k * n_queries),
+            "recall_rescored": rescored_hits / (k * n_queries)
+        })
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rows = None
+    if os.path.exists(os.path.join(config.VECTOR_DB_PATH, "index.json")):
+        rows = PersistentVectorIndex(config.VECTOR_DB_PATH).matrix.rows()
+    if rows is None or rows.shape[0] < args.k:
+        print("Vector index is empty, using 20000 synthetic 1536-d vectors")
+        rng = np.random.default_rng(0)
+        rows = rng.standard_normal((20000, 1536)).astype(np.float32)
+        rows /= np.linalg.norm(rows, axis=1, keepdims=True)
+
+    print(f"{rows.shape[0]} documents, recall@{args.k} over {args.queries} queries")
+    print(f"{'mode':<8} {'bytes/doc':>10} {'recall':>8} {'rescored':>9}")
+    for row in evaluate(rows, args.queries, args.k, config.VECTOR_RESCORE_FACTOR):
+        print(f"{row['mode']:<8} {row['bytes_per_document']:>10} {row['recall']:>8.3f} {row['recall_rescored']:>9.3f}")
+
+if __name__ == "__main__":
+    main()
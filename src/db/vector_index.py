@@ -0,0 +1,402 @@
+import os
+import json
+import mmap
+import struct
+from contextlib import contextmanager
+from typing import List
+import numpy as np
+from src.db.columns import MappedColumn, grow
+from src.db.metadata_index import MetadataIndex
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+class InMemoryMatrix:
+    """Growable float32 row matrix that doubles its capacity when full"""
+    _INITIAL_CAPACITY = 64
+
+    def __init__(self):
+        self._data = None
+        self.count = 0
+
+    @property
+    def dim(self):
+        return self._data.shape[1] if self._data is not None else None
+
+    def append(self, vector):
+        self.append_many(vector.reshape(1, -1))
+
+    def append_many(self, vectors):
+        needed = self.count + vectors.shape[0]
+        if self._data is None:
+            self._data = np.empty((max(self._INITIAL_CAPACITY, needed), vectors.shape[1]), dtype=np.float32)
+        self._data = grow(self._data, self.count, needed)
+        self._data[self.count:needed] = vectors
+        self.count = needed
+
+    def rows(self):
+        if self._data is None:
+            return np.empty((0, 0), dtype=np.float32)
+        return self._data[:self.count]
+
+    def scores(self, query_vector, rows=None):
+        data = self.rows()
+        return (data if rows is None else data[rows]) @ query_vector
+
+    @property
+    def bytes_per_row(self) -> int:
+        return (self.dim or 0) * 4
+
+class MappedMatrix:
+    """Append-only float32 row matrix stored in a raw file and read through a memory map"""
+
+    def __init__(self, path: str, dim: int = None):
+        self.path = path
+        self._dim = dim
+        self._map = None
+        self.count = 0
+        if dim and os.path.exists(path):
+            self.count = os.path.getsize(path) // (dim * 4)
+            self._remap()
+
+    @property
+    def dim(self):
+        return self._dim
+
+    def _remap(self):
+        if self.count:
+            self._map = np.memmap(self.path, dtype=np.float32, mode="r", shape=(self.count, self._dim))
+        else:
+            self._map = None
+
+    def refresh(self, dim: int, count: int):
+        """Map rows appended by another process, up to the published count"""
+        self._dim = dim
+        if count != self.count:
+            self.count = count
+            self._remap()
+
+    def truncate(self, count: int):
+        """Drop rows beyond count (used to repair a torn write)"""
+        with open(self.path, "r+b") as f:
+            f.truncate(count * self._dim * 4)
+        self.count = count
+        self._remap()
+
+    def append(self, vector):
+        self.append_many(vector.reshape(1, -1))
+
+    def append_many(self, vectors):
+        self.write_rows(self.count, vectors)
+
+    def write_rows(self, start: int, vectors):
+        """Write rows from row start on, dropping anything left beyond them by a failed write"""
+        if self._dim is None:
+            self._dim = vectors.shape[1]
+        with open(self.path, "r+b" if os.path.exists(self.path) else "w+b") as f:
+            f.seek(start * self._dim * 4)
+            f.write(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+            f.truncate()
+        self.count = start + vectors.shape[0]
+        self._remap()
+
+    def rows(self):
+        if self._map is None:
+            return np.empty((0, self._dim or 0), dtype=np.float32)
+        return self._map
+
+    def scores(self, query_vector, rows=None):
+        data = self.rows()
+        return (data if rows is None else data[rows]) @ query_vector
+
+    @property
+    def bytes_per_row(self) -> int:
+        return (self._dim or 0) * 4
+
+class _DequantizedView:
+    """Read-only float32 view of a QuantizedMatrix, dequantizing only the rows indexed"""
+
+    def __init__(self, matrix):
+        self._matrix = matrix
+        self.shape = (matrix.count, matrix.dim or 0)
+
+    def __getitem__(self, index):
+        return self._matrix.dequantize(np.arange(self.shape[0])[index])
+
+class QuantizedMatrix:
+    """Compact row matrix: float16, or int8 codes with a per-row scale (row ~= codes * scale)"""
+    _INITIAL_CAPACITY = 64
+    _SCORE_CHUNK = 16384
+    DTYPES = ("float16", "int8")
+
+    def __init__(self, dtype: str):
+        if dtype not in self.DTYPES:
+            raise ValueError(f"Unsupported quantized dtype '{dtype}', expected one of {self.DTYPES}")
+        self.dtype = dtype
+        self._codes = None
+        self._scales = None
+        self.count = 0
+
+    @property
+    def dim(self):
+        return self._codes.shape[1] if self._codes is not None else None
+
+    @property
+    def bytes_per_row(self) -> int:
+        if self._codes is None:
+            return 0
+        return self._codes.shape[1] * self._codes.itemsize + (4 if self.dtype == "int8" else 0)
+
+    def append(self, vector):
+        self.append_many(vector.reshape(1, -1))
+
+    def append_many(self, vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        needed = self.count + vectors.shape[0]
+        if self._codes is None:
+            capacity = max(self._INITIAL_CAPACITY, needed)
+            self._codes = np.empty((capacity, vectors.shape[1]), dtype=np.float16 if self.dtype == "float16" else np.int8)
+            self._scales = np.ones(capacity, dtype=np.float32)
+        self._codes = grow(self._codes, self.count, needed)
+        self._scales = grow(self._scales, self.count, needed)
+        if self.dtype == "float16":
+            self._codes[self.count:needed] = vectors.astype(np.float16)
+        else:
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1
+            self._codes[self.count:needed] = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+            self._scales[self.count:needed] = scales
+        self.count = needed
+
+    def dequantize(self, rows):
+        block = self._codes[rows].astype(np.float32)
+        if self.dtype == "int8":
+            block *= self._scales[rows][:, None]
+        return block
+
+    def rows(self):
+        return _DequantizedView(self)
+
+    def scores(self, query_vector, rows=None):
+        """Approximate dot products, converting at most _SCORE_CHUNK rows to float32 at a time"""
+        if rows is None:
+            rows = np.arange(self.count)
+        scores = np.empty(rows.shape[0], dtype=np.float32)
+        for start in range(0, rows.shape[0], self._SCORE_CHUNK):
+            chunk = rows[start:start + self._SCORE_CHUNK]
+            if chunk.shape[0] and chunk[-1] - chunk[0] == chunk.shape[0] - 1:
+                chunk = slice(int(chunk[0]), int(chunk[-1]) + 1)  # contiguous: avoid a fancy-index copy
+            partial = self._codes[chunk].astype(np.float32) @ query_vector
+            if self.dtype == "int8":
+                partial *= self._scales[chunk]
+            scores[start:start + partial.shape[0]] = partial
+        return scores
+
+class DocumentLog:
+    """Append-only JSON-lines sidecar holding id, text and metadata for each matrix row.
+
+    documents.idx holds each record's end offset, so records are read by row on demand
+    instead of being loaded up front.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.offsets = MappedColumn(f"{os.path.splitext(path)[0]}.idx", np.uint64)
+
+    @staticmethod
+    def encode(docs: List[dict]) -> List[bytes]:
+        return [(json.dumps(doc) + "\n").encode("utf-8") for doc in docs]
+
+    def _start(self, row: int) -> int:
+        return int(self.offsets.values()[row - 1]) if row else 0
+
+    def read(self, rows) -> List[dict]:
+        """Records at the given row ids (all below the mapped count)"""
+        ends = self.offsets.values()
+        documents = []
+        with open(self.path, "rb") as f:
+            for row in rows:
+                start = self._start(row)
+                f.seek(start)
+                documents.append(json.loads(f.read(int(ends[row]) - start)))
+        return documents
+
+    def read_range(self, start: int, stop: int) -> List[dict]:
+        """Records start..stop in one sequential read"""
+        if stop <= start:
+            return []
+        begin = self._start(start)
+        with open(self.path, "rb") as f:
+            f.seek(begin)
+            data = f.read(int(self.offsets.values()[stop - 1]) - begin)
+        return [json.loads(line) for line in data.split(b"\n")[:-1]]
+
+    def scan(self):
+        """Yield (record, end offset) for every complete line, stopping at a partial one"""
+        if not os.path.exists(self.path):
+            return
+        end = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    document = json.loads(line)
+                except ValueError:
+                    break
+                end += len(line)
+                yield document, end
+
+    def complete_records(self) -> int:
+        """Indexed records that lie wholly within the log (a crash can leave either file ahead)"""
+        size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self.offsets.refresh(self.offsets.stored_rows())
+        return int(np.searchsorted(self.offsets.values(), size, side="right"))
+
+    def write(self, start_row: int, lines: List[bytes]):
+        """Write encoded records from row start_row on, dropping anything beyond them. The
+        log is written before the offsets, so an offset never points past written data."""
+        base = self._start(start_row)
+        with open(self.path, "r+b" if os.path.exists(self.path) else "w+b") as f:
+            f.seek(base)
+            f.write(b"".join(lines))
+            f.truncate()
+        ends = base + np.cumsum([len(line) for line in lines], dtype=np.uint64)
+        self.offsets.write_rows(start_row, ends)
+
+    def truncate(self, count: int):
+        """Keep the first count records (all mapped)"""
+        end = self._start(count)
+        if os.path.exists(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(end)
+        self.offsets.truncate(count)
+
+class GenerationCounter:
+    """Committed row count in a small memory-mapped file, shared by every process.
+
+    The writer bumps it only after the matrix and sidecar are fully written, so a
+    reader that sees generation N can safely map N rows and read N records.
+    """
+
+    def __init__(self, path: str):
+        if not os.path.exists(path) or os.path.getsize(path) < 8:
+            with open(path, "wb") as f:
+                f.write(b"\0" * 8)
+        self._file = open(path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 8)
+
+    def read(self) -> int:
+        return struct.unpack_from("<Q", self._map, 0)[0]
+
+    def publish(self, value: int):
+        struct.pack_into("<Q", self._map, 0, value)
+
+class PersistentVectorIndex:
+    """On-disk layout under VECTOR_DB_PATH: index.json (dim), embeddings.f32, documents.jsonl
+    with its documents.idx offsets, metadata/ filter columns, plus a generation counter and
+    a write lock so several worker processes can share it.
+
+    Every worker maps the same files (one copy in the page cache, however many workers),
+    and opening reads no records: queries read text and metadata for the rows they return
+    and scan the mapped metadata columns. Appends are serialized with an exclusive flock
+    on write.lock, so whichever worker holds it is the single writer at that moment; the
+    others pick up new rows through the generation counter.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._header_path = os.path.join(directory, "index.json")
+        self._lock_path = os.path.join(directory, "write.lock")
+        self.log = DocumentLog(os.path.join(directory, "documents.jsonl"))
+        self.metadata = MetadataIndex(os.path.join(directory, "metadata"))
+        self.matrix = MappedMatrix(os.path.join(directory, "embeddings.f32"), self._read_dim())
+        self.generation = GenerationCounter(os.path.join(directory, "generation"))
+
+    def _read_dim(self):
+        if os.path.exists(self._header_path):
+            with open(self._header_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("dim")
+        return None
+
+    @contextmanager
+    def write_lock(self):
+        with open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _index_log(self):
+        """Build documents.idx and the metadata columns for a log written before they existed
+        (reads the whole log once; the offsets go last so a crash here redoes it)"""
+        print("Warning: Indexing a vector store log written by an older version, this runs once")
+        self.metadata.truncate(0)
+        ends = []
+        pending = []
+        for document, end in self.log.scan():
+            ends.append(end)
+            pending.append(document.get("metadata") or {})
+            if len(pending) == 4096:
+                self.metadata.add_many(len(ends) - len(pending), pending)
+                pending = []
+        self.metadata.add_many(len(ends) - len(pending), pending)
+        self.log.offsets.write_rows(0, np.asarray(ends, dtype=np.uint64))
+
+    def load(self) -> int:
+        """Repair any row/record mismatch left by a crash; returns the committed row count"""
+        with self.write_lock():
+            dim = self._read_dim()
+            if dim and os.path.exists(self.matrix.path):
+                self.matrix.refresh(dim, os.path.getsize(self.matrix.path) // (dim * 4))
+            if os.path.exists(self.log.path) and not os.path.exists(self.log.offsets.path):
+                self._index_log()
+            count = min(self.log.complete_records(), self.matrix.count)
+            if self.matrix.count > count:
+                self.matrix.truncate(count)
+            self.log.truncate(count)
+            self.metadata.truncate(count)
+            self.generation.publish(count)
+            self._refresh(count)
+        return count
+
+    def _refresh(self, count: int):
+        self.matrix.refresh(self.matrix.dim or self._read_dim(), count)
+        self.log.offsets.refresh(count)
+        self.metadata.count = count
+
+    def read_new(self, known: int):
+        """Map rows committed by other processes beyond the first known rows; returns their
+        vectors, or None if there are none"""
+        committed = self.generation.read()
+        if committed <= known:
+            return None
+        self._refresh(committed)
+        return self.matrix.rows()[known:committed]
+
+    def append_many(self, vectors, docs: List[dict]):
+        """Append rows; the caller holds write_lock() and has caught up with read_new().
+
+        Records are encoded before any file is touched, and every file is written at the
+        committed offsets, so a failed append leaves nothing that the next one builds on.
+        """
+        lines = DocumentLog.encode(docs)
+        committed = self.generation.read()
+        if self.matrix.dim is None:
+            with open(self._header_path, "w", encoding="utf-8") as f:
+                json.dump({"dim": int(vectors.shape[1])}, f)
+        try:
+            self.matrix.write_rows(committed, vectors)
+            self.log.write(committed, lines)
+            self.metadata.add_many(committed, (doc["metadata"] for doc in docs))
+        except BaseException:
+            self.metadata.truncate(committed)
+            self._refresh(committed)
+            raise
+        self.generation.publish(committed + len(docs))
@@ -1,93 +1,548 @@
 import os
-from typing import List, Dict
-from openai import OpenAI
+import asyncio
+import threading
+from typing import List, Dict, Optional
+import numpy as np
 from src.config import config
+from src.db.vector_index import InMemoryMatrix, PersistentVectorIndex, QuantizedMatrix
+from src.db.ann_index import IVFIndex
+from src.db.metadata_index import MetadataIndex, MetadataFilterError
+from src.db.lexical_index import BM25Index
+from src.utils.embedding_cache import EmbeddingCache
+from src.utils.embedding_batcher import EmbeddingBatcher
+from src.utils.llm import get_client, get_aclient
+from src.utils.upstream import governor, estimate_request_tokens
 
 class SimpleVectorStore:
-    """Lightweight in-memory vector store for Vercel deployment"""
+    """Lightweight vector store, persisted under VECTOR_DB_PATH when enabled"""
     _instance = None
-    
+
     def __init__(self):
         try:
-            self.client = OpenAI(api_key=config.OPENAI_API_KEY)
-            self.documents = []  # List of {id, text, metadata, embedding}
+            self._lock = threading.RLock()
+            self._persistent = None
+            self._documents = []  # {id, text, metadata} per row when not persistent
+            self._matrix = self._new_memory_matrix()  # L2-normalized rows
+            self._metadata_index = MetadataIndex()
+            # Compact scoring copy when self._matrix is the shared float32 map; unlike the
+            # map it is private to this process (see VECTOR_STORAGE_DTYPE)
+            self._quantized = None
+            if config.VECTOR_DB_PERSIST:
+                self._open_persistent_index()
+            if self._persistent is not None and config.VECTOR_STORAGE_DTYPE != "float32":
+                self._quantized = QuantizedMatrix(config.VECTOR_STORAGE_DTYPE)
+                self._quantize_persistent_rows()
+            # BM25 is built in the background the first time a query needs it, so start-up
+            # stays independent of corpus size
+            self._lexical = None
+            self._lexical_builder = None
+            self.lexical_fast_paths = 0
+            # The IVF clustering is likewise (re)built in the background, with the previous
+            # index (or exact search) serving queries meanwhile
+            self._ann_enabled = config.VECTOR_INDEX_MODE == "ivf"
+            self._ann = None
+            self._ann_builder = None
+            self.embedding_cache = self._create_embedding_cache()
+            self.batcher = EmbeddingBatcher(
+                self._aembed_batch,
+                max_batch_size=config.EMBEDDING_BATCH_SIZE,
+                max_wait_ms=config.EMBEDDING_BATCH_WINDOW_MS
+            )
             self.initialized = True
         except Exception as e:
             print(f"Warning: VectorStore initialization failed: {e}")
             self.initialized = False
 
+    def _open_persistent_index(self):
+        """Memory-map the on-disk index, falling back to in-memory storage on failure"""
+        try:
+            self._persistent = PersistentVectorIndex(config.VECTOR_DB_PATH)
+            self._persistent.load()
+            self._matrix = self._persistent.matrix
+            self._metadata_index = self._persistent.metadata
+        except Exception as e:
+            print(f"Warning: Could not open vector index at {config.VECTOR_DB_PATH}, using memory only: {e}")
+            self._persistent = None
+            self._matrix = self._new_memory_matrix()
+            self._metadata_index = MetadataIndex()
+
+    @staticmethod
+    def _new_memory_matrix():
+        if config.VECTOR_STORAGE_DTYPE == "float32":
+            return InMemoryMatrix()
+        return QuantizedMatrix(config.VECTOR_STORAGE_DTYPE)
+
+    def _quantize_persistent_rows(self, chunk: int = 65536):
+        rows = self._matrix.rows()
+        for start in range(0, self._matrix.count, chunk):
+            self._quantized.append_many(rows[start:start + chunk])
+
+    @staticmethod
+    def _create_embedding_cache():
+        db_path = None
+        if config.EMBEDDING_CACHE_PERSIST:
+            db_path = os.path.join(config.VECTOR_DB_PATH, "embedding_cache.sqlite")
+        return EmbeddingCache(max_entries=config.EMBEDDING_CACHE_SIZE, db_path=db_path)
+
+    @property
+    def _count(self):
+        return self._matrix.count
+
+    def _cache_embeddings(self, fetched: Dict[str, List[float]]):
+        for text, embedding in fetched.items():
+            self.embedding_cache.put(config.EMBEDDING_MODEL, text, embedding)
+
+    def _get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings from the cache, sending misses to OpenAI in batches"""
+        embeddings = [self.embedding_cache.get(config.EMBEDDING_MODEL, text) for text in texts]
+        missing = list(dict.fromkeys(text for text, emb in zip(texts, embeddings) if emb is None))
+        fetched = {}
+        for start in range(0, len(missing), config.EMBEDDING_BATCH_SIZE):
+            batch = missing[start:start + config.EMBEDDING_BATCH_SIZE]
+            try:
+                fetched.update(zip(batch, self._embed_batch(batch)))
+            except Exception as e:
+                print(f"Error getting embedding: {e}")
+        self._cache_embeddings(fetched)
+        return [emb if emb is not None else fetched.get(text, []) for text, emb in zip(texts, embeddings)]
+
     def _get_embedding(self, text: str) -> List[float]:
-        """Get embedding from OpenAI"""
+        return self._get_embeddings([text])[0]
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        response = get_client().embeddings.create(
+            model=config.EMBEDDING_MODEL,
+            input=texts
+        )
+        return [item.embedding for item in response.data]
+
+    async def _aembed_batch(self, texts: List[str]) -> List[List[float]]:
+        aclient = get_aclient()
+        response = await governor.call(
+            config.EMBEDDING_MODEL,
+            lambda: aclient.embeddings.create(model=config.EMBEDDING_MODEL, input=texts),
+            tokens=sum(estimate_request_tokens(text=text) for text in texts)
+        )
+        return [item.embedding for item in response.data]
+
+    def _cached_embeddings(self, texts: List[str]) -> list:
+        return [self.embedding_cache.get(config.EMBEDDING_MODEL, text) for text in texts]
+
+    async def _aget_embeddings(self, texts: List[str], raise_errors: bool = False) -> List[List[float]]:
+        """Async counterpart of _get_embeddings; misses go through the shared batcher.
+
+        The cache lookup can read SQLite, so it runs off the event loop. A failed embedding
+        comes back empty unless raise_errors.
+        """
+        embeddings = await asyncio.to_thread(self._cached_embeddings, texts)
+        missing = list(dict.fromkeys(text for text, emb in zip(texts, embeddings) if emb is None))
+        results = await asyncio.gather(*(self.batcher.embed(text) for text in missing), return_exceptions=True)
+        fetched = {}
+        errors = []
+        for text, result in zip(missing, results):
+            if isinstance(result, Exception):
+                errors.append(result)
+            else:
+                fetched[text] = result
+        if errors:
+            print(f"Error getting embedding: {errors[0]}")
+            if raise_errors:
+                raise errors[0]
+        if fetched:
+            await asyncio.to_thread(self._cache_embeddings, fetched)
+        return [emb if emb is not None else fetched.get(text, []) for text, emb in zip(texts, embeddings)]
+
+    async def _aget_embedding(self, text: str) -> List[float]:
+        return (await self._aget_embeddings([text]))[0]
+
+    async def aembed(self, text: str):
+        """Unit-length embedding of text through the shared cache and batcher, or None"""
+        if not self.initialized:
+            return None
+        return self._normalize(await self._aget_embedding(text))
+
+    @staticmethod
+    def _normalize(embedding: List[float]):
+        """Return embedding as a unit-length float32 vector, or None if unusable"""
+        if embedding is None or len(embedding) == 0:
+            return None
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def _append_rows(self, vectors, docs: List[dict]):
+        """Append normalized vectors and their records, writing through to disk if persistent"""
+        if self._persistent is not None:
+            with self._persistent.write_lock():
+                self._catch_up()
+                self._check_dim(vectors)
+                self._persistent.append_many(vectors, docs)
+        else:
+            self._check_dim(vectors)
+            self._metadata_index.add_many(self._count, (doc["metadata"] for doc in docs))
+            self._matrix.append_many(vectors)
+            self._documents.extend(docs)
+        self._index_rows(vectors, [doc["text"] for doc in docs])
+        self._sync_ann()
+
+    def _check_dim(self, vectors):
+        if self._matrix.dim is not None and vectors.shape[1] != self._matrix.dim:
+            raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {self._matrix.dim}")
+
+    def _index_rows(self, vectors, texts: Optional[List[str]] = None):
+        """Update the in-process side indexes for the rows just added to the matrix (texts
+        are read back from the log when the rows came from another process)"""
+        if self._quantized is not None:
+            self._quantized.append_many(vectors)
+        if self._lexical is not None:
+            self._lexical.add_many(texts if texts is not None else self._texts(self._lexical.count, self._count))
+
+    def _records(self, rows) -> List[dict]:
+        if self._persistent is not None:
+            return self._persistent.log.read(rows)
+        return [self._documents[i] for i in rows]
+
+    def _texts(self, start: int, stop: int) -> List[str]:
+        if self._persistent is not None:
+            return [doc["text"] for doc in self._persistent.log.read_range(start, stop)]
+        return [doc["text"] for doc in self._documents[start:stop]]
+
+    def _catch_up(self):
+        """Pick up rows that other worker processes committed to the shared on-disk index"""
+        if self._persistent is None:
+            return
+        with self._lock:
+            vectors = self._persistent.read_new(self._count)
+            if vectors is not None:
+                self._index_rows(vectors)
+
+    @staticmethod
+    def _new_ann() -> IVFIndex:
+        return IVFIndex(n_lists=config.ANN_LISTS, nprobe=config.ANN_NPROBE, rebuild_growth=config.ANN_REBUILD_GROWTH)
+
+    def _build_ann(self):
+        """Cluster the current rows outside the store lock, then catch up and swap in under it"""
         try:
-            response = self.client.embeddings.create(
-                model="text-embedding-3-small",
-                input=text
-            )
-            return response.data[0].embedding
+            with self._lock:
+                rows = self._matrix.rows()[:self._count]
+            index = self._new_ann()
+            index.build(rows)
+            with self._lock:
+                if index.indexed_rows < self._count:
+                    index.add(index.indexed_rows, self._matrix.rows()[index.indexed_rows:self._count])
+                self._ann = index
+        except Exception as e:
+            print(f"Warning: ANN index build failed: {e}")
+        finally:
+            with self._lock:
+                self._ann_builder = None
+
+    def _sync_ann(self, wait: bool = False) -> bool:
+        """Bring the ANN index up to date with the matrix; False while exact search applies.
+
+        New rows are assigned to the current clustering in place; a first build or a
+        rebuild runs in a background thread (joined if wait, which needs the lock free).
+        """
+        if not self._ann_enabled or self._count < config.ANN_MIN_ROWS:
+            return False
+        with self._lock:
+            if self._ann_builder is None and (self._ann is None or self._ann.needs_rebuild(self._count)):
+                self._ann_builder = threading.Thread(target=self._build_ann, name="ivf-build", daemon=True)
+                self._ann_builder.start()
+            builder = self._ann_builder
+            if self._ann is not None and self._ann.indexed_rows < self._count:
+                start = self._ann.indexed_rows
+                self._ann.add(start, self._matrix.rows()[start:self._count])
+        if wait and builder is not None:
+            builder.join()
+        return self._ann is not None
+
+    def _top_k(self, query_vector, n_results: int, allowed=None):
+        """Return (row indices, similarities) of the n_results best rows, best first.
+
+        allowed restricts scoring to a sorted array of row ids (from a metadata filter).
+        With quantized storage the best n_results * VECTOR_RESCORE_FACTOR rows are
+        rescored against the full-precision matrix when one is available.
+        """
+        candidates = allowed
+        if self._sync_ann():
+            ann_candidates = np.sort(self._ann.candidates(query_vector))
+            if allowed is not None:
+                ann_candidates = np.intersect1d(ann_candidates, allowed, assume_unique=True)
+            if allowed is None or ann_candidates.shape[0] >= n_results:
+                candidates = ann_candidates
+        rescore = self._quantized is not None and config.VECTOR_RESCORE
+        scorer = self._quantized if self._quantized is not None else self._matrix
+        depth = n_results * config.VECTOR_RESCORE_FACTOR if rescore else n_results
+        rows, scores = _select_top(scorer.scores(query_vector, candidates), depth, candidates)
+        if rescore and rows.shape[0]:
+            rows = np.sort(rows)
+            rows, scores = _select_top(self._matrix.scores(query_vector, rows), n_results, rows)
+        return rows, scores
+
+    def _filter_rows(self, where: Optional[Dict]):
+        """Row ids allowed by a where= filter (None means all rows)"""
+        if not where:
+            return None
+        with self._lock:
+            return self._metadata_index.filter_rows(where)
+
+    def _insert(self, documents: List[dict], embeddings: List[List[float]]):
+        """Append documents ({id, text, metadata}) whose embeddings are usable"""
+        vectors = []
+        docs = []
+        for doc, embedding in zip(documents, embeddings):
+            vector = self._normalize(embedding)
+            if vector is None:
+                print(f"Warning: No embedding for document {doc['id']}, skipping")
+                continue
+            vectors.append(vector)
+            docs.append({"id": doc["id"], "text": doc["text"], "metadata": doc.get("metadata") or {}})
+        if not docs:
+            return
+        with self._lock:
+            self._append_rows(np.stack(vectors), docs)
+
+    def _format_results(self, rows, distances) -> Dict:
+        with self._lock:
+            top_docs = self._records(rows)
+
+        # Format results to match ChromaDB format
+        return {
+            "documents": [[doc["text"] for doc in top_docs]],
+            "metadatas": [[doc["metadata"] for doc in top_docs]],
+            "distances": [[float(d) for d in distances]]
+        }
+
+    def _build_lexical(self, chunk: int = 65536):
+        """Index existing rows mostly outside the store lock, then publish under it"""
+        try:
+            index = BM25Index()
+            while True:
+                with self._lock:
+                    count = self._count
+                    if count - index.count <= 1024:
+                        index.add_many(self._texts(index.count, count))
+                        self._lexical = index
+                        return
+                index.add_many(self._texts(index.count, min(count, index.count + chunk)))
         except Exception as e:
-            print(f"Error getting embedding: {e}")
-            return []
-
-    def _cosine_similarity(self, a: List[float], b: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
-        if not a or not b:
-            return 0.0
-        dot_product = sum(x * y for x, y in zip(a, b))
-        magnitude_a = sum(x * x for x in a) ** 0.5
-        magnitude_b = sum(x * x for x in b) ** 0.5
-        if magnitude_a == 0 or magnitude_b == 0:
-            return 0.0
-        return dot_product / (magnitude_a * magnitude_b)
+            print(f"Warning: Lexical index build failed: {e}")
+        finally:
+            with self._lock:
+                self._lexical_builder = None
+
+    def _lexical_index(self, wait: bool = False) -> Optional[BM25Index]:
+        """The BM25 index, starting its build on first use; None while building unless wait"""
+        with self._lock:
+            if self._lexical is not None:
+                return self._lexical
+            builder = self._lexical_builder
+            if builder is None:
+                builder = threading.Thread(target=self._build_lexical, name="bm25-build", daemon=True)
+                self._lexical_builder = builder
+                builder.start()
+        if wait:
+            builder.join()
+        return self._lexical
+
+    def _lexical_search(self, query_text: str, allowed=None, wait: bool = False):
+        """BM25 hits, or None if the index is still being built and wait is False"""
+        if self._lexical_index(wait) is None:
+            return None
+        with self._lock:
+            return self._lexical.search(query_text, config.HYBRID_CANDIDATES, allowed)
+
+    @staticmethod
+    def _lexical_is_strong(lexical) -> bool:
+        """True when the best lexical hit matches every query term with enough weight"""
+        rows, scores, coverage = lexical
+        return (rows.shape[0] > 0
+                and coverage[0] >= config.LEXICAL_FAST_PATH_COVERAGE
+                and scores[0] >= config.LEXICAL_FAST_PATH_MIN_SCORE)
+
+    def _lexical_results(self, lexical, n_results: int) -> Dict:
+        rows, scores, _ = lexical
+        rows, scores = rows[:n_results], scores[:n_results]
+        top = scores[0] if scores.shape[0] else 1.0
+        return self._format_results(rows, 1 - scores / top)
+
+    def _search(self, embedding, n_results: int, allowed=None, lexical=None) -> Dict:
+        """Vector search; with lexical results, fuse both rankings by reciprocal rank"""
+        query_vector = self._normalize(embedding)
+        if query_vector is None:
+            return self._lexical_results(lexical, n_results) if lexical is not None else _empty_result()
+
+        with self._lock:
+            depth = n_results if lexical is None else max(n_results, config.HYBRID_CANDIDATES)
+            rows, similarities = self._top_k(query_vector, depth, allowed)
+        if lexical is None:
+            return self._format_results(rows, 1 - similarities)  # Convert similarity to distance
+
+        fused = {}
+        for ranking in (rows, lexical[0]):
+            for rank, row in enumerate(ranking.tolist()):
+                fused[row] = fused.get(row, 0.0) + 1.0 / (config.RRF_K + rank + 1)
+        best = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:n_results]
+        max_score = 2.0 / (config.RRF_K + 1)
+        return self._format_results([row for row, _ in best], [1 - score / max_score for _, score in best])
+
+    def _plan_query(self, query_text: str, n_results: int, where: Optional[Dict], mode: str):
+        """Everything a query does before it needs an embedding: catch up with other
+        workers, apply the filter and try the lexical answer. Takes the store lock (which
+        ingest holds while writing), so async callers run it in a thread.
+
+        Returns (final result or None, allowed rows, lexical hits).
+        """
+        self._catch_up()
+        if not self._count:
+            return _empty_result(), None, None
+        allowed = self._filter_rows(where)
+        if allowed is not None and allowed.shape[0] == 0:
+            return _empty_result(), None, None
+        lexical = None
+        if mode != "vector":
+            # Hybrid ranks by vectors alone until BM25 is ready; lexical mode waits for it
+            lexical = self._lexical_search(query_text, allowed, wait=mode == "lexical")
+            if lexical is None:
+                return None, allowed, None
+            if mode == "lexical":
+                return self._lexical_results(lexical, n_results), allowed, lexical
+            if self._lexical_is_strong(lexical):
+                self.lexical_fast_paths += 1
+                return self._lexical_results(lexical, n_results), allowed, lexical
+        return None, allowed, lexical
 
     def add_document(self, doc_id: str, text: str, metadata: dict):
         """Add document to vector store"""
+        self.add_documents([{"id": doc_id, "text": text, "metadata": metadata}])
+
+    def add_documents(self, documents: List[dict]):
+        """Add many documents ({id, text, metadata}) with batched embedding calls"""
         if not self.initialized:
-            print("VectorStore not initialized, skipping add_document")
+            print("VectorStore not initialized, skipping add_documents")
             return
         try:
-            embedding = self._get_embedding(text)
-            self.documents.append({
-                "id": doc_id,
-                "text": text,
-                "metadata": metadata,
-                "embedding": embedding
-            })
+            self._insert(documents, self._get_embeddings([doc["text"] for doc in documents]))
         except Exception as e:
-            print(f"Error adding document: {e}")
+            print(f"Error adding documents: {e}")
 
-    def query_similar(self, query_text: str, n_results: int = 3) -> Dict:
-        """Query similar documents"""
-        if not self.initialized or not self.documents:
-            return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
-        
+    def query_similar(self, query_text: str, n_results: int = 3, where: Optional[Dict] = None,
+                      mode: Optional[str] = None) -> Dict:
+        """Query similar documents, optionally restricted by a metadata where= filter.
+
+        mode is "vector", "lexical" or "hybrid" (default RETRIEVAL_MODE). Hybrid answers
+        from BM25 alone when the lexical match is strong, skipping the embedding call.
+        In lexical and hybrid modes distances are normalized rank scores, not cosine distances.
+        """
+        mode = _retrieval_mode(mode)
+        if not self.initialized:
+            return _empty_result()
         try:
-            query_embedding = self._get_embedding(query_text)
-            
-            # Calculate similarities
-            similarities = []
-            for doc in self.documents:
-                similarity = self._cosine_similarity(query_embedding, doc["embedding"])
-                similarities.append((doc, similarity))
-            
-            # Sort by similarity (highest first)
-            similarities.sort(key=lambda x: x[1], reverse=True)
-            
-            # Get top n results
-            top_results = similarities[:n_results]
-            
-            # Format results to match ChromaDB format
-            documents = [[doc["text"] for doc, _ in top_results]]
-            metadatas = [[doc["metadata"] for doc, _ in top_results]]
-            distances = [[1 - sim for _, sim in top_results]]  # Convert similarity to distance
-            
+            result, allowed, lexical = self._plan_query(query_text, n_results, where, mode)
+            if result is not None:
+                return result
+            return self._search(self._get_embedding(query_text), n_results, allowed, lexical)
+        except MetadataFilterError:
+            raise
+        except Exception as e:
+            print(f"Error querying: {e}")
+            return _empty_result()
+
+    def document_count(self) -> int:
+        if not self.initialized:
+            return 0
+        self._catch_up()
+        return self._count
+
+    async def adocument_count(self) -> int:
+        """document_count off the event loop (catching up may wait for an ingest's lock)"""
+        return await asyncio.to_thread(self.document_count)
+
+    def _private_vector_bytes(self) -> int:
+        """Vector bytes held in this process rather than in the shared map"""
+        private = self._quantized if self._persistent is not None else self._matrix
+        return private.bytes_per_row * private.count if private is not None else 0
+
+    def index_stats(self) -> Dict:
+        self._catch_up()
+        with self._lock:
             return {
-                "documents": documents,
-                "metadatas": metadatas,
-                "distances": distances
+                "documents": self._count,
+                "dim": self._matrix.dim,
+                "persistent": self._persistent is not None,
+                "generation": self._persistent.generation.read() if self._persistent is not None else None,
+                "storage_dtype": config.VECTOR_STORAGE_DTYPE,
+                "bytes_per_document": (self._quantized if self._quantized is not None else self._matrix).bytes_per_row,
+                "rescoring": self._quantized is not None and config.VECTOR_RESCORE,
+                "private_vector_bytes": self._private_vector_bytes(),
+                "mode": config.VECTOR_INDEX_MODE,
+                "ann": self._ann.stats() if self._ann is not None else None,
+                "ann_building": self._ann_builder is not None,
+                "retrieval_mode": config.RETRIEVAL_MODE,
+                "lexical_ready": self._lexical is not None,
+                "lexical_fast_paths": self.lexical_fast_paths
             }
+
+    async def aadd_document(self, doc_id: str, text: str, metadata: dict):
+        """Async add_document: awaits the embedding call and appends off the event loop"""
+        await self.aadd_documents([{"id": doc_id, "text": text, "metadata": metadata}])
+
+    async def aadd_documents(self, documents: List[dict]):
+        """Async add_documents; embedding and write failures are raised to the caller"""
+        if not self.initialized:
+            print("VectorStore not initialized, skipping add_documents")
+            return
+        try:
+            embeddings = await self._aget_embeddings([doc["text"] for doc in documents], raise_errors=True)
+            await asyncio.to_thread(self._insert, documents, embeddings)
+        except Exception as e:
+            print(f"Error adding documents: {e}")
+            raise
+
+    async def aquery_similar(self, query_text: str, n_results: int = 3, where: Optional[Dict] = None,
+                             mode: Optional[str] = None) -> Dict:
+        """Async query_similar: everything that takes the store lock runs off the event loop,
+        so a concurrent ingest never stalls it"""
+        mode = _retrieval_mode(mode)
+        if not self.initialized:
+            return _empty_result()
+        try:
+            result, allowed, lexical = await asyncio.to_thread(self._plan_query, query_text, n_results, where, mode)
+            if result is not None:
+                return result
+            embedding = await self._aget_embedding(query_text)
+            return await asyncio.to_thread(self._search, embedding, n_results, allowed, lexical)
+        except MetadataFilterError:
+            raise
         except Exception as e:
             print(f"Error querying: {e}")
-            return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
+            return _empty_result()
+
+def _select_top(scores, k: int, ids=None):
+    """Best k (ids, scores) by descending score; ids default to positions in scores"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    if k < scores.shape[0]:
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(scores.shape[0])
+    order = best[np.argsort(-scores[best], kind="stable")]
+    return (order if ids is None else ids[order]), scores[order]
+
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+
+def _retrieval_mode(mode: Optional[str]) -> str:
+    mode = mode or config.RETRIEVAL_MODE
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {RETRIEVAL_MODES}")
+    return mode
+
+def _empty_result() -> Dict:
+    return {"documents": [[]], "metadatas": [[]], "distances": [[]]}
 
 def get_vector_store():
     """Lazy initialization of vector store"""
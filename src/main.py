@@ -1,13 +1,37 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from src.api.routes import router
+from src.db.vector_store import vector_store
+from src.services.chat_service import ChatService
+from src.services.ingest_service import IngestService
+from src.services.job_service import job_pool
+from src.utils.image_prep import prepared_images
+from src.utils.response_cache import response_cache
+from src.utils.uploads import UploadLimitMiddleware
+from src.utils.llm import close_clients
+from src.utils.upstream import governor
+from src.db.database import dispose_engines
 from src.config import config
 import os
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await job_pool.start(config.JOB_WORKERS)
+    yield
+    # Requeue unfinished jobs, then close pooled upstream connections and database pools
+    await job_pool.stop()
+    await ChatService.drain_summaries()
+    await close_clients()
+    await dispose_engines()
+
 # Create FastAPI app
-app = FastAPI(title="Multi-Modal Intelligence Console", version="1.0.0")
+app = FastAPI(title="Multi-Modal Intelligence Console", version="1.0.0", lifespan=lifespan)
+
+# Bound upload request bodies before they are read (added first so CORS wraps its 413s)
+app.add_middleware(UploadLimitMiddleware)
 
 # Add CORS middleware
 app.add_middleware(
@@ -20,8 +44,9 @@ app.add_middleware(
 
 # Create database tables
 try:
-    from src.db.database import engine, Base
+    from src.db.database import engine, Base, upgrade_schema
     Base.metadata.create_all(bind=engine)
+    upgrade_schema(engine)
 except Exception as e:
     print(f"Warning: Database initialization issue: {e}")
 
@@ -70,7 +95,16 @@ def debug_info():
         "openai_key_length": len(config.OPENAI_API_KEY) if config.OPENAI_API_KEY else 0,
         "database_url": config.DATABASE_URL,
         "upload_dir": config.UPLOAD_DIR,
-        "is_vercel": config.IS_VERCEL
+        "is_vercel": config.IS_VERCEL,
+        "embedding_cache": vector_store.embedding_cache.stats() if vector_store.initialized else None,
+        "embedding_batcher": vector_store.batcher.stats() if vector_store.initialized else None,
+        "vector_index": vector_store.index_stats() if vector_store.initialized else None,
+        "chat_pipeline": ChatService.pipeline_stats.snapshot(),
+        "response_cache": response_cache.stats(),
+        "upstream": governor.stats(),
+        "upload_dedup": IngestService.stats(),
+        "jobs": job_pool.stats(),
+        "image_prep": prepared_images.stats()
     }
 
 # For local development
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from src.db.database import Base
@@ -9,6 +9,9 @@ class ChatSession(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Rolling summary of older turns, covering every message up to summary_message_id
+    summary = Column(Text, nullable=True)
+    summary_message_id = Column(Integer, nullable=True)
     messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
 
 class ChatMessage(Base):
@@ -22,6 +25,32 @@ class ChatMessage(Base):
     
     session = relationship("ChatSession", back_populates="messages")
 
+    # Serves per-session history pages in timestamp order without a sort
+    __table_args__ = (Index("ix_chat_messages_session_timestamp", "session_id", "timestamp"),)
+
+class AnalysisJob(Base):
+    """Background analysis of a stored upload; the table doubles as the work queue"""
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String(36), primary_key=True)
+    kind = Column(String)  # image, audio
+    status = Column(String, default="queued")  # queued, running, succeeded, failed
+    stage = Column(String, nullable=True)  # transcribing, analyzing, indexing while running
+    filename = Column(String)
+    file_path = Column(String)
+    file_size = Column(Integer)
+    mime_type = Column(String)
+    content_hash = Column(String(64))
+    prompt = Column(Text, nullable=True)
+    result = Column(Text, nullable=True)  # JSON response of the synchronous endpoint
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_analysis_jobs_status_created", "status", "created_at"),)
+
 class UploadedFile(Base):
     __tablename__ = "uploaded_files"
 
@@ -31,3 +60,8 @@ class UploadedFile(Base):
     file_type = Column(String) # pdf, image, audio, text
     upload_time = Column(DateTime, default=datetime.utcnow)
     description = Column(Text, nullable=True) # AI generated description
+    # SHA-256 of the stored bytes and the prompt the description answers, for dedup
+    content_hash = Column(String(64), nullable=True)
+    prompt = Column(Text, nullable=True)
+
+    __table_args__ = (Index("ix_uploaded_files_content_hash", "content_hash", "file_type"),)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel
-from typing import List, Optional
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 
 class TextAnalysisRequest(BaseModel):
     text: str
@@ -8,10 +9,46 @@ class TextAnalysisRequest(BaseModel):
 class ChatRequest(BaseModel):
     session_id: int
     message: str
+    # Chroma-style metadata filter for retrieval, e.g.
+    # {"type": "audio", "uploaded_at": {"$gte": "2024-05-01T00:00:00"}}
+    where: Optional[Dict[str, Any]] = None
 
 class CreateSessionRequest(BaseModel):
     title: str
 
+class ChatSessionSummary(BaseModel):
+    id: int
+    title: Optional[str] = None
+    created_at: Optional[datetime] = None
+
+class ChatSessionPage(BaseModel):
+    items: List[ChatSessionSummary]
+    # Pass as before_id to fetch the next (older) page; None on the last page
+    next_before_id: Optional[int] = None
+
+class AnalysisJobStatus(BaseModel):
+    job_id: str
+    kind: str
+    status: str  # queued, running, succeeded, failed
+    stage: Optional[str] = None
+    filename: Optional[str] = None
+    attempts: int = 0
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class ChatMessageOut(BaseModel):
+    id: int
+    role: str
+    content: str
+    timestamp: Optional[datetime] = None
+
+class ChatHistoryPage(BaseModel):
+    items: List[ChatMessageOut]  # oldest first within the page
+    next_before_id: Optional[int] = None
+
 class ReportSection(BaseModel):
     title: Optional[str] = None
     body: str
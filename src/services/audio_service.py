@@ -1,15 +1,21 @@
 from src.utils.llm import get_aclient
+from src.utils.upstream import governor, estimate_request_tokens
 import os
 
 class AudioService:
     @staticmethod
     async def transcribe_audio(file_path: str):
         aclient = get_aclient()
-        with open(file_path, "rb") as audio_file:
-            transcript = await aclient.audio.transcriptions.create(
-                model="whisper-1", 
-                file=audio_file
-            )
+
+        async def transcribe():
+            # Reopened per attempt so a retry re-sends the whole file
+            with open(file_path, "rb") as audio_file:
+                return await aclient.audio.transcriptions.create(
+                    model="whisper-1", 
+                    file=audio_file
+                )
+
+        transcript = await governor.call("whisper-1", transcribe)
         return transcript.text
 
     @staticmethod
@@ -30,11 +36,13 @@ class AudioService:
         """
         
         aclient = get_aclient()
-        response = await aclient.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are an expert audio analyst."},
-                {"role": "user", "content": prompt}
-            ]
+        messages = [
+            {"role": "system", "content": "You are an expert audio analyst."},
+            {"role": "user", "content": prompt}
+        ]
+        response = await governor.call(
+            "gpt-4o",
+            lambda: aclient.chat.completions.create(model="gpt-4o", messages=messages),
+            tokens=estimate_request_tokens(messages)
         )
         return response.choices[0].message.content
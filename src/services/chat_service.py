@@ -1,50 +1,256 @@
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from src.models.models import ChatSession, ChatMessage
+from src.db.database import AsyncSessionLocal
 from src.db.vector_store import vector_store
+from src.db.metadata_index import validate_where
 from src.utils.llm import get_aclient
+from src.services.context_builder import build_messages
+from src.utils.timing import StageStats, timed, timed_block
+from src.utils.response_cache import response_cache
+from src.utils.upstream import governor, estimate_request_tokens, upstream_priority
+from src.config import config
+from typing import List, Optional
+import anyio
+import asyncio
 import json
+import re
+import time
+
+_CONVERSATIONAL = re.compile(
+    r"^(hi|hello|hey|yo|thanks|thank you|thx|ok|okay|cool|great|nice|bye|goodbye|"
+    r"good (morning|afternoon|evening|night)|how are you|who are you|what can you do)\b[\s!.?]*$",
+    re.IGNORECASE
+)
+
+def is_conversational(user_query: str) -> bool:
+    """Small-talk turns that retrieval cannot help with"""
+    return bool(_CONVERSATIONAL.match(user_query.strip()))
+
+SYSTEM_PROMPT = "You are a helpful AI assistant. Use the following context to answer if relevant:"
+
+_summary_tasks = {}  # session id -> in-flight summary update
 
 class ChatService:
+    # Per-stage latency of the chat pipeline (retrieval, history, llm, persist, total)
+    pipeline_stats = StageStats()
+
     @staticmethod
-    async def get_response(session_id: int, user_query: str, db: Session):
-        # 1. Retrieve Context from Vector DB
-        results = vector_store.query_similar(user_query, n_results=3)
-        context_docs = results['documents'][0] if results['documents'] else []
-        context_str = "\n\n".join(context_docs)
-        
-        # 2. Retrieve Conversation History (Last 10 messages)
-        history_msgs = db.query(ChatMessage).filter(
-            ChatMessage.session_id == session_id
-        ).order_by(ChatMessage.timestamp.desc()).limit(10).all()
+    async def _retrieve_context(user_query: str, where: Optional[dict] = None) -> List[str]:
+        with upstream_priority("interactive"):
+            results = await vector_store.aquery_similar(user_query, n_results=config.RAG_TOP_K, where=where)
+        return results['documents'][0] if results['documents'] else []
+
+    @staticmethod
+    async def _load_history(session_id: int, db: AsyncSession):
+        """Return (rolling summary, recent messages oldest-first) for the session.
+
+        Only messages newer than the summary are loaded; older turns live in the summary.
+        """
+        session = (await db.execute(
+            select(ChatSession.summary, ChatSession.summary_message_id).where(ChatSession.id == session_id)
+        )).first()
+        summary = session.summary if session else None
+        summarized_through = (session.summary_message_id if session else None) or 0
+        history_msgs = (await db.execute(
+            select(ChatMessage.role, ChatMessage.content).where(
+                ChatMessage.session_id == session_id,
+                ChatMessage.id > summarized_through
+            ).order_by(ChatMessage.timestamp.desc()).limit(config.CHAT_HISTORY_LIMIT)
+        )).all()
         history_msgs.reverse() # Oldest first
-        
-        # 3. Construct Messages needed for OpenAI
-        messages = [
-            {"role": "system", "content": f"You are a helpful AI assistant. Use the following context to answer if relevant:\n\n{context_str}"}
-        ]
-        
-        for msg in history_msgs:
-            messages.append({"role": msg.role, "content": msg.content})
-            
-        messages.append({"role": "user", "content": user_query})
-        
-        # 4. Call LLM
-        aclient = get_aclient()
-        response = await aclient.chat.completions.create(
-            model="gpt-4o",
-            messages=messages
+        return summary, [{"role": msg.role, "content": msg.content} for msg in history_msgs]
+
+    @staticmethod
+    async def _build_messages(session_id: int, user_query: str, db: AsyncSession, where: Optional[dict] = None,
+                              timings: Optional[dict] = None):
+        """Run retrieval and history loading concurrently, then assemble the prompt
+        within CHAT_CONTEXT_TOKEN_BUDGET.
+
+        With CHAT_SPECULATIVE_RETRIEVAL, retrieval (and its embedding call) is skipped
+        when the store is empty or the turn is small talk.
+        """
+        timings = timings if timings is not None else {}
+        stats = ChatService.pipeline_stats
+        # Reject a bad filter before any query is using the session
+        validate_where(where)
+        skip_retrieval = config.CHAT_SPECULATIVE_RETRIEVAL and (
+            is_conversational(user_query) or await vector_store.adocument_count() == 0
         )
-        ai_response = response.choices[0].message.content
+        timings["retrieval_skipped"] = skip_retrieval
+
+        # 1. Retrieve Context from Vector DB and 2. Conversation History, concurrently
+        history_task = timed(timings, stats, "history", ChatService._load_history(session_id, db))
+        if skip_retrieval:
+            context_docs = []
+            summary, history = await history_task
+        else:
+            # A TaskGroup cancels and awaits the history query if retrieval fails, so the
+            # session is idle again before the caller closes it
+            try:
+                async with asyncio.TaskGroup() as group:
+                    retrieval_task = group.create_task(
+                        timed(timings, stats, "retrieval", ChatService._retrieve_context(user_query, where))
+                    )
+                    history_task = group.create_task(history_task)
+            except* Exception as errors:
+                raise errors.exceptions[0]
+            context_docs = retrieval_task.result()
+            summary, history = history_task.result()
+        timings["first_turn"] = not history and not summary
         
-        # 5. Store in DB
+        # 3. Construct Messages needed for OpenAI, filling the token budget by priority
+        return build_messages(
+            SYSTEM_PROMPT,
+            user_query,
+            history,
+            context_docs,
+            budget=config.CHAT_CONTEXT_TOKEN_BUDGET,
+            summary=summary,
+            stats=timings
+        )
+
+    @staticmethod
+    async def _save_exchange(session_id: int, user_query: str, ai_response: str, db: AsyncSession):
         user_msg_db = ChatMessage(session_id=session_id, role="user", content=user_query)
         ai_msg_db = ChatMessage(session_id=session_id, role="assistant", content=ai_response)
         db.add(user_msg_db)
         db.add(ai_msg_db)
-        db.commit()
+        await db.commit()
+        ChatService._schedule_summary(session_id)
+
+    @staticmethod
+    def _schedule_summary(session_id: int):
+        if session_id in _summary_tasks:
+            return
+        task = asyncio.get_running_loop().create_task(ChatService.update_summary(session_id))
+        _summary_tasks[session_id] = task
+        task.add_done_callback(lambda _: _summary_tasks.pop(session_id, None))
+
+    @staticmethod
+    async def drain_summaries():
+        """Let in-flight summary updates finish; called on shutdown before the engines close"""
+        if _summary_tasks:
+            await asyncio.gather(*list(_summary_tasks.values()), return_exceptions=True)
+
+    @staticmethod
+    async def update_summary(session_id: int):
+        """Fold turns that fell out of the recent window into the session's rolling summary.
+
+        Runs in the background after a reply is stored, and only once at least
+        CHAT_SUMMARY_BATCH messages are waiting, so the summary is updated incrementally.
+        """
+        db = AsyncSessionLocal()
+        try:
+            session = await db.get(ChatSession, session_id)
+            if session is None:
+                return
+            pending = (await db.scalars(
+                select(ChatMessage).where(
+                    ChatMessage.session_id == session_id,
+                    ChatMessage.id > (session.summary_message_id or 0)
+                ).order_by(ChatMessage.id)
+            )).all()
+            to_fold = pending[:-config.CHAT_RECENT_TURNS] if config.CHAT_RECENT_TURNS else pending
+            if len(to_fold) < config.CHAT_SUMMARY_BATCH:
+                return
+            
+            transcript = "\n".join(f"{msg.role}: {msg.content}" for msg in to_fold)
+            aclient = get_aclient()
+            messages = [
+                {"role": "system", "content": "You maintain a concise running summary of a conversation. Keep facts, decisions, names and open questions."},
+                {"role": "user", "content": f"Current summary:\n{session.summary or '(none)'}\n\nNew messages:\n{transcript}\n\nReturn the updated summary."}
+            ]
+            response = await governor.call(
+                config.CHAT_SUMMARY_MODEL,
+                lambda: aclient.chat.completions.create(model=config.CHAT_SUMMARY_MODEL, messages=messages),
+                tokens=estimate_request_tokens(messages),
+                priority="bulk"
+            )
+            session.summary = response.choices[0].message.content
+            session.summary_message_id = to_fold[-1].id
+            await db.commit()
+        except Exception as e:
+            print(f"Warning: Could not update summary for session {session_id}: {e}")
+        finally:
+            await db.close()
+
+    @staticmethod
+    async def get_response(session_id: int, user_query: str, db: AsyncSession, where: Optional[dict] = None,
+                           timings: Optional[dict] = None, use_cache: bool = True):
+        timings = timings if timings is not None else {}
+        stats = ChatService.pipeline_stats
+        with timed_block(timings, stats, "total"):
+            messages = await ChatService._build_messages(session_id, user_query, db, where, timings)
+            
+            # 4. Call LLM (first turns of a session may be answered from the response cache)
+            async def complete():
+                aclient = get_aclient()
+                response = await governor.call(
+                    "gpt-4o",
+                    lambda: aclient.chat.completions.create(model="gpt-4o", messages=messages),
+                    tokens=estimate_request_tokens(messages),
+                    priority="interactive"
+                )
+                return response.choices[0].message.content
+
+            if timings["first_turn"]:
+                request = {"model": "gpt-4o", "messages": messages}
+                # Similar wording only reuses an answer given for the same session, filter and
+                # prompt context (everything in the messages but the question itself)
+                scope = response_cache.make_key("chat", {"session_id": session_id, "where": where, "context": messages[:-1]})
+                ai_response = await timed(timings, stats, "llm", response_cache.get_or_compute(
+                    "chat", request, complete, use_cache=use_cache, semantic_text=user_query, semantic_scope=scope
+                ))
+            else:
+                ai_response = await timed(timings, stats, "llm", complete())
+            
+            # 5. Store in DB
+            with timed_block(timings, stats, "persist"):
+                await ChatService._save_exchange(session_id, user_query, ai_response, db)
         
         return ai_response
 
+    @staticmethod
+    async def stream_response(session_id: int, user_query: str, db: AsyncSession, where: Optional[dict] = None,
+                              timings: Optional[dict] = None):
+        """Yield completion tokens as they arrive.
+
+        The exchange is stored only once the upstream stream completes. If the consumer
+        stops early (client disconnect), the upstream stream is closed and nothing is saved.
+        """
+        timings = timings if timings is not None else {}
+        stats = ChatService.pipeline_stats
+        start = time.perf_counter()
+        messages = await ChatService._build_messages(session_id, user_query, db, where, timings)
+        
+        aclient = get_aclient()
+        stream = await governor.call(
+            "gpt-4o",
+            lambda: aclient.chat.completions.create(model="gpt-4o", messages=messages, stream=True),
+            tokens=estimate_request_tokens(messages),
+            priority="interactive"
+        )
+        parts = []
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    token = chunk.choices[0].delta.content
+                    if not parts:
+                        first_token_ms = (time.perf_counter() - start) * 1000
+                        timings["first_token"] = round(first_token_ms, 2)
+                        stats.record("first_token", first_token_ms)
+                    parts.append(token)
+                    yield token
+        finally:
+            # Shielded: on client disconnect this runs inside a cancelled scope
+            with anyio.CancelScope(shield=True):
+                await stream.close()
+        
+        with timed_block(timings, stats, "persist"):
+            await ChatService._save_exchange(session_id, user_query, "".join(parts), db)
+
     @staticmethod
     def create_session(title: str, db: Session):
         session = ChatSession(title=title)
@@ -54,9 +260,41 @@ class ChatService:
         return session
     
     @staticmethod
-    def get_sessions(db: Session):
-        return db.query(ChatSession).all()
+    def get_sessions(db: Session, before_id: Optional[int] = None, limit: int = 50):
+        """One page of sessions, newest first. Pass next_before_id back as before_id for the next page."""
+        query = db.query(ChatSession.id, ChatSession.title, ChatSession.created_at)
+        if before_id is not None:
+            query = query.filter(ChatSession.id < before_id)
+        rows = query.order_by(ChatSession.id.desc()).limit(limit + 1).all()
+        return _page(rows, limit)
     
     @staticmethod
-    def get_chat_history(session_id: int, db: Session):
-        return db.query(ChatMessage).filter(ChatMessage.session_id == session_id).order_by(ChatMessage.timestamp).all()
+    def get_chat_history(session_id: int, db: Session, before_id: Optional[int] = None, limit: int = 50):
+        """One page of messages older than before_id (the latest page by default), oldest first.
+
+        Keyset on (timestamp, id) so each page is an index range scan, not an offset.
+        """
+        query = db.query(ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.timestamp).filter(
+            ChatMessage.session_id == session_id
+        )
+        if before_id is not None:
+            cursor = db.query(ChatMessage.timestamp).filter(
+                ChatMessage.session_id == session_id,
+                ChatMessage.id == before_id
+            ).scalar()
+            if cursor is None:
+                return {"items": [], "next_before_id": None}
+            query = query.filter(or_(
+                ChatMessage.timestamp < cursor,
+                and_(ChatMessage.timestamp == cursor, ChatMessage.id < before_id)
+            ))
+        rows = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(limit + 1).all()
+        page = _page(rows, limit)
+        page["items"].reverse()
+        return page
+
+def _page(rows, limit: int) -> dict:
+    """rows holds up to limit + 1 results, newest first; the extra one only signals more"""
+    items = [row._asdict() for row in rows[:limit]]
+    next_before_id = items[-1]["id"] if len(rows) > limit else None
+    return {"items": items, "next_before_id": next_before_id}
@@ -0,0 +1,55 @@
+from typing import List, Optional
+from src.utils.text_chunker import estimate_tokens
+
+_MESSAGE_OVERHEAD = 4  # role/separator tokens per chat message
+
+def _cost(text: str) -> int:
+    return estimate_tokens(text) + _MESSAGE_OVERHEAD
+
+def build_messages(system_prompt: str, user_query: str, history: List[dict], chunks: List[str],
+                   budget: int, summary: Optional[str] = None, stats: Optional[dict] = None) -> List[dict]:
+    """Assemble chat messages within an approximate token budget.
+
+    Priority: system prompt and user query (always sent), then the rolling summary of
+    older turns, then recent turns newest-first, then retrieved chunks in rank order.
+    history is oldest-first [{"role", "content"}]; whatever does not fit is dropped.
+    """
+    used = _cost(system_prompt) + _cost(user_query)
+
+    summary_text = ""
+    if summary:
+        summary_text = f"\n\nSummary of the earlier conversation:\n{summary}"
+        if used + estimate_tokens(summary_text) <= budget:
+            used += estimate_tokens(summary_text)
+        else:
+            summary_text = ""
+
+    recent = []
+    for msg in reversed(history):
+        cost = _cost(msg["content"])
+        if used + cost > budget:
+            break
+        recent.append(msg)
+        used += cost
+    recent.reverse()
+
+    context = []
+    for chunk in chunks:
+        cost = estimate_tokens(chunk) + 1
+        if used + cost > budget:
+            continue
+        context.append(chunk)
+        used += cost
+
+    if stats is not None:
+        stats["prompt_tokens_estimate"] = used
+        stats["history_turns"] = len(recent)
+        stats["history_dropped"] = len(history) - len(recent)
+        stats["chunks"] = len(context)
+        stats["chunks_dropped"] = len(chunks) - len(context)
+
+    context_str = "\n\n".join(context)
+    messages = [{"role": "system", "content": f"{system_prompt}\n\n{context_str}{summary_text}"}]
+    messages.extend({"role": msg["role"], "content": msg["content"]} for msg in recent)
+    messages.append({"role": "user", "content": user_query})
+    return messages
@@ -1,32 +1,57 @@
+import asyncio
 import base64
+import hashlib
+from typing import Optional
+import aiofiles
+from src.utils.image_prep import PreparedImage, preprocess, prepared_images
 from src.utils.llm import get_aclient
+from src.utils.upstream import governor, estimate_request_tokens
+from src.config import config
 
-async def encode_image(image_path):
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
+async def encode_image(image_path: str, content_hash: Optional[str] = None, detail: Optional[str] = None) -> PreparedImage:
+    """Preprocessed image for a vision call, from the cache when this content was seen before"""
+    data = None
+    if content_hash is None:
+        async with aiofiles.open(image_path, "rb") as image_file:
+            data = await image_file.read()
+        content_hash = hashlib.sha256(data).hexdigest()
+    key = (content_hash, (detail or config.IMAGE_DETAIL).lower())
+    prepared = prepared_images.get(key)
+    if prepared is None:
+        if data is None:
+            async with aiofiles.open(image_path, "rb") as image_file:
+                data = await image_file.read()
+        prepared = await asyncio.to_thread(preprocess, data, detail)
+        prepared_images.put(key, prepared)
+    return prepared
 
 class ImageService:
     @staticmethod
-    async def analyze_image(image_path: str, prompt: str = "Analyze this image in detail."):
-        base64_image = await encode_image(image_path)
+    async def analyze_image(image_path: str, prompt: str = "Analyze this image in detail.",
+                            content_hash: Optional[str] = None, detail: Optional[str] = None):
+        image = await encode_image(image_path, content_hash, detail)
+        base64_image = base64.b64encode(image.data).decode('utf-8')
         
         aclient = get_aclient()
-        response = await aclient.chat.completions.create(
-            model="gpt-4o", 
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": prompt},
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{base64_image}"
-                            }
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "text", "text": prompt},
+                    {
+                        "type": "image_url",
+                        "image_url": {
+                            "url": f"data:{image.mime_type};base64,{base64_image}",
+                            "detail": image.detail
                         }
-                    ]
-                }
-            ],
-            max_tokens=1000
+                    }
+                ]
+            }
+        ]
+        tokens = estimate_request_tokens([{"role": "user", "content": prompt}], max_tokens=1000) + image.tokens
+        response = await governor.call(
+            "gpt-4o",
+            lambda: aclient.chat.completions.create(model="gpt-4o", messages=messages, max_tokens=1000),
+            tokens=tokens
         )
         return response.choices[0].message.content
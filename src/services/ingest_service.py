@@ -0,0 +1,269 @@
+import asyncio
+import time
+from openai import RateLimitError
+from typing import AsyncIterator, Awaitable, Callable, List, Optional, Tuple
+from sqlalchemy import delete, select
+from src.db.database import AsyncSessionLocal
+from src.db.vector_store import vector_store
+from src.models.models import UploadedFile
+from src.services.image_service import ImageService
+from src.services.audio_service import AudioService
+from src.utils.single_flight import SingleFlight
+from src.utils.text_chunker import chunk_documents
+from src.utils.uploads import StoredUpload
+from src.utils.upstream import UPSTREAM_BUSY_DETAIL
+from src.config import config
+
+StageCallback = Optional[Callable[[str], Awaitable[None]]]
+
+_TRANSCRIPT_PREFIX = "Transcript: "
+_ANALYSIS_SEPARATOR = "\n\nAnalysis: "
+
+async def _report(on_stage: StageCallback, stage: str):
+    if on_stage is not None:
+        await on_stage(stage)
+
+def _image_analyzer(prompt: str, on_stage: StageCallback = None):
+    async def analyze(stored: StoredUpload) -> str:
+        await _report(on_stage, "analyzing")
+        return await ImageService.analyze_image(stored.path, prompt, content_hash=stored.sha256)
+    return analyze
+
+def _audio_analyzer(on_stage: StageCallback = None):
+    async def analyze(stored: StoredUpload) -> str:
+        await _report(on_stage, "transcribing")
+        transcript = await AudioService.transcribe_audio(stored.path)
+        await _report(on_stage, "analyzing")
+        analysis = await AudioService.analyze_audio_content(transcript)
+        return f"{_TRANSCRIPT_PREFIX}{transcript}{_ANALYSIS_SEPARATOR}{analysis}"
+    return analyze
+
+def _audio_result(full_text: str, deduplicated: bool) -> dict:
+    transcript, _, analysis = full_text.removeprefix(_TRANSCRIPT_PREFIX).partition(_ANALYSIS_SEPARATOR)
+    return {"transcript": transcript, "analysis": analysis, "deduplicated": deduplicated}
+
+class IngestService:
+    """Analyze stored uploads once per (content hash, prompt) and index the result"""
+    # Concurrent identical uploads share one analysis
+    in_flight = SingleFlight()
+
+    @staticmethod
+    async def index_document(file_id: str, text: str, metadata: dict):
+        """Chunk an analysis and add the chunks to the vector store under one parent id"""
+        metadata = {**metadata, "uploaded_at": time.time()}
+        chunks = chunk_documents(file_id, text, metadata, config.CHUNK_MAX_TOKENS, config.CHUNK_OVERLAP_TOKENS)
+        await vector_store.aadd_documents(chunks)
+
+    @staticmethod
+    async def _forget(records: List[UploadedFile]):
+        """Delete rows whose indexing failed, so the next upload of the content retries"""
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(UploadedFile).where(UploadedFile.id.in_([record.id for record in records])))
+            await db.commit()
+
+    @staticmethod
+    async def _stored_description(db, kind: str, content_hash: str, prompt: Optional[str]) -> Optional[str]:
+        return await db.scalar(
+            select(UploadedFile.description).where(
+                UploadedFile.content_hash == content_hash,
+                UploadedFile.file_type == kind,
+                UploadedFile.prompt == prompt,
+                UploadedFile.description.isnot(None)
+            ).limit(1)
+        )
+
+    @staticmethod
+    async def ingest(kind: str, stored: StoredUpload, filename: str, prompt: Optional[str],
+                     analyze: Callable[[StoredUpload], Awaitable[str]], on_stage: StageCallback = None):
+        """Return (description, deduplicated).
+
+        In UPLOAD_DEDUP_MODE=reuse a previously analyzed hash + prompt returns the stored
+        description without any model call, file row or vector. Otherwise analyze(stored)
+        runs once even if identical uploads arrive concurrently. on_stage, if given, is
+        awaited with each pipeline stage name as it starts.
+        """
+        async def run():
+            # Short sessions on either side of the model call, so no pooled connection or
+            # read transaction is held while it runs
+            if config.UPLOAD_DEDUP_MODE == "reuse":
+                async with AsyncSessionLocal() as db:
+                    existing = await IngestService._stored_description(db, kind, stored.sha256, prompt)
+                if existing is not None:
+                    return existing, True
+            description = await analyze(stored)
+            await _report(on_stage, "indexing")
+            record = UploadedFile(
+                filename=filename,
+                file_path=stored.path,
+                file_type=kind,
+                description=description,
+                content_hash=stored.sha256,
+                prompt=prompt
+            )
+            async with AsyncSessionLocal() as db:
+                db.add(record)
+                await db.commit()
+            # Chunks point back at their UploadedFile row
+            try:
+                await IngestService.index_document(str(record.id), description, {"filename": filename, "type": kind})
+            except BaseException:
+                await asyncio.shield(IngestService._forget([record]))
+                raise
+            return description, False
+
+        (description, reused), shared = await IngestService.in_flight.run((kind, stored.sha256, prompt), run)
+        return description, reused or shared
+
+    @staticmethod
+    async def ingest_image(stored: StoredUpload, filename: str, prompt: str, on_stage: StageCallback = None) -> dict:
+        analyze = _image_analyzer(prompt, on_stage)
+        analysis, deduplicated = await IngestService.ingest("image", stored, filename, prompt, analyze, on_stage)
+        return {"analysis": analysis, "file_path": stored.path, "deduplicated": deduplicated}
+
+    @staticmethod
+    async def ingest_audio(stored: StoredUpload, filename: str, on_stage: StageCallback = None) -> dict:
+        full_text, deduplicated = await IngestService.ingest("audio", stored, filename, None, _audio_analyzer(on_stage), on_stage)
+        return _audio_result(full_text, deduplicated)
+
+    @staticmethod
+    async def _persist_batch(kind: str, prompt: Optional[str], analyzed: List[Tuple[str, StoredUpload, str]]):
+        """Insert the new UploadedFile rows in one transaction and index them in one vector store call"""
+        records = [
+            UploadedFile(
+                filename=filename,
+                file_path=stored.path,
+                file_type=kind,
+                description=description,
+                content_hash=stored.sha256,
+                prompt=prompt
+            )
+            for filename, stored, description in analyzed
+        ]
+        async with AsyncSessionLocal() as db:
+            db.add_all(records)
+            await db.commit()
+        uploaded_at = time.time()
+        chunks = []
+        for record in records:
+            metadata = {"filename": record.filename, "type": kind, "uploaded_at": uploaded_at}
+            chunks.extend(chunk_documents(
+                str(record.id), record.description, metadata, config.CHUNK_MAX_TOKENS, config.CHUNK_OVERLAP_TOKENS
+            ))
+        try:
+            await vector_store.aadd_documents(chunks)
+        except BaseException:
+            await asyncio.shield(IngestService._forget(records))
+            raise
+
+    @staticmethod
+    async def ingest_batch(kind: str, files: List[Tuple[str, StoredUpload]],
+                           prompt: Optional[str] = None) -> AsyncIterator[dict]:
+        """Analyze stored uploads BATCH_CONCURRENCY at a time, yielding each result as it finishes.
+
+        Identical files in the batch share one analysis, and known ones are looked up in a
+        single query (UPLOAD_DEDUP_MODE=reuse). New rows and vectors are written together
+        once every file is done. If the consumer goes away, analyses still queued or
+        running are cancelled (unless a single upload shares them) and only the finished
+        ones are stored.
+        Result entries carry the file's index in files, plus either the usual single-file
+        response or an error ("busy": true when the provider is still rate limiting); a final
+        {"done": ...} entry summarizes the batch.
+        """
+        analyze = _image_analyzer(prompt) if kind == "image" else _audio_analyzer()
+        groups = {}  # sha256 -> indexes of the files with that content
+        for index, (_, stored) in enumerate(files):
+            groups.setdefault(stored.sha256, []).append(index)
+
+        known = {}
+        if config.UPLOAD_DEDUP_MODE == "reuse" and groups:
+            async with AsyncSessionLocal() as db:
+                rows = await db.execute(
+                    select(UploadedFile.content_hash, UploadedFile.description).where(
+                        UploadedFile.content_hash.in_(list(groups)),
+                        UploadedFile.file_type == kind,
+                        UploadedFile.prompt == prompt,
+                        UploadedFile.description.isnot(None)
+                    )
+                )
+                known = dict(rows.all())
+
+        semaphore = asyncio.Semaphore(max(1, config.BATCH_CONCURRENCY))
+
+        async def analyze_once(stored: StoredUpload):
+            return await analyze(stored), False
+
+        async def run(indexes: List[int]):
+            stored = files[indexes[0]][1]
+            if stored.sha256 in known:
+                return indexes, known[stored.sha256], True, None
+            async with semaphore:
+                try:
+                    # Share the single-file key so concurrent single uploads coalesce with the batch
+                    (description, reused), shared = await IngestService.in_flight.run(
+                        (kind, stored.sha256, prompt), lambda: analyze_once(stored)
+                    )
+                    return indexes, description, reused or shared, None
+                except RateLimitError:
+                    return indexes, None, False, {"error": UPSTREAM_BUSY_DETAIL, "busy": True}
+                except Exception as e:
+                    return indexes, None, False, {"error": str(e)}
+
+        def result(description: str, deduplicated: bool, stored: StoredUpload) -> dict:
+            if kind == "audio":
+                return _audio_result(description, deduplicated)
+            return {"analysis": description, "file_path": stored.path, "deduplicated": deduplicated}
+
+        tasks = [asyncio.create_task(run(indexes)) for indexes in groups.values()]
+
+        def finished() -> List[Tuple[str, StoredUpload, str]]:
+            """(filename, stored, description) of every new analysis that has completed"""
+            analyzed = []
+            for task in tasks:
+                if task.done() and not task.cancelled():
+                    indexes, description, deduplicated, _ = task.result()
+                    if description is not None and not deduplicated:
+                        filename, stored = files[indexes[0]]
+                        analyzed.append((filename, stored, description))
+            return analyzed
+
+        counts = {"analyzed": 0, "deduplicated": 0, "failed": 0}
+        complete = False
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                indexes, description, deduplicated, error = await next_done
+                for position, index in enumerate(indexes):
+                    filename, stored = files[index]
+                    entry = {"index": index, "filename": filename}
+                    if error is not None:
+                        counts["failed"] += 1
+                        yield {**entry, **error}
+                        continue
+                    duplicate = deduplicated or position > 0
+                    counts["deduplicated" if duplicate else "analyzed"] += 1
+                    yield {**entry, **result(description, duplicate, stored)}
+            complete = True
+        finally:
+            if not complete:
+                # Consumer went away: stop the rest (which releases their analyses), keep what finished
+                for task in tasks:
+                    task.cancel()
+                analyzed = finished()
+                if analyzed:
+                    await asyncio.shield(IngestService._persist_batch(kind, prompt, analyzed))
+        summary = {"done": True, "files": len(files), **counts}
+        analyzed = finished()
+        if analyzed:
+            try:
+                await IngestService._persist_batch(kind, prompt, analyzed)
+            except Exception as e:
+                print(f"Warning: Could not store batch results: {e}")
+                summary["error"] = f"Results were not stored: {e}"
+        yield summary
+
+    @staticmethod
+    def stats() -> dict:
+        return {
+            "mode": config.UPLOAD_DEDUP_MODE,
+            "in_flight": IngestService.in_flight.in_flight(),
+            "shared": IngestService.in_flight.shared
+        }
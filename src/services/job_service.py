@@ -0,0 +1,194 @@
+import asyncio
+import json
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from openai import RateLimitError
+from sqlalchemy import and_, or_, select, update
+from src.db.database import AsyncSessionLocal
+from src.models.models import AnalysisJob
+from src.services.ingest_service import IngestService
+from src.utils.uploads import StoredUpload
+from src.utils.upstream import upstream_priority, UPSTREAM_BUSY_DETAIL
+from src.config import config
+
+TERMINAL_STATUSES = ("succeeded", "failed")
+
+def _job_dict(job: AnalysisJob) -> dict:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "stage": job.stage,
+        "filename": job.filename,
+        "attempts": job.attempts,
+        "result": json.loads(job.result) if job.result else None,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at,
+        "finished_at": job.finished_at
+    }
+
+class JobService:
+    @staticmethod
+    async def submit(kind: str, stored: StoredUpload, filename: str, prompt: Optional[str] = None) -> dict:
+        """Queue analysis of an already stored upload and return its job record"""
+        job = AnalysisJob(
+            id=str(uuid.uuid4()),
+            kind=kind,
+            status="queued",
+            filename=filename,
+            file_path=stored.path,
+            file_size=stored.size,
+            mime_type=stored.mime_type,
+            content_hash=stored.sha256,
+            prompt=prompt
+        )
+        async with AsyncSessionLocal() as db:
+            db.add(job)
+            await db.commit()
+        job_pool.notify()
+        return _job_dict(job)
+
+    @staticmethod
+    async def get(job_id: str) -> Optional[dict]:
+        async with AsyncSessionLocal() as db:
+            job = await db.get(AnalysisJob, job_id)
+            return _job_dict(job) if job else None
+
+    @staticmethod
+    async def _update(job_id: str, **values):
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(AnalysisJob).where(AnalysisJob.id == job_id).values(updated_at=datetime.utcnow(), **values)
+            )
+            await db.commit()
+
+class JobWorkerPool:
+    """JOB_WORKERS asyncio workers that claim queued jobs from the database.
+
+    The analysis_jobs table is the queue, so queued work survives restarts and is shared
+    by every process; a claim is a conditional UPDATE, so each job runs once. Submitting
+    wakes idle workers immediately, otherwise they poll every JOB_POLL_INTERVAL.
+    """
+
+    def __init__(self):
+        self._tasks = []
+        self._wakeup = None
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def start(self, workers: int):
+        if workers <= 0 or self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(workers)]
+
+    async def stop(self):
+        """Cancel the workers (their jobs go back to the queue) and the analyses they started"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # The analyses run shielded in IngestService.in_flight and would outlive the workers
+        await IngestService.in_flight.cancel_all()
+
+    @staticmethod
+    def _claimable(now: datetime):
+        stale = now - timedelta(seconds=config.JOB_STALE_SECONDS)
+        return or_(
+            AnalysisJob.status == "queued",
+            and_(AnalysisJob.status == "running", AnalysisJob.updated_at < stale)
+        )
+
+    async def _claim(self) -> Optional[AnalysisJob]:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            candidates = (await db.scalars(
+                select(AnalysisJob.id).where(self._claimable(now)).order_by(AnalysisJob.created_at).limit(8)
+            )).all()
+            for job_id in candidates:
+                claimed = await db.execute(
+                    update(AnalysisJob)
+                    .where(AnalysisJob.id == job_id, self._claimable(now))
+                    .values(status="running", stage="starting", attempts=AnalysisJob.attempts + 1, updated_at=now)
+                )
+                await db.commit()
+                if claimed.rowcount == 1:
+                    return await db.get(AnalysisJob, job_id)
+        return None
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await self._claim()
+            except Exception as e:
+                print(f"Warning: Could not claim analysis job: {e}")
+                job = None
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=config.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _run(self, job: AnalysisJob):
+        if job.attempts > config.JOB_MAX_ATTEMPTS:
+            await JobService._update(job.id, status="failed", stage=None, finished_at=datetime.utcnow(),
+                                     error=f"Gave up after {job.attempts - 1} interrupted attempts")
+            self.failed += 1
+            return
+
+        stored = StoredUpload(job.file_path, job.content_hash, job.file_size, job.file_path.rsplit(".", 1)[-1], job.mime_type)
+
+        async def on_stage(stage: str):
+            await JobService._update(job.id, stage=stage)
+
+        async def heartbeat():
+            # Keep updated_at fresh during long stages so other processes don't reclaim the job
+            while True:
+                await asyncio.sleep(max(config.JOB_STALE_SECONDS / 3, 1))
+                try:
+                    await JobService._update(job.id)
+                except Exception as e:
+                    print(f"Warning: Could not refresh analysis job {job.id}: {e}")
+
+        beat = asyncio.create_task(heartbeat())
+        self.running += 1
+        try:
+            with upstream_priority("bulk"):
+                if job.kind == "image":
+                    result = await IngestService.ingest_image(stored, job.filename, job.prompt, on_stage)
+                else:
+                    result = await IngestService.ingest_audio(stored, job.filename, on_stage)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back to the queue for the next start
+            await asyncio.shield(JobService._update(job.id, status="queued", stage=None, attempts=AnalysisJob.attempts - 1))
+            raise
+        except RateLimitError:
+            await JobService._update(job.id, status="failed", stage=None, error=f"busy: {UPSTREAM_BUSY_DETAIL}",
+                                     finished_at=datetime.utcnow())
+            self.failed += 1
+        except Exception as e:
+            print(f"Analysis job {job.id} failed: {e}")
+            await JobService._update(job.id, status="failed", stage=None, error=str(e), finished_at=datetime.utcnow())
+            self.failed += 1
+        else:
+            await JobService._update(job.id, status="succeeded", stage=None, result=json.dumps(result),
+                                     finished_at=datetime.utcnow())
+            self.completed += 1
+        finally:
+            beat.cancel()
+            self.running -= 1
+
+    def stats(self) -> dict:
+        return {"workers": len(self._tasks), "running": self.running, "completed": self.completed, "failed": self.failed}
+
+job_pool = JobWorkerPool()
@@ -1,27 +1,40 @@
 from src.utils.llm import get_aclient
+from src.utils.response_cache import response_cache
+from src.utils.upstream import governor, estimate_request_tokens
 
 class TextService:
     @staticmethod
-    async def analyze_text(text: str, instruction: str):
-        aclient = get_aclient()
-        response = await aclient.chat.completions.create(
-            model="gpt-4o",
-            messages=[
+    async def _complete(endpoint: str, request: dict, use_cache: bool, semantic_text: str):
+        async def compute():
+            aclient = get_aclient()
+            response = await governor.call(
+                request["model"],
+                lambda: aclient.chat.completions.create(**request),
+                tokens=estimate_request_tokens(request["messages"])
+            )
+            return response.choices[0].message.content
+
+        return await response_cache.get_or_compute(endpoint, request, compute, use_cache=use_cache, semantic_text=semantic_text)
+
+    @staticmethod
+    async def analyze_text(text: str, instruction: str, use_cache: bool = True):
+        request = {
+            "model": "gpt-4o",
+            "messages": [
                 {"role": "system", "content": "You are a professional text analyst and editor."},
                 {"role": "user", "content": f"Instruction: {instruction}\n\nText:\n{text}"}
             ]
-        )
-        return response.choices[0].message.content
+        }
+        return await TextService._complete("analyze_text", request, use_cache, request["messages"][1]["content"])
 
     @staticmethod
-    async def generate_json(text: str, schema_description: str):
-        aclient = get_aclient()
-        response = await aclient.chat.completions.create(
-            model="gpt-4o",
-            response_format={ "type": "json_object" },
-            messages=[
+    async def generate_json(text: str, schema_description: str, use_cache: bool = True):
+        request = {
+            "model": "gpt-4o",
+            "response_format": { "type": "json_object" },
+            "messages": [
                 {"role": "system", "content": "You are a data extractor. Output valid JSON."},
                 {"role": "user", "content": f"Extract the following structure: {schema_description}\n\nFrom this text:\n{text}"}
             ]
-        )
-        return response.choices[0].message.content
+        }
+        return await TextService._complete("generate_json", request, use_cache, request["messages"][1]["content"])
@@ -0,0 +1,69 @@
+import asyncio
+from typing import Awaitable, Callable, List
+from src.utils.upstream import current_priority, most_urgent, upstream_priority
+
+class EmbeddingBatcher:
+    """Coalesces embedding requests from concurrent callers into batched API calls.
+
+    The first request opens a short window; everything that arrives before it
+    closes (or until max_batch_size texts are queued) is sent as one request, at the
+    most urgent upstream priority of the callers waiting on it.
+    """
+
+    def __init__(self, embed_many: Callable[[List[str]], Awaitable[List[List[float]]]],
+                 max_batch_size: int = 64, max_wait_ms: float = 5):
+        self._embed_many = embed_many
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._pending = []  # (text, future, caller's upstream priority)
+        self._timer = None
+        self._loop = None
+        self.batches = 0
+        self.texts = 0
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Pending futures belong to the loop that created them
+            self._loop = loop
+            self._pending = []
+            self._timer = None
+        future = loop.create_future()
+        self._pending.append((text, future, current_priority()))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        unique = list(dict.fromkeys(text for text, _, _ in batch))
+        self.batches += 1
+        self.texts += len(unique)
+        try:
+            # The task inherited the priority of whoever opened the window, not of everyone in it
+            with upstream_priority(most_urgent(priority for _, _, priority in batch)):
+                embeddings = await self._embed_many(unique)
+            by_text = dict(zip(unique, embeddings))
+            for text, future, _ in batch:
+                if not future.done():
+                    future.set_result(by_text[text])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": self.texts / self.batches if self.batches else 0.0
+        }
@@ -0,0 +1,92 @@
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFC, trimmed, whitespace collapsed"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """Two-tier embedding cache: bounded in-process LRU in front of an optional SQLite table"""
+
+    def __init__(self, max_entries: int = 10000, db_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self._memory = OrderedDict()  # key -> float32 vector
+        self._lock = threading.Lock()
+        self._db = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if db_path:
+            try:
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dim INTEGER, vector BLOB)"
+                )
+                self._db.commit()
+            except Exception as e:
+                print(f"Warning: Embedding cache database unavailable, using memory only: {e}")
+                self._db = None
+
+    def _remember(self, key: str, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, model: str, text: str):
+        """Return the cached float32 vector, or None on a miss"""
+        key = cache_key(model, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector)
+                    self.disk_hits += 1
+                    return vector
+            self.misses += 1
+            return None
+
+    def put(self, model: str, text: str, embedding):
+        if embedding is None or len(embedding) == 0:
+            return
+        key = cache_key(model, text)
+        vector = np.asarray(embedding, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO embeddings (key, dim, vector) VALUES (?, ?, ?)",
+                        (key, int(vector.shape[0]), vector.tobytes())
+                    )
+                    self._db.commit()
+                except Exception as e:
+                    print(f"Warning: Could not persist embedding: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "max_entries": self.max_entries,
+                "persistent": self._db is not None,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0
+            }
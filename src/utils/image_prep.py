@@ -0,0 +1,152 @@
+import io
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+from src.config import config
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow missing: images are sent as uploaded
+    Image = None
+
+DETAILS = ("low", "high", "auto")
+FORMATS = ("jpeg", "webp", "png")
+_LOW_DETAIL_SIDE = 512
+_HIGH_DETAIL_SHORT_SIDE = 768
+_ORIGINAL_TYPES = {
+    b"\x89PNG": "image/png",
+    b"\xff\xd8\xff": "image/jpeg",
+    b"GIF8": "image/gif",
+    b"RIFF": "image/webp"
+}
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    detail: str
+    width: int
+    height: int
+    original_size: int
+
+    @property
+    def tokens(self) -> int:
+        return image_tokens(self.width, self.height, self.detail)
+
+def image_tokens(width: int, height: int, detail: str) -> int:
+    """Vision input tokens: 85 at low detail, else 85 + 170 per 512px tile"""
+    if detail == "low":
+        return 85
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+def choose_detail(width: int, height: int, requested: Optional[str] = None) -> str:
+    """requested or IMAGE_DETAIL; "auto" picks low when the image already fits one low-detail tile"""
+    detail = (requested or config.IMAGE_DETAIL).lower()
+    if detail not in DETAILS:
+        detail = "auto"
+    if detail == "auto":
+        return "low" if max(width, height) <= _LOW_DETAIL_SIDE else "high"
+    return detail
+
+def target_size(width: int, height: int, detail: str) -> tuple:
+    """Largest size the model actually looks at for this detail; never upscales.
+
+    High detail is bounded by IMAGE_MAX_SIDE and a 768px short side (the API downsamples
+    to that anyway), low detail by a 512px square.
+    """
+    if detail == "low":
+        scale = _LOW_DETAIL_SIDE / max(width, height)
+    else:
+        scale = min(config.IMAGE_MAX_SIDE / max(width, height), _HIGH_DETAIL_SHORT_SIDE / min(width, height))
+    scale = min(scale, 1.0)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def _original(data: bytes, detail: str) -> PreparedImage:
+    mime_type = next((mime for magic, mime in _ORIGINAL_TYPES.items() if data.startswith(magic)), "image/jpeg")
+    # Size unknown: assume a typical 2x2-tile image for the token estimate
+    return PreparedImage(data, mime_type, detail if detail in DETAILS else "auto", 768, 768, len(data))
+
+def preprocess(data: bytes, detail: Optional[str] = None) -> PreparedImage:
+    """Downscale, drop metadata and re-encode as IMAGE_FORMAT (CPU bound; run off the event loop)"""
+    requested = (detail or config.IMAGE_DETAIL).lower()
+    if Image is None:
+        return _original(data, requested)
+    try:
+        with Image.open(io.BytesIO(data)) as source:
+            source.seek(0)  # first frame of animations
+            image = ImageOps.exif_transpose(source)
+            chosen = choose_detail(image.width, image.height, requested)
+            size = target_size(image.width, image.height, chosen)
+            if size != image.size:
+                image = image.resize(size, Image.LANCZOS)
+            fmt = config.IMAGE_FORMAT if config.IMAGE_FORMAT in FORMATS else "jpeg"
+            if image.mode in ("RGBA", "LA", "PA") or (image.mode == "P" and "transparency" in image.info):
+                image = image.convert("RGBA")
+                if fmt == "jpeg":
+                    background = Image.new("RGB", image.size, (255, 255, 255))
+                    background.paste(image, mask=image.getchannel("A"))
+                    image = background
+            elif image.mode != "RGB":
+                image = image.convert("RGB")
+            out = io.BytesIO()
+            # Saving a fresh image carries no EXIF, XMP or ICC data over
+            image.save(out, format=fmt.upper(), quality=config.IMAGE_QUALITY, optimize=fmt == "jpeg")
+    except Exception as e:
+        print(f"Warning: Image preprocessing failed, sending original: {e}")
+        return _original(data, requested)
+    return PreparedImage(out.getvalue(), f"image/{fmt}", chosen, image.width, image.height, len(data))
+
+class PreparedImageCache:
+    """LRU of preprocessed images keyed by (content hash, detail), bounded by total bytes"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (sha256, detail) -> PreparedImage
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def get(self, key: tuple) -> Optional[PreparedImage]:
+        with self._lock:
+            prepared = self._entries.get(key)
+            if prepared is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return prepared
+
+    def put(self, key: tuple, prepared: PreparedImage):
+        with self._lock:
+            self.bytes_in += prepared.original_size
+            self.bytes_out += len(prepared.data)
+            if len(prepared.data) > self.max_bytes:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous.data)
+            self._entries[key] = prepared
+            self._bytes += len(prepared.data)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "pillow": Image is not None
+            }
+
+prepared_images = PreparedImageCache(int(config.IMAGE_CACHE_MB * 1024 * 1024))
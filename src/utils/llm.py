@@ -1,10 +1,72 @@
-from openai import AsyncOpenAI
+import threading
+import httpx
+from openai import AsyncOpenAI, OpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient
 from src.config import config
 
-def get_aclient():
-    """Lazy initialization of OpenAI client"""
+_lock = threading.Lock()
+_aclient = None
+_client = None
+
+def _http_options() -> dict:
+    """Keep-alive pool limits shared by the sync and async clients"""
+    options = {
+        "limits": httpx.Limits(
+            max_connections=config.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY
+        )
+    }
+    if config.LLM_HTTP2:
+        try:
+            import h2  # noqa: F401
+            options["http2"] = True
+        except ImportError:
+            print("Warning: LLM_HTTP2 is set but the h2 package is not installed (pip install httpx[http2]); using HTTP/1.1")
+    return options
+
+def _check_key():
     if not config.OPENAI_API_KEY:
         raise ValueError("OPENAI_API_KEY environment variable is not set")
-    return AsyncOpenAI(api_key=config.OPENAI_API_KEY)
 
-aclient = None  # Will be initialized on first use
+def get_aclient():
+    """Process-wide AsyncOpenAI client, created on first use and reused by every call so
+    requests share one keep-alive connection pool"""
+    global _aclient
+    if _aclient is None:
+        _check_key()
+        with _lock:
+            if _aclient is None:
+                _aclient = AsyncOpenAI(
+                    api_key=config.OPENAI_API_KEY,
+                    base_url=config.OPENAI_BASE_URL,
+                    timeout=config.LLM_TIMEOUT,
+                    max_retries=0,  # retries are handled by the upstream governor
+                    http_client=DefaultAsyncHttpxClient(**_http_options())
+                )
+    return _aclient
+
+def get_client():
+    """Process-wide sync OpenAI client (vector store ingestion outside the event loop)"""
+    global _client
+    if _client is None:
+        _check_key()
+        with _lock:
+            if _client is None:
+                _client = OpenAI(
+                    api_key=config.OPENAI_API_KEY,
+                    base_url=config.OPENAI_BASE_URL,
+                    timeout=config.LLM_TIMEOUT,
+                    http_client=DefaultHttpxClient(**_http_options())
+                )
+    return _client
+
+async def close_clients():
+    """Close the pooled connections; called from the app lifespan on shutdown"""
+    global _aclient, _client
+    with _lock:
+        aclient, client = _aclient, _client
+        _aclient = _client = None
+    if aclient is not None:
+        await aclient.close()
+    if client is not None:
+        client.close()
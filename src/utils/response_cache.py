@@ -0,0 +1,150 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+import numpy as np
+from src.config import config
+
+class ResponseCache:
+    """TTL + LRU cache of LLM responses with optional semantic (embedding) lookup.
+
+    Exact entries are keyed by a hash of the endpoint, model, prompt and parameters.
+    Semantic entries additionally keep the normalized embedding of the request text
+    per endpoint and scope, so a near-identical request with the same scope (whatever
+    else shapes the answer: session, filter, retrieved context) can reuse an answer
+    above a threshold.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._semantic = {}  # (endpoint, scope) -> {"keys": [...], "vectors": [...], "matrix": ndarray or None}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    @staticmethod
+    def make_key(endpoint: str, request: dict) -> str:
+        payload = json.dumps({"endpoint": endpoint, **request}, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _live(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._live(key)
+            return entry[1] if entry else None
+
+    def put(self, key: str, value, endpoint: Optional[str] = None, vector=None, scope: Optional[str] = None):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if endpoint is not None and vector is not None:
+                index = self._semantic.setdefault((endpoint, scope), {"keys": [], "vectors": [], "matrix": None})
+                index["keys"].append(key)
+                index["vectors"].append(vector)
+                index["matrix"] = None
+                if len(index["keys"]) > 2 * self.max_entries:
+                    self._prune(index)
+
+    def _prune(self, index: dict):
+        """Drop semantic rows whose exact entry has expired or been evicted"""
+        kept = [(k, v) for k, v in zip(index["keys"], index["vectors"]) if k in self._entries]
+        index["keys"] = [k for k, _ in kept]
+        index["vectors"] = [v for _, v in kept]
+        index["matrix"] = None
+
+    def find_similar(self, endpoint: str, vector, threshold: float, scope: Optional[str] = None):
+        with self._lock:
+            index = self._semantic.get((endpoint, scope))
+            if not index or not index["keys"]:
+                return None
+            if index["matrix"] is None:
+                index["matrix"] = np.stack(index["vectors"])
+            scores = index["matrix"] @ vector
+            for row in np.argsort(-scores):
+                if scores[row] < threshold:
+                    break
+                entry = self._live(index["keys"][row])
+                if entry is not None:
+                    return entry[1]
+            return None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed
+            }
+
+    async def get_or_compute(self, endpoint: str, request: dict, compute: Callable[[], Awaitable[str]],
+                             use_cache: bool = True, semantic_text: Optional[str] = None,
+                             semantic_scope: Optional[str] = None):
+        """Return a cached response for this request, or compute and store it.
+
+        Caching applies only to endpoints listed in RESPONSE_CACHE_ENDPOINTS; semantic
+        lookup only to those in RESPONSE_CACHE_SEMANTIC_ENDPOINTS (and needs semantic_text),
+        and only among entries stored with the same semantic_scope.
+        """
+        if endpoint not in config.RESPONSE_CACHE_ENDPOINTS:
+            return await compute()
+        key = self.make_key(endpoint, request)
+        if not use_cache:
+            # A bypass still refreshes the exact entry with the fresh answer
+            self.bypassed += 1
+            value = await compute()
+            if value is not None:
+                self.put(key, value)
+            return value
+
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        vector = None
+        if semantic_text and endpoint in config.RESPONSE_CACHE_SEMANTIC_ENDPOINTS:
+            from src.db.vector_store import vector_store
+            vector = await vector_store.aembed(semantic_text)
+            if vector is not None:
+                similar = self.find_similar(endpoint, vector, config.RESPONSE_CACHE_SEMANTIC_THRESHOLD, semantic_scope)
+                if similar is not None:
+                    self.semantic_hits += 1
+                    return similar
+
+        self.misses += 1
+        value = await compute()
+        if value is not None:
+            self.put(key, value, endpoint, vector, semantic_scope)
+        return value
+
+def cache_allowed(cache_control: Optional[str], cache_bypass: Optional[str]) -> bool:
+    """False when the client sent Cache-Control: no-cache/no-store or X-Cache-Bypass: 1/true"""
+    if cache_control and any(d in cache_control.lower() for d in ("no-cache", "no-store")):
+        return False
+    return not (cache_bypass and cache_bypass.lower() in ("1", "true", "yes"))
+
+response_cache = ResponseCache(
+    max_entries=config.RESPONSE_CACHE_SIZE,
+    ttl_seconds=config.RESPONSE_CACHE_TTL_SECONDS
+)
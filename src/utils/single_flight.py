@@ -0,0 +1,50 @@
+import asyncio
+from typing import Awaitable, Callable, Hashable
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one in-flight execution"""
+
+    def __init__(self):
+        self._calls = {}  # key -> task
+        self._waiters = {}  # task -> callers awaiting it
+        self.shared = 0
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """Return (result, shared): shared is True when another caller's run was joined.
+
+        The work runs in its own task and is shielded, so one caller disconnecting does
+        not cancel it for the others; it is cancelled once no caller is left waiting.
+        """
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.shared += 1
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task), shared
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # Nobody wants the result any more: stop spending upstream quota on it
+                    self._forget(key, task)
+                    task.cancel()
+
+    async def cancel_all(self):
+        """Cancel every in-flight call and wait for them to finish (used at shutdown)"""
+        tasks = list(self._calls.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,72 @@
+import re
+from typing import Iterator, List
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+def _sentences(text: str) -> Iterator[str]:
+    for sentence in _SENTENCE_BOUNDARY.split(text):
+        sentence = sentence.strip()
+        if sentence:
+            yield sentence
+
+def _pieces(text: str, max_tokens: int) -> Iterator[str]:
+    """Sentences, with any sentence longer than max_tokens split on word boundaries"""
+    for sentence in _sentences(text):
+        if estimate_tokens(sentence) <= max_tokens:
+            yield sentence
+            continue
+        words = []
+        size = 0
+        max_chars = max_tokens * 4
+        for word in (w[i:i + max_chars] for w in sentence.split() for i in range(0, len(w), max_chars)):
+            word_tokens = estimate_tokens(word) + 1
+            if words and size + word_tokens > max_tokens:
+                yield " ".join(words)
+                words, size = [], 0
+            words.append(word)
+            size += word_tokens
+        if words:
+            yield " ".join(words)
+
+def iter_chunks(text: str, max_tokens: int = 300, overlap_tokens: int = 50) -> Iterator[str]:
+    """Yield sentence-window chunks of at most ~max_tokens, each starting with up to
+    overlap_tokens of trailing sentences from the previous chunk"""
+    window = []
+    size = 0
+    fresh = False  # window holds sentences not yet emitted
+    for piece in _pieces(text, max_tokens):
+        piece_tokens = estimate_tokens(piece) + 1
+        if fresh and size + piece_tokens > max_tokens:
+            yield " ".join(window)
+            carried = []
+            carried_size = 0
+            for sentence in reversed(window):
+                sentence_tokens = estimate_tokens(sentence) + 1
+                if carried_size + sentence_tokens > overlap_tokens:
+                    break
+                carried.insert(0, sentence)
+                carried_size += sentence_tokens
+            window, size = carried, carried_size
+            while window and size + piece_tokens > max_tokens:
+                size -= estimate_tokens(window.pop(0)) + 1
+        window.append(piece)
+        size += piece_tokens
+        fresh = True
+    if fresh:
+        yield " ".join(window)
+
+def chunk_documents(parent_id: str, text: str, metadata: dict,
+                    max_tokens: int = 300, overlap_tokens: int = 50) -> List[dict]:
+    """Split a document into vector-store records that point back at their parent"""
+    documents = []
+    for index, chunk in enumerate(iter_chunks(text, max_tokens, overlap_tokens)):
+        documents.append({
+            "id": f"{parent_id}:{index}",
+            "text": chunk,
+            "metadata": {**metadata, "parent_id": parent_id, "chunk_index": index}
+        })
+    return documents
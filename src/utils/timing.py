@@ -0,0 +1,44 @@
+import threading
+import time
+from contextlib import contextmanager
+
+class StageStats:
+    """Running count / average / max latency per named pipeline stage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}  # stage -> [count, total_ms, max_ms]
+
+    def record(self, stage: str, elapsed_ms: float):
+        with self._lock:
+            entry = self._stages.setdefault(stage, [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed_ms
+            entry[2] = max(entry[2], elapsed_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                stage: {"count": count, "avg_ms": round(total / count, 2), "max_ms": round(peak, 2)}
+                for stage, (count, total, peak) in self._stages.items()
+            }
+
+async def timed(timings: dict, stats: StageStats, stage: str, awaitable):
+    """Await and record how long it took under timings[stage] (milliseconds)"""
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        timings[stage] = round(elapsed_ms, 2)
+        stats.record(stage, elapsed_ms)
+
+@contextmanager
+def timed_block(timings: dict, stats: StageStats, stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        timings[stage] = round(elapsed_ms, 2)
+        stats.record(stage, elapsed_ms)
@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import os
+import uuid
+import zipfile
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from src.config import config
+
+class UploadRejected(ValueError):
+    """Upload refused while streaming; status_code is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+@dataclass
+class StoredUpload:
+    path: str
+    sha256: str
+    size: int
+    extension: str
+    mime_type: str
+
+def sniff_type(head: bytes, kind: str) -> Optional[tuple]:
+    """(extension, mime type) from the file's leading bytes, or None if not a supported kind"""
+    if kind == "image":
+        if head.startswith(b"\x89PNG\r\n\x1a\n"):
+            return "png", "image/png"
+        if head.startswith(b"\xff\xd8\xff"):
+            return "jpg", "image/jpeg"
+        if head[:6] in (b"GIF87a", b"GIF89a"):
+            return "gif", "image/gif"
+        if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+            return "webp", "image/webp"
+    elif kind == "audio":
+        if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+            return "wav", "audio/wav"
+        if head.startswith(b"ID3") or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+            return "mp3", "audio/mpeg"
+        if head.startswith(b"OggS"):
+            return "ogg", "audio/ogg"
+        if head.startswith(b"fLaC"):
+            return "flac", "audio/flac"
+        if head[4:8] == b"ftyp":
+            return "m4a", "audio/mp4"
+        if head.startswith(b"\x1a\x45\xdf\xa3"):
+            return "webm", "audio/webm"
+    return None
+
+def max_upload_bytes(kind: str) -> int:
+    megabytes = config.MAX_AUDIO_UPLOAD_MB if kind == "audio" else config.MAX_IMAGE_UPLOAD_MB
+    return int(megabytes * 1024 * 1024)
+
+# Request body allowance on top of the file itself: multipart framing and form fields
+_FORM_OVERHEAD = 1024 * 1024
+
+def request_body_limit(path: str) -> Optional[int]:
+    """Largest request body accepted by an upload route, or None for other routes"""
+    if path.endswith("/batch") and path.startswith("/analyze/"):
+        return int(config.MAX_BATCH_UPLOAD_MB * 1024 * 1024)
+    if path in ("/analyze/image", "/analyze/image/jobs"):
+        return max_upload_bytes("image") + _FORM_OVERHEAD
+    if path in ("/analyze/audio", "/analyze/audio/jobs"):
+        return max_upload_bytes("audio") + _FORM_OVERHEAD
+    return None
+
+class UploadLimitMiddleware:
+    """Refuse oversized upload requests before starlette spools them to disk.
+
+    A Content-Length over the route's limit is answered with 413 without reading the
+    body; a chunked body is cut off with 413 as soon as it passes the limit.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        limit = request_body_limit(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        detail = f"Request body exceeds the {limit / (1024 * 1024):g} MB limit for {scope['path']}"
+        try:
+            length = int(dict(scope["headers"]).get(b"content-length", b"0"))
+        except ValueError:
+            length = 0
+        if length > limit:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+async def save_upload(upload: UploadFile, kind: str) -> StoredUpload:
+    return await save_stream(upload.read, upload.filename, kind)
+
+async def save_stream(read: Callable[[int], Awaitable[bytes]], filename: str, kind: str) -> StoredUpload:
+    """Copy an upload into UPLOAD_DIR without blocking the event loop.
+
+    The type is taken from the content (not the client's filename), the size limit and
+    SHA-256 are applied chunk by chunk, and the data lands in a temp file that is only
+    renamed to <sha256>.<ext> once complete, so readers never see partial files; a second
+    copy of bytes already on disk is discarded. By this point starlette has spooled the
+    request body, so the overall request size is bounded earlier by UploadLimitMiddleware.
+    """
+    limit = max_upload_bytes(kind)
+    temp_path = os.path.join(config.UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    detected = None
+    try:
+        async with aiofiles.open(temp_path, "wb") as out:
+            while chunk := await read(config.UPLOAD_CHUNK_SIZE):
+                if detected is None:
+                    detected = sniff_type(chunk, kind)
+                    if detected is None:
+                        raise UploadRejected(f"Unsupported {kind} type for '{filename}'", 415)
+                size += len(chunk)
+                if size > limit:
+                    raise UploadRejected(f"File exceeds the {limit / (1024 * 1024):g} MB {kind} upload limit", 413)
+                digest.update(chunk)
+                await out.write(chunk)
+        if detected is None:
+            raise UploadRejected("Empty upload", 400)
+        extension, mime_type = detected
+        final_path = os.path.join(config.UPLOAD_DIR, f"{digest.hexdigest()}.{extension}")
+        if await aiofiles.os.path.exists(final_path):
+            await aiofiles.os.remove(temp_path)
+        else:
+            await aiofiles.os.replace(temp_path, final_path)
+    except BaseException:
+        try:
+            await aiofiles.os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+    return StoredUpload(final_path, digest.hexdigest(), size, extension, mime_type)
+
+def _zip_members(archive: zipfile.ZipFile) -> List[zipfile.ZipInfo]:
+    return [
+        info for info in archive.infolist()
+        if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+        and not os.path.basename(info.filename).startswith(".")
+    ]
+
+async def save_batch(uploads: List[UploadFile], kind: str) -> List[tuple]:
+    """Store every upload, expanding zip archives, as (filename, StoredUpload or UploadRejected).
+
+    A bad file is reported in its own entry rather than failing the batch. Zip members
+    are decompressed chunk by chunk off the event loop, so the per-file size limit also
+    bounds what a compressed member can expand to.
+    """
+    stored: List[tuple] = []
+
+    def check_count(extra: int):
+        if len(stored) + extra > config.BATCH_MAX_FILES:
+            raise UploadRejected(f"Batch exceeds {config.BATCH_MAX_FILES} files", 413)
+
+    async def store(read, filename: str):
+        try:
+            stored.append((filename, await save_stream(read, filename, kind)))
+        except UploadRejected as e:
+            stored.append((filename, e))
+
+    for upload in uploads:
+        head = await upload.read(4)
+        await upload.seek(0)
+        if head != b"PK\x03\x04":
+            check_count(1)
+            await store(upload.read, upload.filename)
+            continue
+        try:
+            archive = await asyncio.to_thread(zipfile.ZipFile, upload.file)
+        except zipfile.BadZipFile:
+            check_count(1)
+            stored.append((upload.filename, UploadRejected(f"Corrupt zip archive '{upload.filename}'", 400)))
+            continue
+        with archive:
+            members = _zip_members(archive)
+            check_count(len(members))
+            for info in members:
+                member = await asyncio.to_thread(archive.open, info)
+                try:
+                    await store(lambda size, member=member: asyncio.to_thread(member.read, size), info.filename)
+                finally:
+                    member.close()
+    return stored
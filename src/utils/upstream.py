@@ -0,0 +1,263 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import random
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Optional
+import openai
+from src.config import config
+from src.utils.text_chunker import estimate_tokens
+
+# Lower value = served first when a model's concurrency slots are contended
+PRIORITIES = {"interactive": 0, "default": 1, "bulk": 2}
+
+_priority = contextvars.ContextVar("upstream_priority", default="default")
+
+# Reported when a call is still rate limited after UPSTREAM_MAX_RETRIES
+UPSTREAM_BUSY_DETAIL = "The model provider is rate limiting requests; please retry shortly."
+
+_RETRYABLE = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+@contextmanager
+def upstream_priority(name: str):
+    """Run upstream calls made inside the block (including nested service calls) at this priority"""
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+def current_priority() -> str:
+    """Name of the priority upstream calls made here run at"""
+    return _priority.get()
+
+def most_urgent(names) -> str:
+    """The most urgent of several priority names"""
+    return min(names, key=lambda name: PRIORITIES.get(name, PRIORITIES["default"]))
+
+def estimate_request_tokens(messages=None, text: str = "", max_tokens: Optional[int] = None) -> int:
+    """Rough prompt + completion token charge for the tokens/min bucket; corrected from usage afterwards"""
+    total = estimate_tokens(text) if text else 0
+    for message in messages or []:
+        content = message.get("content")
+        if isinstance(content, str):
+            total += estimate_tokens(content) + 4
+        elif isinstance(content, list):
+            for part in content:
+                total += estimate_tokens(part.get("text", "")) if part.get("type") == "text" else 85
+    if messages:
+        total += max_tokens or config.UPSTREAM_COMPLETION_TOKENS
+    return total
+
+class PrioritySemaphore:
+    """Counting semaphore whose waiters are served lowest priority value first (FIFO
+    within a level). The limit can be changed while in use."""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_use = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+    async def acquire(self, priority: int):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # the slot was handed over just as we were cancelled
+            raise
+
+    def _wake(self):
+        while self._waiters and self.in_use < self.limit:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.in_use += 1
+            future.set_result(None)
+
+    def release(self):
+        self.in_use -= 1
+        self._wake()
+
+    def resize(self, limit: int):
+        self.limit = limit
+        self._wake()
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+class TokenBucket:
+    """Continuously refilling bucket holding at most one minute of allowance"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken (requests larger than the bucket wait for a full one)"""
+        now = time.monotonic()
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill()
+        needed = min(amount, self.capacity)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+    def adjust(self, amount: float):
+        """Charge (positive) or refund (negative) the difference once actual usage is known"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+    def block(self, seconds: float):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+class ModelLimiter:
+    """Concurrency slots, request/token buckets and AIMD concurrency control for one model"""
+
+    def __init__(self, concurrency: int, rpm: float = 0, tpm: float = 0):
+        self.max_concurrency = concurrency
+        self.semaphore = PrioritySemaphore(concurrency)
+        self.requests = TokenBucket(rpm) if rpm > 0 else None
+        self.tokens = TokenBucket(tpm) if tpm > 0 else None
+        self._successes = 0
+        self.calls = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.throttled_seconds = 0.0
+
+    async def throttle(self, tokens: int):
+        buckets = [(self.requests, 1), (self.tokens, tokens)]
+        buckets = [(bucket, amount) for bucket, amount in buckets if bucket is not None]
+        while True:
+            wait = max((bucket.wait_time(amount) for bucket, amount in buckets), default=0.0)
+            if wait <= 0:
+                for bucket, amount in buckets:
+                    bucket.take(amount)
+                return
+            self.throttled_seconds += wait
+            await asyncio.sleep(wait)
+
+    def on_success(self, charged: int, used: Optional[int]):
+        self.calls += 1
+        if used is not None and self.tokens is not None:
+            self.tokens.adjust(used - charged)
+        # Additive increase: one extra slot per limit's worth of successful calls
+        self._successes += 1
+        if self.semaphore.limit < self.max_concurrency and self._successes >= self.semaphore.limit:
+            self._successes = 0
+            self.semaphore.resize(self.semaphore.limit + 1)
+
+    def on_rate_limited(self, pause: float):
+        # Multiplicative decrease, and hold every caller of this model until the pause ends
+        self.rate_limited += 1
+        self._successes = 0
+        self.semaphore.resize(max(config.UPSTREAM_MIN_CONCURRENCY, self.semaphore.limit // 2))
+        for bucket in (self.requests, self.tokens):
+            if bucket is not None:
+                bucket.block(pause)
+
+    def stats(self) -> dict:
+        return {
+            "concurrency_limit": self.semaphore.limit,
+            "in_flight": self.semaphore.in_use,
+            "queued": self.semaphore.queued,
+            "calls": self.calls,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "throttled_seconds": round(self.throttled_seconds, 2)
+        }
+
+def _retry_after(error: Exception) -> Optional[float]:
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass  # HTTP-date form; fall back to exponential backoff
+    return None
+
+def _backoff(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's Retry-After"""
+    delay = random.uniform(0, min(config.UPSTREAM_BACKOFF_MAX, config.UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+    retry_after = _retry_after(error)
+    if retry_after is not None:
+        delay = retry_after + random.uniform(0, config.UPSTREAM_BACKOFF_BASE)
+    return delay
+
+class UpstreamGovernor:
+    """Shared gate for every OpenAI call: per-model priority semaphores, requests/min and
+    tokens/min buckets, and jittered retries. Limits come from UPSTREAM_* config, with
+    per-model overrides in UPSTREAM_LIMITS."""
+
+    def __init__(self):
+        self._limiters = {}
+        try:
+            self._overrides = json.loads(config.UPSTREAM_LIMITS or "{}")
+        except ValueError as e:
+            print(f"Warning: Ignoring invalid UPSTREAM_LIMITS: {e}")
+            self._overrides = {}
+
+    def limiter(self, model: str) -> ModelLimiter:
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            override = self._overrides.get(model, {})
+            limiter = ModelLimiter(
+                concurrency=int(override.get("concurrency", config.UPSTREAM_MAX_CONCURRENCY)),
+                rpm=float(override.get("rpm", config.UPSTREAM_RPM)),
+                tpm=float(override.get("tpm", config.UPSTREAM_TPM))
+            )
+            self._limiters[model] = limiter
+        return limiter
+
+    async def call(self, model: str, fn: Callable[[], Awaitable], tokens: int = 0, priority: Optional[str] = None):
+        """Await fn() under the model's limits, retrying rate limits, connection errors and 5xx"""
+        limiter = self.limiter(model)
+        level = PRIORITIES.get(priority or _priority.get(), PRIORITIES["default"])
+        for attempt in range(config.UPSTREAM_MAX_RETRIES + 1):
+            # Wait for the buckets before taking a slot, so a throttled bulk call doesn't
+            # hold a slot an interactive one could use
+            await limiter.throttle(tokens)
+            await limiter.semaphore.acquire(level)
+            try:
+                result = await fn()
+            except _RETRYABLE as e:
+                if attempt == config.UPSTREAM_MAX_RETRIES:
+                    raise
+                delay = _backoff(attempt, e)
+                if isinstance(e, openai.RateLimitError):
+                    limiter.on_rate_limited(delay)
+                limiter.retries += 1
+            else:
+                usage = getattr(result, "usage", None)
+                limiter.on_success(tokens, getattr(usage, "total_tokens", None))
+                return result
+            finally:
+                limiter.semaphore.release()
+            await asyncio.sleep(delay)
+
+    def stats(self) -> dict:
+        return {model: limiter.stats() for model, limiter in self._limiters.items()}
+
+governor = UpstreamGovernor()
@@ -0,0 +1,79 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Config is read at import time, so point storage at a scratch directory before any src import
+_WORKDIR = tempfile.mkdtemp(prefix="console-tests-")
+os.environ.update({
+    "OPENAI_API_KEY": "sk-test",
+    "DATABASE_URL": f"sqlite:///{os.path.join(_WORKDIR, 'app.db')}",
+    "VECTOR_DB_PATH": os.path.join(_WORKDIR, "vector_db"),
+    "UPLOAD_DIR": os.path.join(_WORKDIR, "uploads"),
+    "JOB_WORKERS": "0"
+})
+os.makedirs(os.environ["UPLOAD_DIR"], exist_ok=True)
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _start_fake_openai(*extra_args) -> tuple:
+    """Run benchmarks/fake_openai.py on a free port; returns (process, base url)"""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "fake_openai.py"), "--port", str(port),
+         "--chat-latency", "fixed:5", "--embedding-latency", "fixed:1", "--transcription-latency", "fixed:5",
+         "--token-delay-ms", "0", *extra_args],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 20
+    while time.time() < deadline:
+        try:
+            httpx.get(f"{url}/stats", timeout=1)
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("fake OpenAI server did not start")
+
+@pytest.fixture(scope="session")
+def fake_openai():
+    process, url = _start_fake_openai()
+    yield url
+    process.terminate()
+
+@pytest.fixture(scope="session")
+def rate_limited_openai():
+    """A fake upstream that answers every request with 429"""
+    process, url = _start_fake_openai("--rate-limit-rate", "1.0", "--retry-after-ms", "10")
+    yield url
+    process.terminate()
+
+def _app_client(monkeypatch, base_url: str):
+    from fastapi.testclient import TestClient
+    from src.config import config
+    from src.main import app
+    monkeypatch.setattr(config, "OPENAI_BASE_URL", f"{base_url}/v1")
+    # Lifespan shutdown closes the shared OpenAI clients, so each client picks up base_url
+    return TestClient(app)
+
+@pytest.fixture
+def client(monkeypatch, fake_openai):
+    with _app_client(monkeypatch, fake_openai) as test_client:
+        yield test_client
+
+@pytest.fixture
+def busy_client(monkeypatch, rate_limited_openai):
+    from src.config import config
+    monkeypatch.setattr(config, "UPSTREAM_MAX_RETRIES", 0)
+    with _app_client(monkeypatch, rate_limited_openai) as test_client:
+        yield test_client
@@ -0,0 +1,99 @@
+import threading
+import numpy as np
+import pytest
+from src.config import config
+from src.db.ann_index import IVFIndex
+
+def _rows(n: int, dim: int = 16, seed: int = 0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _docs(n: int):
+    return [{"id": f"doc-{i}", "text": f"document {i}", "metadata": {"n": i}} for i in range(n)]
+
+@pytest.fixture
+def ivf_store(monkeypatch):
+    from src.db.vector_store import SimpleVectorStore
+    monkeypatch.setattr(config, "VECTOR_DB_PERSIST", False)
+    monkeypatch.setattr(config, "EMBEDDING_CACHE_PERSIST", False)
+    monkeypatch.setattr(config, "VECTOR_INDEX_MODE", "ivf")
+    monkeypatch.setattr(config, "ANN_MIN_ROWS", 200)
+    monkeypatch.setattr(config, "ANN_NPROBE", 4)
+    return SimpleVectorStore()
+
+def test_ivf_build_runs_outside_the_store_lock(ivf_store, monkeypatch):
+    release = threading.Event()
+    building = threading.Event()
+    build = IVFIndex.build
+
+    def slow_build(index, rows):
+        building.set()
+        assert release.wait(5)
+        build(index, rows)
+
+    monkeypatch.setattr(IVFIndex, "build", slow_build)
+    vectors = _rows(400)
+    ivf_store._insert(_docs(300), vectors[:300].tolist())
+    assert building.wait(5)
+
+    # Inserts and queries carry on (with exact search) while the clustering is built
+    ivf_store._insert(_docs(400)[300:], vectors[300:].tolist())
+    assert ivf_store._search(vectors[350].tolist(), 1)["documents"][0] == ["document 350"]
+    assert ivf_store.index_stats()["ann"] is None
+
+    release.set()
+    assert ivf_store._sync_ann(wait=True)
+    stats = ivf_store.index_stats()["ann"]
+    assert stats["built_rows"] == 300 and stats["indexed_rows"] == 400
+
+def _clustered(n: int, dim: int = 32, centers: int = 20, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    means = rng.normal(size=(centers, dim))
+    vectors = (means[rng.integers(centers, size=n)] + 0.3 * rng.normal(size=(n, dim))).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _recall(index: IVFIndex, rows, queries, k: int = 10, nprobe: int = None) -> float:
+    found = 0
+    for query in queries:
+        truth = set(np.argsort(-(rows @ query))[:k].tolist())
+        candidates = index.candidates(query, nprobe)
+        best = candidates[np.argsort(-(rows[candidates] @ query))[:k]]
+        found += len(truth & set(best.tolist()))
+    return found / (k * len(queries))
+
+def test_ivf_recall_grows_with_nprobe_and_is_exact_when_probing_every_list():
+    rows = _clustered(4000)
+    queries = _clustered(50, seed=1)
+    index = IVFIndex(n_lists=64, nprobe=8)
+    index.build(rows)
+    assert index.stats()["lists"] == 64
+    low, high = _recall(index, rows, queries, nprobe=2), _recall(index, rows, queries, nprobe=16)
+    assert low <= high and high >= 0.9
+    assert _recall(index, rows, queries, nprobe=64) == 1.0
+
+def test_ivf_assigns_rows_added_after_the_build():
+    rows = _clustered(2000)
+    index = IVFIndex(n_lists=16, nprobe=16)
+    index.build(rows[:1500])
+    index.add(1500, rows[1500:])
+    assert index.indexed_rows == 2000
+    assert np.array_equal(np.sort(index.candidates(rows[0])), np.arange(2000))
+    assert not index.needs_rebuild(2999) and index.needs_rebuild(3000)
+
+def test_store_searches_exactly_below_ann_min_rows(ivf_store):
+    vectors = _rows(150)
+    ivf_store._insert(_docs(150), vectors.tolist())
+    assert not ivf_store._sync_ann(wait=True)
+    assert ivf_store._search(vectors[42].tolist(), 1)["documents"][0] == ["document 42"]
+
+def test_filtered_query_falls_back_to_exact_when_probed_lists_miss_the_filter(ivf_store, monkeypatch):
+    monkeypatch.setattr(config, "ANN_NPROBE", 1)
+    vectors = _clustered(600, dim=16)
+    ivf_store._insert(_docs(600), vectors.tolist())
+    assert ivf_store._sync_ann(wait=True)
+    query = vectors[0]
+    # The rows least similar to the query sit in lists a one-list probe never reaches
+    far = np.argsort(vectors @ query)[:3]
+    allowed = ivf_store._filter_rows({"n": {"$in": far.tolist()}})
+    result = ivf_store._search(query.tolist(), 3, allowed)
+    assert sorted(result["documents"][0]) == sorted(f"document {row}" for row in far)
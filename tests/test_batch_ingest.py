@@ -0,0 +1,129 @@
+import asyncio
+import io
+import json
+import zipfile
+import pytest
+from PIL import Image
+from src.config import config
+from src.services import ingest_service
+from src.services.ingest_service import IngestService
+from src.utils.single_flight import SingleFlight
+from src.utils.uploads import StoredUpload
+
+def _stored(name: str) -> StoredUpload:
+    return StoredUpload(path=f"/tmp/{name}.png", sha256=name, size=1, extension="png", mime_type="image/png")
+
+@pytest.fixture
+def fake_analysis(monkeypatch):
+    """Analyses of "fast*" files finish at once, the rest hang; returns (started, cancelled, stored)"""
+    started, cancelled, stored_batches = [], [], []
+
+    async def analyze(stored: StoredUpload) -> str:
+        started.append(stored.sha256)
+        try:
+            await asyncio.sleep(0 if stored.sha256.startswith("fast") else 30)
+        except asyncio.CancelledError:
+            cancelled.append(stored.sha256)
+            raise
+        return f"analysis of {stored.sha256}"
+
+    async def persist(kind, prompt, analyzed):
+        stored_batches.append([stored.sha256 for _, stored, _ in analyzed])
+
+    monkeypatch.setattr(ingest_service, "_image_analyzer", lambda prompt, on_stage=None: analyze)
+    monkeypatch.setattr(IngestService, "_persist_batch", staticmethod(persist))
+    monkeypatch.setattr(IngestService, "in_flight", SingleFlight())
+    monkeypatch.setattr(config, "UPLOAD_DEDUP_MODE", "off")
+    return started, cancelled, stored_batches
+
+def test_closing_the_stream_cancels_unfinished_analyses(fake_analysis, monkeypatch):
+    started, cancelled, stored_batches = fake_analysis
+    monkeypatch.setattr(config, "BATCH_CONCURRENCY", 2)
+    files = [(f"{name}.png", _stored(name)) for name in ("fast-1", "slow-1", "slow-2", "fast-2")]
+
+    async def scenario():
+        entries = IngestService.ingest_batch("image", files, "Describe this image.")
+        first = await entries.__anext__()
+        await asyncio.sleep(0.01)
+        await entries.aclose()  # client disconnected
+        await asyncio.sleep(0.01)
+        return first, sorted(cancelled)
+
+    first, cancelled_before_shutdown = asyncio.run(scenario())
+    assert first["filename"] == "fast-1.png"
+    assert cancelled_before_shutdown == ["slow-1", "slow-2"]
+    assert "fast-2" not in started  # still queued behind the concurrency limit
+    assert stored_batches == [["fast-1"]]
+    assert IngestService.in_flight.in_flight() == 0
+
+def test_shared_analysis_survives_until_its_last_waiter_leaves():
+    async def scenario():
+        flight = SingleFlight()
+        work = asyncio.Event()
+
+        async def analysis():
+            await work.wait()
+            return "done"
+
+        leaving = asyncio.create_task(flight.run("key", analysis))
+        staying = asyncio.create_task(flight.run("key", analysis))
+        await asyncio.sleep(0)
+        leaving.cancel()
+        await asyncio.sleep(0)
+        assert flight.in_flight() == 1
+        work.set()
+        result = await staying
+
+        abandoned = asyncio.create_task(flight.run("other", lambda: asyncio.sleep(30)))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        await asyncio.sleep(0)
+        return result, flight.in_flight()
+
+    assert asyncio.run(scenario()) == (("done", True), 0)
+
+def test_identical_files_in_a_batch_share_one_analysis(fake_analysis):
+    started, _, stored_batches = fake_analysis
+    files = [("a.png", _stored("fast-a")), ("b.png", _stored("fast-b")), ("copy-of-a.png", _stored("fast-a"))]
+
+    async def scenario():
+        return [entry async for entry in IngestService.ingest_batch("image", files, "Describe this image.")]
+
+    entries = asyncio.run(scenario())
+    assert sorted(started) == ["fast-a", "fast-b"]
+    by_index = {entry["index"]: entry for entry in entries if "index" in entry}
+    assert [by_index[i]["deduplicated"] for i in range(3)] == [False, False, True]
+    assert by_index[2]["analysis"] == "analysis of fast-a"
+    assert entries[-1] == {"done": True, "files": 3, "analyzed": 2, "deduplicated": 1, "failed": 0}
+    assert sorted(stored_batches[0]) == ["fast-a", "fast-b"]
+
+def _png(color) -> bytes:
+    image = io.BytesIO()
+    Image.new("RGB", (16, 16), color).save(image, "PNG")
+    return image.getvalue()
+
+def test_batch_endpoint_streams_one_ndjson_line_per_file(client, monkeypatch):
+    monkeypatch.setattr(config, "UPLOAD_DEDUP_MODE", "off")
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as z:
+        z.writestr("scans/c.png", _png((200, 1, 2)))
+        z.writestr("__MACOSX/scans/._c.png", b"resource fork")
+    files = [
+        ("files", ("a.png", _png((100, 1, 2)), "image/png")),
+        ("files", ("b.png", _png((100, 1, 2)), "image/png")),
+        ("files", ("notes.txt", b"not an image", "text/plain")),
+        ("files", ("scans.zip", archive.getvalue(), "application/zip"))
+    ]
+    with client.stream("POST", "/analyze/image/batch", files=files) as response:
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        lines = [json.loads(line) for line in response.iter_lines() if line]
+
+    *entries, summary = lines
+    assert entries[0] == {"index": 2, "filename": "notes.txt", "error": "Unsupported image type for 'notes.txt'"}
+    by_index = {entry["index"]: entry for entry in entries}
+    assert sorted(by_index) == [0, 1, 2, 3]
+    assert by_index[3]["filename"] == "scans/c.png" and by_index[3]["analysis"]
+    assert by_index[0]["analysis"] == by_index[1]["analysis"]
+    assert sorted([by_index[0]["deduplicated"], by_index[1]["deduplicated"]]) == [False, True]
+    assert summary == {"done": True, "files": 4, "analyzed": 2, "deduplicated": 1, "failed": 1}
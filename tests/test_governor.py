@@ -0,0 +1,77 @@
+import asyncio
+from src.utils.upstream import PrioritySemaphore, PRIORITIES
+
+def test_priority_semaphore_serves_lowest_priority_first():
+    async def scenario():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire(PRIORITIES["default"])
+        order = []
+
+        async def waiter(name: str):
+            await semaphore.acquire(PRIORITIES[name])
+            order.append(name)
+            semaphore.release()
+
+        tasks = [asyncio.create_task(waiter(name)) for name in ("bulk", "default", "interactive")]
+        await asyncio.sleep(0)
+        assert semaphore.queued == 3
+        semaphore.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "default", "bulk"]
+
+def test_priority_semaphore_resize_wakes_waiters():
+    async def scenario():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire(0)
+        waiter = asyncio.create_task(semaphore.acquire(0))
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        semaphore.resize(2)
+        await asyncio.wait_for(waiter, 1)
+        return semaphore.in_use
+
+    assert asyncio.run(scenario()) == 2
+
+def test_embedding_batch_runs_at_most_urgent_waiting_priority():
+    from src.utils.embedding_batcher import EmbeddingBatcher
+    from src.utils.upstream import current_priority, upstream_priority
+    seen = []
+
+    async def embed_many(texts):
+        seen.append(current_priority())
+        return [[1.0] for _ in texts]
+
+    async def scenario():
+        batcher = EmbeddingBatcher(embed_many, max_batch_size=8, max_wait_ms=20)
+
+        async def embed(text: str, priority: str):
+            with upstream_priority(priority):
+                return await batcher.embed(text)
+
+        bulk = asyncio.create_task(embed("bulk chunk", "bulk"))
+        await asyncio.sleep(0)
+        await asyncio.gather(bulk, embed("user query", "interactive"))
+
+    asyncio.run(scenario())
+    assert seen == ["interactive"]
+
+def test_throttled_call_does_not_hold_a_concurrency_slot(monkeypatch):
+    from src.config import config
+    from src.utils.upstream import UpstreamGovernor
+    monkeypatch.setattr(config, "UPSTREAM_LIMITS", '{"m": {"concurrency": 1, "rpm": 600}}')
+    governor = UpstreamGovernor()
+    limiter = governor.limiter("m")
+    limiter.requests.tokens = 0  # next request allowed in ~0.1 s
+
+    async def scenario():
+        async def fn():
+            return "ok"
+
+        call = asyncio.create_task(governor.call("m", fn, priority="bulk"))
+        await asyncio.sleep(0.03)
+        assert limiter.semaphore.in_use == 0
+        return await call
+
+    assert asyncio.run(scenario()) == "ok"
@@ -0,0 +1,83 @@
+import io
+import pytest
+from PIL import Image
+from src.config import config
+from src.utils.image_prep import (PreparedImage, PreparedImageCache, choose_detail, image_tokens, preprocess,
+                                  target_size)
+
+def _encode(image: Image.Image, fmt: str = "PNG", **params) -> bytes:
+    out = io.BytesIO()
+    image.save(out, format=fmt, **params)
+    return out.getvalue()
+
+@pytest.mark.parametrize("size,requested,expected", [
+    ((512, 300), "auto", "low"),
+    ((513, 300), "auto", "high"),
+    ((4000, 3000), "low", "low"),
+    ((100, 100), "high", "high"),
+    ((100, 100), "sharp", "low"),  # unknown values fall back to auto
+])
+def test_choose_detail(size, requested, expected):
+    assert choose_detail(*size, requested) == expected
+
+def test_choose_detail_defaults_to_config(monkeypatch):
+    monkeypatch.setattr(config, "IMAGE_DETAIL", "high")
+    assert choose_detail(64, 64) == "high"
+
+def test_target_size_bounds_each_detail(monkeypatch):
+    monkeypatch.setattr(config, "IMAGE_MAX_SIDE", 2048)
+    assert target_size(4000, 3000, "low") == (512, 384)
+    assert target_size(4000, 3000, "high") == (1024, 768)  # short side capped at 768
+    assert target_size(8000, 1000, "high") == (2048, 256)  # long side capped at IMAGE_MAX_SIDE
+    assert target_size(300, 200, "high") == (300, 200)  # never upscaled
+
+def test_tokens_follow_detail_and_tiles():
+    assert image_tokens(4000, 3000, "low") == 85
+    assert image_tokens(1024, 768, "high") == 85 + 170 * 2 * 2
+
+def test_preprocess_downscales_and_reencodes(monkeypatch):
+    monkeypatch.setattr(config, "IMAGE_FORMAT", "jpeg")
+    data = _encode(Image.new("RGB", (3000, 2000), (10, 120, 200)))
+    prepared = preprocess(data, "high")
+    assert (prepared.width, prepared.height, prepared.detail) == (1152, 768, "high")
+    assert prepared.mime_type == "image/jpeg" and prepared.data.startswith(b"\xff\xd8\xff")
+    assert prepared.original_size == len(data)
+    assert prepared.tokens == image_tokens(1152, 768, "high")
+
+def test_preprocess_applies_exif_rotation_and_drops_metadata(monkeypatch):
+    monkeypatch.setattr(config, "IMAGE_FORMAT", "jpeg")
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotate 90 degrees on display
+    exif[0x010F] = "CameraMaker"
+    data = _encode(Image.new("RGB", (400, 200)), "JPEG", exif=exif.tobytes())
+    prepared = preprocess(data, "auto")
+    assert (prepared.width, prepared.height, prepared.detail) == (200, 400, "low")
+    with Image.open(io.BytesIO(prepared.data)) as image:
+        assert not image.getexif()
+
+def test_transparent_images_get_a_white_background_as_jpeg(monkeypatch):
+    monkeypatch.setattr(config, "IMAGE_FORMAT", "jpeg")
+    prepared = preprocess(_encode(Image.new("RGBA", (8, 8), (0, 0, 0, 0))))
+    with Image.open(io.BytesIO(prepared.data)) as image:
+        assert image.mode == "RGB" and image.getpixel((4, 4))[0] > 240
+
+def test_unreadable_images_are_sent_as_uploaded():
+    data = b"\x89PNG\r\n\x1a\n truncated"
+    prepared = preprocess(data, "low")
+    assert (prepared.data, prepared.mime_type, prepared.detail) == (data, "image/png", "low")
+
+def _prepared(size: int) -> PreparedImage:
+    return PreparedImage(b"x" * size, "image/jpeg", "low", 1, 1, size * 4)
+
+def test_prepared_cache_evicts_by_bytes():
+    cache = PreparedImageCache(max_bytes=100)
+    cache.put(("a", "low"), _prepared(40))
+    cache.put(("b", "low"), _prepared(40))
+    assert cache.get(("a", "low")) is not None
+    cache.put(("c", "low"), _prepared(40))
+    assert cache.get(("b", "low")) is None
+    assert cache.get(("a", "low")) is not None and cache.get(("c", "low")) is not None
+    cache.put(("huge", "low"), _prepared(500))  # larger than the whole cache: not kept
+    stats = cache.stats()
+    assert (stats["entries"], stats["bytes"], stats["hits"], stats["misses"]) == (2, 80, 3, 1)
+    assert (stats["bytes_in"], stats["bytes_out"]) == (4 * 620, 620)
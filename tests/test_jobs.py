@@ -0,0 +1,138 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import delete, select
+from src.config import config
+from src.db.database import AsyncSessionLocal
+from src.models.models import AnalysisJob
+from src.services.ingest_service import IngestService
+from src.services.job_service import JobService, JobWorkerPool
+from src.utils.uploads import StoredUpload
+
+@pytest.fixture
+def jobs(client):
+    """An empty analysis_jobs table (the app import creates the schema)"""
+    async def clear():
+        async with AsyncSessionLocal() as db:
+            await db.execute(delete(AnalysisJob))
+            await db.commit()
+    asyncio.run(clear())
+
+def _stored(name: str) -> StoredUpload:
+    return StoredUpload(path=f"/tmp/{name}.png", sha256=name, size=1, extension="png", mime_type="image/png")
+
+async def _submit(name: str, **values) -> str:
+    job_id = (await JobService.submit("image", _stored(name), f"{name}.png", "Describe this image."))["job_id"]
+    if values:
+        await JobService._update(job_id, **values)
+    return job_id
+
+def test_each_job_is_claimed_once(jobs):
+    async def scenario():
+        submitted = {await _submit("one"), await _submit("two")}
+        pools = [JobWorkerPool() for _ in range(3)]
+        claimed = await asyncio.gather(*[pool._claim() for pool in pools])
+        return submitted, claimed
+
+    submitted, claimed = asyncio.run(scenario())
+    jobs_claimed = [job for job in claimed if job is not None]
+    assert {job.id for job in jobs_claimed} == submitted and len(jobs_claimed) == 2
+    assert all(job.status == "running" and job.attempts == 1 for job in jobs_claimed)
+
+def test_only_stale_running_jobs_are_reclaimed(jobs):
+    async def scenario():
+        old = datetime.utcnow() - timedelta(seconds=config.JOB_STALE_SECONDS + 60)
+        await _submit("fresh", status="running", attempts=1)
+        stale = await _submit("stale")
+        await JobService._update(stale, status="running", attempts=1)
+        async with AsyncSessionLocal() as db:
+            (await db.get(AnalysisJob, stale)).updated_at = old
+            await db.commit()
+        pool = JobWorkerPool()
+        return stale, await pool._claim(), await pool._claim()
+
+    stale, reclaimed, nothing = asyncio.run(scenario())
+    assert reclaimed.id == stale and reclaimed.attempts == 2
+    assert nothing is None
+
+def _run_with(monkeypatch, ingest_image, job_values=None):
+    monkeypatch.setattr(IngestService, "ingest_image", staticmethod(ingest_image))
+
+    async def scenario():
+        job_id = await _submit("job", **(job_values or {}))
+        pool = JobWorkerPool()
+        job = await pool._claim()
+        await pool._run(job)
+        return await JobService.get(job_id), pool
+
+    return asyncio.run(scenario())
+
+def test_successful_run_stores_result_and_stages(jobs, monkeypatch):
+    stages = []
+
+    async def ingest_image(stored, filename, prompt, on_stage=None):
+        await on_stage("analyzing")
+        async with AsyncSessionLocal() as db:
+            stages.append(await db.scalar(select(AnalysisJob.stage).where(AnalysisJob.content_hash == stored.sha256)))
+        return {"analysis": "a cat", "file_path": stored.path, "deduplicated": False}
+
+    job, pool = _run_with(monkeypatch, ingest_image)
+    assert stages == ["analyzing"]
+    assert job["status"] == "succeeded" and job["stage"] is None and job["result"]["analysis"] == "a cat"
+    assert job["finished_at"] is not None and pool.completed == 1
+
+def test_failed_run_records_the_error(jobs, monkeypatch):
+    async def ingest_image(stored, filename, prompt, on_stage=None):
+        raise ValueError("unreadable image")
+
+    job, pool = _run_with(monkeypatch, ingest_image)
+    assert (job["status"], job["error"], pool.failed) == ("failed", "unreadable image", 1)
+
+def test_jobs_interrupted_too_often_give_up(jobs, monkeypatch):
+    async def ingest_image(stored, filename, prompt, on_stage=None):
+        raise AssertionError("should not run")
+
+    job, _ = _run_with(monkeypatch, ingest_image, {"attempts": config.JOB_MAX_ATTEMPTS})
+    assert job["status"] == "failed" and "interrupted" in job["error"]
+
+def test_heartbeat_keeps_a_long_job_fresh(jobs, monkeypatch):
+    monkeypatch.setattr(config, "JOB_STALE_SECONDS", 3)  # heartbeat every second
+    seen = []
+
+    async def ingest_image(stored, filename, prompt, on_stage=None):
+        job_id = seen[0]["job_id"]
+        await asyncio.sleep(1.3)
+        seen.append(await JobService.get(job_id))
+        return {"analysis": "slow", "file_path": stored.path, "deduplicated": False}
+
+    async def scenario():
+        seen.append(await JobService.get(await _submit("slow")))
+        pool = JobWorkerPool()
+        await pool._run(await pool._claim())
+
+    monkeypatch.setattr(IngestService, "ingest_image", staticmethod(ingest_image))
+    asyncio.run(scenario())
+    submitted, during = seen
+    assert during["status"] == "running"
+    assert (during["updated_at"] - submitted["updated_at"]).total_seconds() >= 1
+
+def test_stopping_the_pool_requeues_running_jobs(jobs, monkeypatch):
+    async def ingest_image(stored, filename, prompt, on_stage=None):
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(IngestService, "ingest_image", staticmethod(ingest_image))
+
+    async def scenario():
+        pool = JobWorkerPool()
+        await pool.start(1)
+        job_id = await _submit("interrupted")
+        pool.notify()
+        for _ in range(100):
+            if pool.running:
+                break
+            await asyncio.sleep(0.01)
+        await pool.stop()
+        return await JobService.get(job_id)
+
+    job = asyncio.run(scenario())
+    assert (job["status"], job["stage"], job["attempts"]) == ("queued", None, 0)
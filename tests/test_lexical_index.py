@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from src.config import config
+from src.db.lexical_index import BM25Index, tokenize
+
+def test_tokenize_keeps_identifiers_whole_and_split():
+    assert tokenize("What is in Q3_report.pdf from gpt-4o?") == [
+        "q3_report.pdf", "q3", "report", "pdf", "gpt-4o", "gpt", "4o"
+    ]
+
+@pytest.fixture
+def bm25():
+    index = BM25Index()
+    index.add_many([
+        "The quarterly revenue grew in the third quarter.",
+        "Audio transcript of the all-hands meeting about hiring.",
+        "Invoice INV-2291 was paid late; revenue recognized in October.",
+        "A photo of a cat sitting on a keyboard."
+    ])
+    return index
+
+def test_bm25_ranks_matching_rows_and_reports_coverage(bm25):
+    rows, scores, coverage = bm25.search("INV-2291 revenue", 3)
+    assert rows.tolist()[0] == 2
+    assert coverage[0] == 1.0
+    assert 0 in rows.tolist() and coverage[rows.tolist().index(0)] < 1.0
+    assert np.all(np.diff(scores) <= 0)
+
+def test_bm25_filter_and_misses(bm25):
+    rows, _, _ = bm25.search("revenue", 5, allowed=np.array([0, 1]))
+    assert rows.tolist() == [0]
+    assert bm25.search("the of", 5)[0].shape[0] == 0  # stopwords only
+    assert bm25.search("spreadsheet", 5)[0].shape[0] == 0
+
+def _vector(i: int, dim: int = 16):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[i % dim] = 1.0
+    return vector
+
+@pytest.fixture
+def hybrid_store(monkeypatch):
+    from src.db.vector_store import SimpleVectorStore
+    monkeypatch.setattr(config, "VECTOR_DB_PERSIST", False)
+    monkeypatch.setattr(config, "EMBEDDING_CACHE_PERSIST", False)
+    store = SimpleVectorStore()
+    texts = [f"Meeting notes number {i} about roadmap planning." for i in range(40)]
+    texts[7] = "Contract q3_report.pdf lists payment terms for vendor acme-logistics."
+    texts[12] = "Roadmap planning meeting: the budget review moved to Friday."
+    store._insert([{"id": str(i), "text": text, "metadata": {}} for i, text in enumerate(texts)],
+                  [_vector(i).tolist() for i in range(40)])
+    embedded = []
+
+    def get_embedding(text: str):
+        embedded.append(text)
+        return _vector(12).tolist()
+
+    monkeypatch.setattr(store, "_get_embedding", get_embedding)
+    store._lexical_index(wait=True)
+    return store, embedded
+
+def test_strong_lexical_match_skips_the_embedding_call(hybrid_store):
+    store, embedded = hybrid_store
+    result = store.query_similar("acme-logistics q3_report.pdf payment terms", 2, mode="hybrid")
+    assert result["documents"][0][0].startswith("Contract q3_report.pdf")
+    assert embedded == [] and store.lexical_fast_paths == 1
+
+def test_hybrid_fuses_vector_and_lexical_rankings(hybrid_store):
+    store, embedded = hybrid_store
+    result = store.query_similar("budget review Friday schedule", 3, mode="hybrid")
+    assert embedded == ["budget review Friday schedule"]
+    # Row 12 is first in both rankings, so it leads the reciprocal-rank fusion
+    assert result["documents"][0][0].startswith("Roadmap planning meeting: the budget")
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-6)
+
+def test_lexical_mode_never_embeds(hybrid_store):
+    store, embedded = hybrid_store
+    result = store.query_similar("vendor payment", 1, mode="lexical")
+    assert result["documents"][0][0].startswith("Contract")
+    assert embedded == []
+
+def test_hybrid_ranks_by_vectors_until_bm25_is_built(monkeypatch):
+    from src.db.vector_store import SimpleVectorStore
+    monkeypatch.setattr(config, "VECTOR_DB_PERSIST", False)
+    monkeypatch.setattr(config, "EMBEDDING_CACHE_PERSIST", False)
+    store = SimpleVectorStore()
+    store._insert([{"id": "0", "text": "alpha", "metadata": {}}], [_vector(0).tolist()])
+    monkeypatch.setattr(store, "_lexical_index", lambda wait=False: None)
+    _, _, lexical = store._plan_query("alpha", 1, None, "hybrid")
+    assert lexical is None
@@ -0,0 +1,78 @@
+import io
+import pytest
+from PIL import Image
+from src.db.metadata_index import MetadataFilterError, MetadataIndex, validate_where
+
+@pytest.fixture
+def index():
+    index = MetadataIndex()
+    index.add_many(0, [
+        {"type": "image", "filename": "a.png", "uploaded_at": 100.0},
+        {"type": "audio", "filename": "b.mp3", "uploaded_at": 200.0},
+        {"type": "image", "filename": "c.png", "uploaded_at": 300.0}
+    ])
+    return index
+
+@pytest.mark.parametrize("where, rows", [
+    (None, None),
+    ({"type": "image"}, [0, 2]),
+    ({"type": {"$eq": "audio"}}, [1]),
+    ({"filename": {"$in": ["a.png", "b.mp3"]}}, [0, 1]),
+    ({"uploaded_at": {"$gte": 200, "$lt": 300}}, [1]),
+    ({"type": "image", "uploaded_at": {"$gt": 150}}, [2]),
+    ({"type": "video"}, []),
+    ({"uploaded_at": 200}, [1]),
+    ({"uploaded_at": {"$in": [100.0, 300]}}, [0, 2])
+])
+def test_filter_rows(index, where, rows):
+    result = index.filter_rows(where)
+    assert (result if result is None else result.tolist()) == rows
+
+@pytest.mark.parametrize("where", [
+    ["type", "image"],
+    {"type": {"$bad": 1}},
+    {"type": {"$in": "image"}},
+    {"uploaded_at": {"$gt": "not a date"}},
+    {"uploaded_at": {"$lte": True}},
+    {"type": {"$eq": "image", "$in": ["audio"]}},
+    {"filename": {"$in": [["a.png"]]}},
+    {"type": {"$eq": {"kind": "image"}}},
+    {"type": ["image"]}
+])
+def test_malformed_filters_are_rejected(index, where):
+    with pytest.raises(MetadataFilterError):
+        validate_where(where)
+    with pytest.raises(MetadataFilterError):
+        index.filter_rows(where)
+
+def test_numbers_get_no_equality_postings(index):
+    assert index._column("uploaded_at", "key") is None
+    assert index._column("type", "number") is None
+
+def test_iso_dates_are_range_bounds():
+    validate_where({"uploaded_at": {"$gte": "2024-05-01T00:00:00"}})
+
+def test_chat_rejects_bad_filter_with_400(client):
+    session_id = client.post("/chat/sessions", json={"title": "filters"}).json()["session_id"]
+    # Index an upload so retrieval (and its filter) actually runs instead of skipping an empty store
+    image = io.BytesIO()
+    Image.new("RGB", (32, 32), (10, 120, 200)).save(image, "PNG")
+    assert client.post("/analyze/image", files={"file": ("chart.png", image.getvalue(), "image/png")}).status_code == 200
+
+    for _ in range(3):
+        response = client.post("/chat/message", json={
+            "session_id": session_id, "message": "what happened to revenue?", "where": {"type": {"$bad": 1}}
+        })
+        assert response.status_code == 400
+        assert "Invalid filter" in response.json()["detail"]
+
+    response = client.post("/chat/message", json={"session_id": session_id, "message": "what happened to revenue?"})
+    assert response.status_code == 200
+
+def test_chat_stream_reports_bad_filter(client):
+    session_id = client.post("/chat/sessions", json={"title": "filters"}).json()["session_id"]
+    response = client.post("/chat/message/stream", json={
+        "session_id": session_id, "message": "what happened to revenue?", "where": {"uploaded_at": {"$gt": "nope"}}
+    })
+    assert response.status_code == 200
+    assert "event: error" in response.text and "Invalid filter" in response.text
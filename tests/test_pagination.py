@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from src.db.database import SessionLocal
+from src.models.models import ChatMessage
+
+def _pages(client, path: str, limit: int) -> list:
+    pages, params = [], {"limit": limit}
+    while True:
+        page = client.get(path, params=params).json()
+        pages.append(page["items"])
+        if page["next_before_id"] is None:
+            return pages
+        params["before_id"] = page["next_before_id"]
+
+def test_sessions_page_newest_first_without_gaps(client):
+    created = [client.post("/chat/sessions", json={"title": f"s{i}"}).json()["session_id"] for i in range(5)]
+    pages = _pages(client, "/chat/sessions", limit=2)
+    ids = [item["id"] for page in pages for item in page]
+    assert [i for i in ids if i in created] == created[::-1]
+    assert len(ids) == len(set(ids))
+    assert all(len(page) <= 2 for page in pages)
+
+def test_history_pages_walk_back_through_tied_timestamps(client):
+    session_id = client.post("/chat/sessions", json={"title": "history"}).json()["session_id"]
+    base = datetime(2024, 1, 1)
+    # Pairs share a timestamp, so the id tie-breaker decides the page boundary
+    stamps = [base, base, base + timedelta(seconds=1), base + timedelta(seconds=1), base + timedelta(seconds=2)]
+    db = SessionLocal()
+    try:
+        for i, stamp in enumerate(stamps):
+            db.add(ChatMessage(session_id=session_id, role="user", content=f"m{i}", timestamp=stamp))
+        db.commit()
+    finally:
+        db.close()
+
+    pages = _pages(client, f"/chat/history/{session_id}", limit=2)
+    assert [[item["content"] for item in page] for page in pages] == [["m3", "m4"], ["m1", "m2"], ["m0"]]
+
+def test_history_with_unknown_cursor_is_empty(client):
+    session_id = client.post("/chat/sessions", json={"title": "empty"}).json()["session_id"]
+    page = client.get(f"/chat/history/{session_id}", params={"before_id": 10 ** 9}).json()
+    assert page == {"items": [], "next_before_id": None}
+
+def test_page_limit_is_bounded(client):
+    assert client.get("/chat/sessions", params={"limit": 0}).status_code == 422
+    assert client.get("/chat/sessions", params={"limit": 201}).status_code == 422
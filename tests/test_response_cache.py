@@ -0,0 +1,90 @@
+import asyncio
+import time
+import numpy as np
+import pytest
+from src.config import config
+from src.db.vector_store import vector_store
+from src.utils.response_cache import ResponseCache, cache_allowed
+
+@pytest.fixture
+def semantic_chat(monkeypatch):
+    monkeypatch.setattr(config, "RESPONSE_CACHE_ENDPOINTS", {"chat"})
+    monkeypatch.setattr(config, "RESPONSE_CACHE_SEMANTIC_ENDPOINTS", {"chat"})
+
+    async def aembed(text: str):
+        return np.ones(4, dtype=np.float32) / 2  # every question is a semantic match
+
+    monkeypatch.setattr(vector_store, "aembed", aembed)
+
+def _ask(cache: ResponseCache, question: str, answer: str, scope: str = None, use_cache: bool = True):
+    async def compute():
+        return answer
+    request = {"model": "gpt-4o", "messages": [{"role": "user", "content": question}]}
+    return asyncio.run(cache.get_or_compute("chat", request, compute, use_cache=use_cache,
+                                            semantic_text=question, semantic_scope=scope))
+
+def test_semantic_hits_stay_within_their_scope(semantic_chat):
+    cache = ResponseCache()
+    assert _ask(cache, "What was Q3 revenue?", "audio answer", scope="type=audio") == "audio answer"
+    assert _ask(cache, "what was q3 revenue", "image answer", scope="type=image") == "image answer"
+    assert _ask(cache, "Q3 revenue?", "unused", scope="type=audio") == "audio answer"
+    assert cache.semantic_hits == 1
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    cache = ResponseCache(ttl_seconds=60)
+    cache.put("k", "v")
+    now[0] += 59
+    assert cache.get("k") == "v"
+    now[0] += 2
+    assert cache.get("k") is None and cache.stats()["entries"] == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+def test_exact_hit_and_bypass_refresh(semantic_chat):
+    cache = ResponseCache()
+    assert _ask(cache, "Summarize the call", "first") == "first"
+    assert _ask(cache, "Summarize the call", "second") == "first"
+    assert _ask(cache, "Summarize the call", "fresh", use_cache=False) == "fresh"
+    assert _ask(cache, "Summarize the call", "third") == "fresh"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["bypassed"]) == (2, 1, 1)
+
+def test_semantic_hit_for_a_paraphrase(semantic_chat):
+    cache = ResponseCache()
+    assert _ask(cache, "What was Q3 revenue?", "12M") == "12M"
+    assert _ask(cache, "How much revenue in Q3?", "unused") == "12M"
+    assert cache.semantic_hits == 1
+
+def test_semantic_lookup_respects_threshold(semantic_chat, monkeypatch):
+    vectors = iter([np.array([1, 0, 0, 0], dtype=np.float32), np.array([0, 1, 0, 0], dtype=np.float32)])
+
+    async def aembed(text: str):
+        return next(vectors)
+
+    monkeypatch.setattr(vector_store, "aembed", aembed)
+    cache = ResponseCache()
+    assert _ask(cache, "What was Q3 revenue?", "12M") == "12M"
+    assert _ask(cache, "Who is on the hiring panel?", "Dana") == "Dana"
+    assert cache.semantic_hits == 0
+
+def test_endpoints_not_listed_are_never_cached(monkeypatch):
+    monkeypatch.setattr(config, "RESPONSE_CACHE_ENDPOINTS", set())
+    cache = ResponseCache()
+    assert _ask(cache, "Summarize the call", "first") == "first"
+    assert _ask(cache, "Summarize the call", "second") == "second"
+    assert cache.stats()["entries"] == 0
+
+def test_cache_allowed_headers():
+    assert cache_allowed(None, None)
+    assert not cache_allowed("no-cache", None)
+    assert not cache_allowed("max-age=0, No-Store", None)
+    assert not cache_allowed(None, "true")
+    assert cache_allowed("max-age=60", "0")
@@ -0,0 +1,44 @@
+import pytest
+from src.utils.text_chunker import chunk_documents, estimate_tokens, iter_chunks
+
+def _sentences(n: int):
+    return [f"Sentence number {i} talks about quarterly revenue." for i in range(n)]
+
+def test_short_text_is_one_chunk():
+    assert list(iter_chunks("One sentence. Another one.", max_tokens=300)) == ["One sentence. Another one."]
+    assert list(iter_chunks("   ", max_tokens=300)) == []
+
+@pytest.mark.parametrize("max_tokens, overlap_tokens", [(60, 15), (100, 30), (40, 0)])
+def test_chunks_respect_the_budget_and_split_on_sentences(max_tokens, overlap_tokens):
+    sentences = _sentences(40)
+    chunks = list(iter_chunks(" ".join(sentences), max_tokens, overlap_tokens))
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert estimate_tokens(chunk) <= max_tokens
+        assert chunk.endswith("revenue.")
+    # Every sentence lands in some chunk, in order
+    assert [s for s in sentences if any(s in chunk for chunk in chunks)] == sentences
+
+def test_consecutive_chunks_overlap_by_trailing_sentences():
+    chunks = list(iter_chunks(" ".join(_sentences(30)), max_tokens=60, overlap_tokens=15))
+    for previous, current in zip(chunks, chunks[1:]):
+        last_sentence = previous.rsplit(". ", 1)[-1]
+        assert current.startswith(last_sentence)
+        assert estimate_tokens(last_sentence) <= 15
+
+def test_no_overlap_when_disabled():
+    chunks = list(iter_chunks(" ".join(_sentences(30)), max_tokens=60, overlap_tokens=0))
+    assert " ".join(chunks) == " ".join(_sentences(30))
+
+def test_oversized_sentence_is_split_on_words():
+    sentence = " ".join(f"word{i}" for i in range(200))
+    chunks = list(iter_chunks(sentence, max_tokens=50, overlap_tokens=0))
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 50 for chunk in chunks)
+    assert " ".join(chunks).split() == sentence.split()
+
+def test_chunk_documents_link_back_to_their_parent():
+    documents = chunk_documents("42", " ".join(_sentences(30)), {"type": "image"}, max_tokens=60, overlap_tokens=15)
+    assert [doc["id"] for doc in documents] == [f"42:{i}" for i in range(len(documents))]
+    assert all(doc["metadata"] == {"type": "image", "parent_id": "42", "chunk_index": i}
+               for i, doc in enumerate(documents))
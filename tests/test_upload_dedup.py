@@ -0,0 +1,62 @@
+import asyncio
+import io
+import pytest
+from PIL import Image
+from src.config import config
+from src.services.ingest_service import IngestService
+from src.utils.single_flight import SingleFlight
+from src.utils.uploads import StoredUpload
+
+def _png(color) -> bytes:
+    image = io.BytesIO()
+    Image.new("RGB", (16, 16), color).save(image, "PNG")
+    return image.getvalue()
+
+def _upload(client, data: bytes, prompt: str = "Describe this image."):
+    response = client.post("/analyze/image", files={"file": ("a.png", data, "image/png")}, data={"prompt": prompt})
+    assert response.status_code == 200
+    return response.json()
+
+def test_reuse_mode_returns_the_stored_analysis(client, monkeypatch):
+    monkeypatch.setattr(config, "UPLOAD_DEDUP_MODE", "reuse")
+    data = _png((10, 20, 30))
+    first = _upload(client, data)
+    second = _upload(client, data)
+    assert (first["deduplicated"], second["deduplicated"]) == (False, True)
+    assert second["analysis"] == first["analysis"]
+    # The prompt is part of the key
+    assert _upload(client, data, prompt="List the colors.")["deduplicated"] is False
+
+def test_off_mode_analyzes_every_upload(client, monkeypatch):
+    monkeypatch.setattr(config, "UPLOAD_DEDUP_MODE", "off")
+    data = _png((40, 50, 60))
+    assert [_upload(client, data)["deduplicated"] for _ in range(2)] == [False, False]
+
+def test_concurrent_identical_uploads_share_one_analysis(client, monkeypatch):
+    monkeypatch.setattr(config, "UPLOAD_DEDUP_MODE", "off")
+    monkeypatch.setattr(IngestService, "in_flight", SingleFlight())
+    indexed = []
+
+    async def index_document(file_id, text, metadata):
+        indexed.append(file_id)
+
+    monkeypatch.setattr(IngestService, "index_document", staticmethod(index_document))
+    calls = []
+
+    async def analyze(stored: StoredUpload) -> str:
+        calls.append(stored.sha256)
+        await asyncio.sleep(0.05)
+        return "a red square"
+
+    stored = StoredUpload(path="/tmp/shared.png", sha256="shared-upload", size=1, extension="png", mime_type="image/png")
+
+    async def scenario():
+        return await asyncio.gather(*[
+            IngestService.ingest("image", stored, f"copy-{i}.png", "Describe this image.", analyze) for i in range(5)
+        ])
+
+    results = asyncio.run(scenario())
+    assert calls == ["shared-upload"] and len(indexed) == 1
+    assert [description for description, _ in results] == ["a red square"] * 5
+    assert sorted(deduplicated for _, deduplicated in results) == [False, True, True, True, True]
+    assert IngestService.in_flight.shared == 4 and IngestService.in_flight.in_flight() == 0
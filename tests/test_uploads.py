@@ -0,0 +1,83 @@
+import asyncio
+import io
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+from src.config import config
+from src.utils.uploads import UploadLimitMiddleware, request_body_limit, sniff_type
+
+@pytest.mark.parametrize("head,kind,expected", [
+    (b"\x89PNG\r\n\x1a\n" + b"\0" * 8, "image", "png"),
+    (b"\xff\xd8\xff\xe0" + b"\0" * 8, "image", "jpg"),
+    (b"GIF89a" + b"\0" * 8, "image", "gif"),
+    (b"RIFF\0\0\0\0WEBPVP8 ", "image", "webp"),
+    (b"RIFF\0\0\0\0WAVEfmt ", "audio", "wav"),
+    (b"ID3\x04\0\0\0\0\0\0", "audio", "mp3"),
+    (b"\xff\xfb\x90\x00" + b"\0" * 8, "audio", "mp3"),
+    (b"OggS\0\x02" + b"\0" * 8, "audio", "ogg"),
+    (b"fLaC\0\0\0\x22" + b"\0" * 8, "audio", "flac"),
+    (b"\0\0\0\x20ftypM4A ", "audio", "m4a"),
+    (b"\x1a\x45\xdf\xa3" + b"\0" * 8, "audio", "webm"),
+])
+def test_sniff_type_detects_supported_formats(head, kind, expected):
+    assert sniff_type(head, kind)[0] == expected
+
+@pytest.mark.parametrize("head,kind", [
+    (b"RIFF\0\0\0\0WAVEfmt ", "image"),  # audio sent to an image route
+    (b"\x89PNG\r\n\x1a\n", "audio"),
+    (b"%PDF-1.7\n", "image"),
+    (b"", "audio"),
+])
+def test_sniff_type_rejects_other_content(head, kind):
+    assert sniff_type(head, kind) is None
+
+def test_only_upload_routes_are_limited():
+    assert request_body_limit("/analyze/image") > config.MAX_IMAGE_UPLOAD_MB * 1024 * 1024
+    assert request_body_limit("/analyze/audio/batch") == int(config.MAX_BATCH_UPLOAD_MB * 1024 * 1024)
+    assert request_body_limit("/chat/message") is None
+
+def test_type_comes_from_content_not_filename(client):
+    response = client.post("/analyze/image", files={"file": ("photo.png", b"%PDF-1.7 not an image", "image/png")})
+    assert response.status_code == 415
+
+def _png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), (9, 9, 9)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def test_declared_length_over_the_limit_is_refused_unread(client, monkeypatch):
+    monkeypatch.setattr(config, "MAX_BATCH_UPLOAD_MB", 0.01)
+    files = [("files", (f"{i}.png", _png() + b"\0" * 4096, "image/png")) for i in range(4)]
+    response = client.post("/analyze/image/batch", files=files)
+    assert response.status_code == 413
+    assert "limit" in response.json()["detail"]
+
+def test_chunked_body_over_the_limit_gets_413(client, monkeypatch):
+    monkeypatch.setattr(config, "MAX_BATCH_UPLOAD_MB", 0.01)
+
+    def body():
+        for _ in range(64):
+            yield b"x" * 1024
+
+    response = client.post("/analyze/image/batch", content=body(),
+                           headers={"Content-Type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 413
+
+def test_middleware_stops_reading_a_chunked_body_past_the_limit(monkeypatch):
+    monkeypatch.setattr(config, "MAX_BATCH_UPLOAD_MB", 0.01)
+    delivered = []
+
+    async def receive():
+        delivered.append(1)
+        return {"type": "http.request", "body": b"x" * 1024, "more_body": True}
+
+    async def app(scope, receive, send):
+        while (await receive())["more_body"]:
+            pass
+
+    scope = {"type": "http", "method": "POST", "path": "/analyze/image/batch",
+             "headers": [(b"transfer-encoding", b"chunked")]}
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(UploadLimitMiddleware(app)(scope, receive, None))
+    assert error.value.status_code == 413
+    assert len(delivered) == 11  # 10 KiB limit: the 11th chunk crosses it
@@ -0,0 +1,41 @@
+import io
+import json
+import pytest
+from PIL import Image
+from src.utils.upstream import UPSTREAM_BUSY_DETAIL
+
+def _png(color) -> bytes:
+    image = io.BytesIO()
+    Image.new("RGB", (16, 16), color).save(image, "PNG")
+    return image.getvalue()
+
+def _assert_busy(response):
+    assert response.status_code == 503
+    assert response.json()["detail"] == UPSTREAM_BUSY_DETAIL
+    assert int(response.headers["retry-after"]) > 0
+
+def test_text_analysis_maps_429_to_503(busy_client):
+    response = busy_client.post("/analyze/text", json={"text": "hello", "instruction": "Summarize"},
+                                headers={"Cache-Control": "no-cache"})
+    _assert_busy(response)
+
+def test_image_analysis_maps_429_to_503(busy_client):
+    _assert_busy(busy_client.post("/analyze/image", files={"file": ("a.png", _png((1, 2, 3)), "image/png")}))
+
+def test_chat_maps_429_to_503(busy_client):
+    session_id = busy_client.post("/chat/sessions", json={"title": "busy"}).json()["session_id"]
+    _assert_busy(busy_client.post("/chat/message", json={"session_id": session_id, "message": "hi"}))
+
+def test_batch_marks_rate_limited_files_busy(busy_client):
+    response = busy_client.post("/analyze/image/batch", files=[("files", ("b.png", _png((4, 5, 6)), "image/png"))])
+    lines = [json.loads(line) for line in response.text.splitlines() if line]
+    assert lines[0]["busy"] is True and lines[0]["error"] == UPSTREAM_BUSY_DETAIL
+    assert lines[-1]["done"] is True and lines[-1]["failed"] == 1
+
+@pytest.mark.parametrize("path", ["/analyze/text", "/analyze/image"])
+def test_requests_succeed_when_upstream_is_healthy(client, path):
+    if path == "/analyze/text":
+        response = client.post(path, json={"text": "hello", "instruction": "Summarize"})
+    else:
+        response = client.post(path, files={"file": ("c.png", _png((7, 8, 9)), "image/png")})
+    assert response.status_code == 200
@@ -0,0 +1,156 @@
+import json
+import os
+import numpy as np
+import pytest
+from src.config import config
+from src.db.vector_index import DocumentLog, PersistentVectorIndex
+
+def _rows(n: int, dim: int = 8, seed: int = 0):
+    vectors = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def _docs(start: int, n: int):
+    return [{"id": f"doc-{i}", "text": f"document {i}", "metadata": {"n": i}} for i in range(start, start + n)]
+
+def _write(index: PersistentVectorIndex, vectors, docs):
+    with index.write_lock():
+        index.append_many(vectors, docs)
+
+def test_round_trip(tmp_path):
+    vectors = _rows(5)
+    _write(PersistentVectorIndex(str(tmp_path)), vectors, _docs(0, 5))
+
+    reopened = PersistentVectorIndex(str(tmp_path))
+    assert reopened.load() == 5
+    assert reopened.generation.read() == 5
+    assert reopened.log.read([3, 0]) == [_docs(3, 1)[0], _docs(0, 1)[0]]
+    assert reopened.log.read_range(0, 5) == _docs(0, 5)
+    assert reopened.metadata.filter_rows({"n": {"$gte": 3}}).tolist() == [3, 4]
+    np.testing.assert_array_equal(reopened.matrix.rows(), vectors)
+
+def test_read_new_sees_rows_from_another_writer(tmp_path):
+    reader = PersistentVectorIndex(str(tmp_path))
+    writer = PersistentVectorIndex(str(tmp_path))
+    reader.load()
+    writer.load()
+    vectors = _rows(3)
+    _write(writer, vectors, _docs(0, 3))
+
+    rows = reader.read_new(0)
+    np.testing.assert_array_equal(rows, vectors)
+    assert reader.log.read([2]) == _docs(2, 1)
+    assert reader.metadata.filter_rows({"n": 1}).tolist() == [1]
+    assert reader.read_new(3) is None
+
+def test_load_drops_partial_trailing_record(tmp_path):
+    _write(PersistentVectorIndex(str(tmp_path)), _rows(3), _docs(0, 3))
+    log_path = os.path.join(tmp_path, "documents.jsonl")
+    with open(log_path, "a", encoding="utf-8") as f:
+        f.write('{"id": "doc-3", "te')  # crash mid-write
+
+    reopened = PersistentVectorIndex(str(tmp_path))
+    assert reopened.load() == 3
+    assert reopened.log.read_range(0, 3) == _docs(0, 3)
+    with open(log_path, encoding="utf-8") as f:
+        assert [json.loads(line) for line in f] == _docs(0, 3)
+
+def test_load_truncates_rows_without_records(tmp_path):
+    index = PersistentVectorIndex(str(tmp_path))
+    _write(index, _rows(4), _docs(0, 4))
+    index.log.truncate(2)  # crash after the matrix write, before the sidecar
+
+    reopened = PersistentVectorIndex(str(tmp_path))
+    assert reopened.load() == 2
+    assert reopened.matrix.count == 2
+    assert os.path.getsize(reopened.matrix.path) == 2 * 8 * 4
+    assert reopened.generation.read() == 2
+
+def test_load_truncates_records_without_rows(tmp_path):
+    index = PersistentVectorIndex(str(tmp_path))
+    _write(index, _rows(2), _docs(0, 2))
+    index.log.write(2, DocumentLog.encode(_docs(2, 2)))
+    index.metadata.add_many(2, [doc["metadata"] for doc in _docs(2, 2)])
+
+    reopened = PersistentVectorIndex(str(tmp_path))
+    assert reopened.load() == 2
+    assert reopened.generation.read() == 2
+    assert reopened.metadata.filter_rows({"n": {"$gte": 0}}).tolist() == [0, 1]
+    assert reopened.log.offsets.stored_rows() == 2
+
+def test_load_indexes_a_log_from_before_offsets_existed(tmp_path):
+    import shutil
+    vectors = _rows(4)
+    _write(PersistentVectorIndex(str(tmp_path)), vectors, _docs(0, 4))
+    os.remove(os.path.join(tmp_path, "documents.idx"))
+    shutil.rmtree(os.path.join(tmp_path, "metadata"))
+
+    reopened = PersistentVectorIndex(str(tmp_path))
+    assert reopened.load() == 4
+    assert reopened.log.read([1, 3]) == [_docs(1, 1)[0], _docs(3, 1)[0]]
+    assert reopened.metadata.filter_rows({"n": {"$lt": 2}}).tolist() == [0, 1]
+
+def test_metadata_fields_added_by_another_writer_are_visible(tmp_path):
+    reader = PersistentVectorIndex(str(tmp_path))
+    writer = PersistentVectorIndex(str(tmp_path))
+    reader.load()
+    writer.load()
+    _write(writer, _rows(2), _docs(0, 2))
+    assert reader.read_new(0) is not None
+    assert reader.metadata.filter_rows({"kind": "new"}).tolist() == []
+
+    tagged = [{"id": "doc-2", "text": "document 2", "metadata": {"kind": "new"}}]
+    _write(writer, _rows(1, seed=1), tagged)
+    _write(writer, _rows(1, seed=2), _docs(3, 1))
+    reader.read_new(2)
+    assert reader.metadata.filter_rows({"kind": "new"}).tolist() == [2]
+    assert reader.metadata.filter_rows({"n": {"$in": [0, 3]}}).tolist() == [0, 3]
+
+def test_failed_append_leaves_rows_and_records_aligned(tmp_path):
+    import datetime
+    index = PersistentVectorIndex(str(tmp_path))
+    index.load()
+    vectors = _rows(3)
+    _write(index, vectors[:1], _docs(0, 1))
+    bad = [{"id": "doc-1", "text": "document 1", "metadata": {"at": datetime.datetime(2024, 1, 1)}}]
+    with pytest.raises(TypeError):
+        _write(index, vectors[1:2], bad)
+    assert index.matrix.count == 1
+    _write(index, vectors[2:], _docs(2, 1))
+
+    reopened = PersistentVectorIndex(str(tmp_path))
+    assert reopened.load() == 2
+    assert reopened.log.read_range(0, 2) == _docs(0, 1) + _docs(2, 1)
+    np.testing.assert_array_equal(reopened.matrix.rows(), vectors[[0, 2]])
+
+@pytest.mark.parametrize("dtype", ["float32", "float16", "int8"])
+def test_store_reopens_and_searches(tmp_path, monkeypatch, dtype):
+    from src.db.vector_store import SimpleVectorStore
+    monkeypatch.setattr(config, "VECTOR_DB_PATH", str(tmp_path))
+    monkeypatch.setattr(config, "VECTOR_STORAGE_DTYPE", dtype)
+    monkeypatch.setattr(config, "EMBEDDING_CACHE_PERSIST", False)
+    vectors = _rows(20, dim=16, seed=1)
+    store = SimpleVectorStore()
+    store._insert(_docs(0, 20), vectors.tolist())
+
+    reopened = SimpleVectorStore()
+    assert reopened.document_count() == 20
+    result = reopened._search(vectors[7].tolist(), 3)
+    assert result["documents"][0][0] == "document 7"
+    assert reopened._search(vectors[7].tolist(), 3, allowed=reopened._filter_rows({"n": {"$gte": 10}}))["documents"][0][0] != "document 7"
+
+def test_store_stays_consistent_after_failed_insert(tmp_path, monkeypatch):
+    import datetime
+    from src.db.vector_store import SimpleVectorStore
+    monkeypatch.setattr(config, "VECTOR_DB_PATH", str(tmp_path))
+    monkeypatch.setattr(config, "EMBEDDING_CACHE_PERSIST", False)
+    vectors = _rows(3, dim=16, seed=2)
+    store = SimpleVectorStore()
+    store._insert(_docs(0, 1), vectors[:1].tolist())
+    bad = [{"id": "doc-1", "text": "document 1", "metadata": {"at": datetime.datetime(2024, 1, 1)}}]
+    with pytest.raises(TypeError):
+        store._insert(bad, vectors[1:2].tolist())
+    store._insert(_docs(2, 1), vectors[2:].tolist())
+
+    assert store.document_count() == 2
+    assert store._search(vectors[2].tolist(), 1)["documents"][0] == ["document 2"]
+    assert SimpleVectorStore()._search(vectors[2].tolist(), 1)["documents"][0] == ["document 2"]